@@ -1,22 +1,49 @@
 from __future__ import annotations
 
-import markdown as md
+import asyncio
+import hashlib
+import json
+import os
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
 from fastapi import FastAPI, Form, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 
-from config import MAX_LINKS
-from hydrate import hydrate_article
-from linker import fetch_links
-from scaffold import scaffold_article
+from config import COALESCE_LEASE_SECONDS, HYDRATE_MODEL, MAX_LINKS, SCAFFOLD_MODEL
+from hydrate import ahydrate_article, ahydrate_article_stream
+from jobs import JobQueue, JobStore
+from linker import aclose as close_links_client
+from linker import afetch_links
+from llm import client as llm_client
+from metrics import REGISTRY
+from ratelimit import limiters
+from render import render_html
+from scaffold import ascaffold_article
+from singleflight import AsyncSingleFlight, coalesce_across_processes
 from wordpress import check_wordpress_connection
+from wordpress import client as wp_client
 
 # Load environment variables from .env
 load_dotenv()
 
-app = FastAPI(title="Draftsmith Web")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background generation workers; also resume jobs left queued or running by a restart
+    jobs.start()
+    yield
+    await jobs.stop()
+    jobs.store.close()
+    # Release pooled async HTTP connections on shutdown
+    await llm_client.aclose()
+    await close_links_client()
+    wp_client.close()
+
+
+app = FastAPI(title="Draftsmith Web", lifespan=lifespan)
 
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -24,6 +51,67 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 TEMPLATE_RESULT = "result.html"
 
+# Identical in-flight generations in this worker share one scaffold + hydrate run
+_flights = AsyncSingleFlight()
+
+
+def _flight_key(prompt: str, links: list[str] | None) -> str:
+    parts = [prompt.strip(), list(links or []), SCAFFOLD_MODEL, HYDRATE_MODEL]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+async def _generate_article(prompt: str, links: list[str] | None) -> tuple[str, str]:
+    # Build outline and article with the async paths so the event loop stays free
+    outline = await ascaffold_article(prompt, links=links, model=SCAFFOLD_MODEL)
+    article_md = await ahydrate_article(outline, model=HYDRATE_MODEL)
+    return outline, article_md
+
+
+async def generate_coalesced(prompt: str, links: list[str] | None) -> tuple[str, str]:
+    """
+    Generate (outline, article) once for all concurrent identical requests.
+
+    Requests are keyed on prompt + links + models. Within a worker they share one
+    task; across workers, a lease in the shared cache store lets one worker generate
+    while the others wait and then read its results from the LLM response cache.
+    """
+    key = _flight_key(prompt, links)
+
+    async def _run() -> tuple[str, str]:
+        cache = llm_client.cache
+        if os.getenv("DRY_RUN") == "1" or cache is None or not cache.enabled:
+            return await _generate_article(prompt, links)
+        return await coalesce_across_processes(
+            cache.cache_dir,
+            key,
+            lambda: _generate_article(prompt, links),
+            ttl=COALESCE_LEASE_SECONDS,
+        )
+
+    return await _flights.do(key, _run)
+
+
+async def build_article(prompt: str, fetch_links_flag: bool = False) -> dict:
+    """Links (optional), outline and article for prompt, with the article rendered to HTML."""
+    links = await afetch_links(prompt, max_links=MAX_LINKS) if fetch_links_flag else None
+    outline, article_md = await generate_coalesced(prompt, links)
+    if links:
+        refs = "\n".join(f"- {link}" for link in links)
+        article_md += "\n## References\n" + refs
+
+    # Render Markdown to HTML for display; the HTML cache is SQLite-backed, so off the loop
+    article_html = await asyncio.to_thread(render_html, article_md)
+    return {
+        "prompt": prompt,
+        "links": links or [],
+        "outline": outline,
+        "article_md": article_md,
+        "article_html": article_html,
+    }
+
+
+jobs = JobQueue(JobStore(), build_article)
+
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -39,25 +127,14 @@ async def generate(request: Request, prompt: str = Form(...), fetch_links_flag:
                 TEMPLATE_RESULT,
                 {"prompt": "", "outline": "", "article_html": "", "error": "Prompt is required."},
             )
-        links = fetch_links(prompt, max_links=MAX_LINKS) if fetch_links_flag else None
-
-        # Build outline and article; leverage existing modules (no file cache here for simplicity)
-        outline = scaffold_article(prompt, links=links)
-        article_md = hydrate_article(outline)
-        if links:
-            refs = "\n".join(f"- {link}" for link in links)
-            article_md += "\n## References\n" + refs
-
-        # Render Markdown to HTML for display
-        article_html = md.markdown(article_md)
-
+        article = await build_article(prompt, fetch_links_flag)
         return templates.TemplateResponse(
             request,
             TEMPLATE_RESULT,
             {
                 "prompt": prompt,
-                "outline": outline,
-                "article_html": article_html,
+                "outline": article["outline"],
+                "article_html": article["article_html"],
                 "error": None,
             },
         )
@@ -75,16 +152,103 @@ async def generate(request: Request, prompt: str = Form(...), fetch_links_flag:
         )
 
 
+@app.post("/jobs", status_code=202)
+async def create_job(
+    request: Request, prompt: str = Form(...), fetch_links_flag: bool = Form(False)
+):
+    """
+    Queue a generation and return its id at once; poll GET /jobs/{id} for the result.
+
+    Unlike /generate, the request does not wait for the LLM, so it fits behind
+    gateways with short timeouts.
+    """
+    if not prompt or not str(prompt).strip():
+        return JSONResponse({"error": "Prompt is required."}, status_code=400)
+    job_id = await jobs.submit(prompt=prompt, fetch_links_flag=fetch_links_flag)
+    url = str(request.url_for("get_job", job_id=job_id))
+    return JSONResponse(
+        {"id": job_id, "status": "queued", "url": url},
+        status_code=202,
+        headers={"Location": url},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job."}, status_code=404)
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+        "result": job["result"],
+    }
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_stream(prompt: str = Form(...), fetch_links_flag: bool = Form(False)):
+    """
+    Server-sent events variant of /generate.
+
+    Emits one 'outline' event, then a 'chunk' event per article token batch as the
+    hydrate model streams, and finally 'done' (or 'error').
+    """
+
+    async def events():
+        try:
+            if not prompt or not str(prompt).strip():
+                raise ValueError("Prompt is required.")
+            links = await afetch_links(prompt, max_links=MAX_LINKS) if fetch_links_flag else None
+            outline = await ascaffold_article(prompt, links=links)
+            yield _sse("outline", outline)
+            async for chunk in ahydrate_article_stream(outline):
+                yield _sse("chunk", chunk)
+            if links:
+                refs = "\n".join(f"- {link}" for link in links)
+                yield _sse("chunk", "\n## References\n" + refs)
+            yield _sse("done", {})
+        except Exception as exc:  # noqa: BLE001
+            yield _sse("error", str(exc))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Optional: simple health check
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition of this worker's registry
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/limits")
+async def limits():
+    # Current adaptive concurrency limit and in-flight requests per provider in this worker
+    return {"limiters": limiters()}
+
+
 @app.get("/health/wp")
 async def health_wp():
     # Returns a minimal summary of WP connectivity (safe GET only)
-    result = check_wordpress_connection()
+    # Blocking HTTP check; run it off the event loop
+    result = await asyncio.to_thread(check_wordpress_connection)
     # Do not echo secrets; include only safe fields
     user = result.get("user")
     user_id = user.get("id") if isinstance(user, dict) else None
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable
+
+from output import write_output
+from render import render_html
+
+
+def load_batch(path: str) -> list[dict]:
+    """
+    Parse a batch file with one prompt per line.
+
+    Each non-empty line is either a JSON object with a "prompt" key (and optional
+    "links" and "output" keys), a JSON string, or plain prompt text. Lines starting
+    with '#' are ignored.
+    """
+    items: list[dict] = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, raw in enumerate(f, start=1):
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                data = line
+            if isinstance(data, str):
+                data = {"prompt": data}
+            if not isinstance(data, dict):
+                data = {}
+            links = data.get("links")
+            items.append(
+                {
+                    "line": lineno,
+                    "prompt": str(data.get("prompt") or "").strip(),
+                    "links": [str(u) for u in links] if isinstance(links, list) else None,
+                    "output": data.get("output"),
+                }
+            )
+    return items
+
+
+def _slug(text: str, max_len: int = 60) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_len].rstrip("-") or "article"
+
+
+def _output_path(item: dict, output_dir: str, fmt: str) -> Path:
+    if item.get("output"):
+        p = Path(item["output"])
+        return p if p.is_absolute() else Path(output_dir) / p
+    return Path(output_dir) / f"{item['line']:05d}-{_slug(item['prompt'])}.{fmt}"
+
+
+def _dedupe_key(item: dict) -> tuple:
+    links = tuple(item["links"]) if item["links"] is not None else None
+    return (item["prompt"], links)
+
+
+def run_batch(
+    path: str,
+    generate: Callable[[str, list[str] | None], str],
+    output_dir: str,
+    fmt: str = "md",
+    workers: int = 4,
+    manifest: str | None = None,
+) -> dict:
+    """
+    Generate one article per batch line using a bounded thread pool.
+
+    Identical prompts (same prompt text and links) are generated once and written to
+    every line's output. A JSONL manifest with one record per line is appended to as
+    results complete, so partial runs still leave a usable record.
+    """
+    items = load_batch(path)
+    manifest_path = Path(manifest) if manifest else Path(output_dir) / "manifest.jsonl"
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+
+    groups: dict[tuple, list[dict]] = {}
+    invalid: list[dict] = []
+    for item in items:
+        if not item["prompt"]:
+            invalid.append(item)
+            continue
+        groups.setdefault(_dedupe_key(item), []).append(item)
+
+    def _run(prompt: str, links: list[str] | None) -> tuple[str, float]:
+        started = time.perf_counter()
+        article = generate(prompt, links)
+        return article, time.perf_counter() - started
+
+    summary = {
+        "total": len(items),
+        "unique": len(groups),
+        "ok": 0,
+        "failed": 0,
+        "manifest": str(manifest_path),
+    }
+    with open(manifest_path, "a", encoding="utf-8") as mf:
+
+        def _record(rec: dict) -> None:
+            summary["ok" if rec["status"] == "ok" else "failed"] += 1
+            mf.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            mf.flush()
+
+        for item in invalid:
+            _record(
+                {
+                    "line": item["line"],
+                    "prompt": "",
+                    "output": None,
+                    "status": "error",
+                    "error": "Prompt is required",
+                    "duplicate_of": None,
+                    "seconds": 0.0,
+                }
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+            futures = {
+                pool.submit(_run, group[0]["prompt"], group[0]["links"]): group
+                for group in groups.values()
+            }
+            for fut in as_completed(futures):
+                group = futures[fut]
+                first = group[0]
+                try:
+                    article, seconds = fut.result()
+                    error = None
+                except Exception as exc:  # noqa: BLE001
+                    logging.warning(f"Batch line {first['line']} failed: {exc}")
+                    article, seconds, error = None, 0.0, str(exc)
+                for item in group:
+                    dest = _output_path(item, output_dir, fmt)
+                    rec = {
+                        "line": item["line"],
+                        "prompt": item["prompt"],
+                        "output": str(dest),
+                        "status": "ok",
+                        "error": None,
+                        "duplicate_of": first["line"] if item is not first else None,
+                        "seconds": round(seconds, 3),
+                    }
+                    if error is None:
+                        try:
+                            write_output(article, str(dest), fmt)
+                        except OSError as exc:
+                            rec.update(status="error", error=str(exc))
+                    else:
+                        rec.update(status="error", error=error, output=None)
+                    _record(rec)
+
+    logging.info(
+        f"Batch finished: {summary['ok']} ok, {summary['failed']} failed "
+        f"({summary['unique']} unique of {summary['total']} lines)"
+    )
+    return summary
+
+
+JOURNAL_NAME = "publish-journal.jsonl"
+
+
+def load_articles(source: str) -> list[dict]:
+    """
+    List articles to publish from a directory of .md/.html files or a batch manifest.
+
+    Manifest records that failed are skipped; their prompt is used as the post title.
+    """
+    src = Path(source)
+    if src.is_dir():
+        files = sorted(p for p in src.iterdir() if p.suffix in (".md", ".html") and p.is_file())
+        return [{"path": str(p), "title": None} for p in files]
+    items: list[dict] = []
+    seen: set[str] = set()
+    with open(src, encoding="utf-8") as f:
+        for raw in f:
+            try:
+                rec = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(rec, dict) or rec.get("status") != "ok" or not rec.get("output"):
+                continue
+            if rec["output"] in seen:
+                continue
+            seen.add(rec["output"])
+            items.append({"path": rec["output"], "title": rec.get("prompt") or None})
+    return items
+
+
+def _article_html(path: Path, strip_title: bool = True) -> tuple[str, str]:
+    """
+    Return (title, html body) for a generated article file.
+
+    A leading H1 is the title; with strip_title it is dropped from the body, so the
+    post does not show its title twice.
+    """
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".html":
+        body = re.search(r"<body[^>]*>(.*)</body>", text, re.S | re.I)
+        html = body.group(1) if body else text
+        leading = re.match(r"\s*<h1[^>]*>(.*?)</h1>\s*", html, re.S | re.I)
+        heading = leading or re.search(r"<h1[^>]*>(.*?)</h1>", html, re.S | re.I)
+        title = re.sub(r"<[^>]+>", "", heading.group(1)).strip() if heading else ""
+        if leading and strip_title:
+            html = html[leading.end() :]
+    else:
+        leading = re.match(r"\s*#\s+(.+)$\s*", text, re.M)
+        heading = leading or re.search(r"^#\s+(.+)$", text, re.M)
+        title = heading.group(1).strip() if heading else ""
+        html = render_html(text[leading.end() :] if leading and strip_title else text)
+    return title or path.stem, html
+
+
+def _published(journal: Path) -> set[str]:
+    done: set[str] = set()
+    if not journal.exists():
+        return done
+    with open(journal, encoding="utf-8") as f:
+        for raw in f:
+            try:
+                rec = json.loads(raw)
+            except json.JSONDecodeError:
+                # A crash can leave a torn last line
+                continue
+            if isinstance(rec, dict) and rec.get("status") == "ok":
+                done.add(rec.get("path"))
+    return done
+
+
+def run_publish_batch(
+    source: str,
+    publish: Callable[[str, str], dict],
+    workers: int = 4,
+    journal: str | None = None,
+) -> dict:
+    """
+    Publish every article from source with publish(title, html) on a bounded thread pool.
+
+    Each result is appended to a JSONL journal as soon as it completes. Articles the
+    journal already records as published are skipped, so a crashed or interrupted
+    run can be re-run without posting them again.
+    """
+    items = load_articles(source)
+    src = Path(source)
+    journal_path = (
+        Path(journal) if journal else (src if src.is_dir() else src.parent) / JOURNAL_NAME
+    )
+    journal_path.parent.mkdir(parents=True, exist_ok=True)
+    done = _published(journal_path)
+    pending = [item for item in items if str(Path(item["path"])) not in done]
+
+    def _run(item: dict) -> dict:
+        started = time.perf_counter()
+        # A manifest's prompt is the title; otherwise the article's own H1 is
+        title, html = _article_html(Path(item["path"]), strip_title=not item["title"])
+        post = publish(item["title"] or title, html)
+        return {
+            "title": item["title"] or title,
+            "post_id": post.get("id"),
+            "link": post.get("link") or post.get("preview_link"),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    summary = {
+        "total": len(items),
+        "skipped": len(items) - len(pending),
+        "ok": 0,
+        "failed": 0,
+        "journal": str(journal_path),
+    }
+    with open(journal_path, "a", encoding="utf-8") as jf:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+            futures = {pool.submit(_run, item): item for item in pending}
+            for fut in as_completed(futures):
+                item = futures[fut]
+                rec = {"path": str(Path(item["path"])), "status": "ok", "error": None}
+                try:
+                    rec.update(fut.result())
+                except Exception as exc:  # noqa: BLE001
+                    logging.warning(f"Publishing {item['path']} failed: {exc}")
+                    rec.update(status="error", error=str(exc))
+                summary["ok" if rec["status"] == "ok" else "failed"] += 1
+                jf.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                jf.flush()
+
+    logging.info(
+        f"Publish batch finished: {summary['ok']} ok, {summary['failed']} failed, "
+        f"{summary['skipped']} already published"
+    )
+    return summary
@@ -0,0 +1,221 @@
+"""
+Local stand-ins for OpenRouter, SerpAPI and WordPress with tunable latency and errors.
+
+Each server runs on 127.0.0.1 in a background thread. Latency is drawn from a
+log-normal distribution whose median is Profile.latency; Profile.error_rate of
+requests fail with Profile.error_status (429s carry a Retry-After header).
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class Profile:
+    latency: float = 0.05
+    jitter: float = 0.3
+    error_rate: float = 0.0
+    error_status: int = 500
+    # Streamed completions: delay between SSE chunks
+    token_delay: float = 0.002
+    seed: int | None = None
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handler, profile: Profile):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.profile = profile
+        self.rng = random.Random(profile.seed)
+        self.rng_lock = threading.Lock()
+        self.requests = 0
+        self.ids = itertools.count(100)
+
+    def delay(self) -> float:
+        p = self.profile
+        with self.rng_lock:
+            self.requests += 1
+            factor = self.rng.lognormvariate(0, p.jitter) if p.jitter > 0 else 1.0
+            fail = self.rng.random() < p.error_rate
+        time.sleep(p.latency * factor)
+        return fail
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _Server
+
+    def log_message(self, format, *args):  # noqa: A002
+        return None
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            return self.rfile.read(length)
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return b""
+
+    def _json(self, payload, status: int = 200, headers: dict | None = None) -> None:
+        raw = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _maybe_fail(self) -> bool:
+        if not self.server.delay():
+            return False
+        status = self.server.profile.error_status
+        headers = {"Retry-After": "1"} if status == 429 else None
+        self._json({"error": {"message": "injected failure"}}, status, headers)
+        return True
+
+    def do_GET(self):  # noqa: N802
+        self._body()
+        if not self._maybe_fail():
+            self.handle_get(urlsplit(self.path))
+
+    def do_POST(self):  # noqa: N802
+        body = self._body()
+        if not self._maybe_fail():
+            self.handle_post(urlsplit(self.path), body)
+
+    def handle_get(self, url):
+        self._json({"error": "not found"}, 404)
+
+    def handle_post(self, url, body):
+        self._json({"error": "not found"}, 404)
+
+
+def _article(prompt: str, words: int) -> str:
+    title = " ".join(prompt.split()[:8]) or "Article"
+    sections = [f"## Section {i}\n\n" + " ".join(["lorem"] * (words // 4)) for i in range(1, 5)]
+    return f"# {title}\n\n" + "\n\n".join(sections)
+
+
+class OpenRouterHandler(_Handler):
+    """POST /chat/completions, JSON or server-sent events when "stream" is set."""
+
+    words = 400
+
+    def handle_post(self, url, body):
+        req = json.loads(body or b"{}")
+        prompt = next(
+            (m["content"] for m in reversed(req.get("messages", [])) if m["role"] == "user"), ""
+        )
+        text = _article(str(prompt), self.words)
+        if not req.get("stream"):
+            self._json({"choices": [{"message": {"role": "assistant", "content": text}}]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        pieces = text.split(" ")
+        for i in range(0, len(pieces), 8):
+            chunk = " ".join(pieces[i : i + 8]) + " "
+            event = {"choices": [{"delta": {"content": chunk}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.profile.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class SerpAPIHandler(_Handler):
+    """GET /search returning num organic results."""
+
+    def handle_get(self, url):
+        params = parse_qs(url.query)
+        num = int(params.get("num", ["5"])[0])
+        query = params.get("q", [""])[0]
+        slug = "-".join(query.lower().split())[:40] or "q"
+        results = [{"link": f"https://example.com/{slug}/{i}"} for i in range(1, num + 1)]
+        self._json({"organic_results": results})
+
+
+class WordPressHandler(_Handler):
+    """The subset of the WP REST API used by publish_to_wordpress."""
+
+    def handle_get(self, url):
+        path = url.path
+        if path.endswith("/users/me"):
+            self._json({"id": 1, "name": "bench"})
+        elif path.endswith("/categories") or path.endswith("/tags"):
+            self._json([{"id": 1, "name": "News"}, {"id": 2, "name": "Tips"}])
+        elif "/media/" in path:
+            self._json({"id": int(path.rsplit("/", 1)[-1])})
+        else:
+            self._json({"code": "rest_no_route"}, 404)
+
+    def handle_post(self, url, body):
+        path = url.path
+        new_id = next(self.server.ids)
+        if path.endswith("/categories") or path.endswith("/tags"):
+            self._json({"id": new_id, "name": json.loads(body or b"{}").get("name")}, 201)
+        elif path.endswith("/media"):
+            self._json({"id": new_id}, 201)
+        elif path.endswith("/posts"):
+            post = json.loads(body or b"{}")
+            link = f"http://{self.headers.get('Host')}/?p={new_id}"
+            self._json({"id": new_id, "status": post.get("status"), "link": link}, 201)
+        else:
+            self._json({"code": "rest_no_route"}, 404)
+
+
+class FakeServer:
+    def __init__(self, handler, profile: Profile):
+        self.httpd = _Server(handler, profile)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def __enter__(self) -> "FakeServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def environment(openrouter: FakeServer, serpapi: FakeServer, wordpress: FakeServer) -> dict:
+    """Environment variables pointing draftsmith at the fake servers."""
+    return {
+        "OPENROUTER_API_KEY": "bench",
+        "OPENROUTER_BASE_URL": openrouter.url,
+        "SERPAPI_KEY": "bench",
+        "SERPAPI_URL": f"{serpapi.url}/search",
+        "WP_URL": wordpress.url,
+        "WP_USER": "bench",
+        "WP_APP_PASS": "bench",
+        "DRY_RUN": "0",
+    }
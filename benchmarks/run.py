@@ -0,0 +1,341 @@
+"""
+End-to-end benchmarks against local fake OpenRouter, SerpAPI and WordPress servers.
+
+    python -m benchmarks.run --scenario all --requests 20 --concurrency 4
+    python -m benchmarks.run --update-baseline
+
+Scenarios drive the real entry points in subprocesses: single CLI runs (generate +
+publish), --batch mode, and the FastAPI app under uvicorn. Each reports throughput,
+p50/p95/p99 latency and peak RSS, and is compared with benchmarks/baseline.json.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fakes import (
+    FakeServer,
+    OpenRouterHandler,
+    Profile,
+    SerpAPIHandler,
+    WordPressHandler,
+    environment,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE = Path(__file__).with_name("baseline.json")
+SCENARIOS = ("cli", "batch", "web")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: list[float], errors: int, wall: float, rss_kb: int | None) -> dict:
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(total / wall, 3) if wall else 0.0,
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "peak_rss_mb": round(rss_kb / 1024, 1) if rss_kb else None,
+    }
+
+
+def _run_measured(cmd: list[str], env: dict) -> tuple[int, int]:
+    """Run cmd to completion; (exit code, peak RSS in KB of that process alone)."""
+    proc = subprocess.Popen(
+        cmd, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    # wait4 reports this child's own usage; RUSAGE_CHILDREN would add up every
+    # earlier scenario's children too
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = usage.ru_maxrss
+    return proc.returncode, peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _proc_peak_rss_kb(pid: int) -> int | None:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _env(servers: dict) -> dict:
+    env = {**os.environ, **environment(**servers)}
+    env["PYTHONPATH"] = str(ROOT)
+    return env
+
+
+def bench_cli(servers: dict, requests: int, concurrency: int, workdir: Path) -> dict:
+    """One `cli.py --fetch-links --publish` process per article."""
+    env = _env(servers)
+
+    def _one(i: int) -> tuple[float, bool, int]:
+        cmd = [
+            sys.executable,
+            str(ROOT / "cli.py"),
+            "--prompt",
+            f"CLI benchmark article {i}",
+            "--fetch-links",
+            "--publish",
+            "--category-names",
+            "News",
+            "--cache-dir",
+            str(workdir / f"cache-cli-{i}"),
+            "--output",
+            str(workdir / "cli" / f"{i}.md"),
+        ]
+        started = time.perf_counter()
+        code, rss = _run_measured(cmd, env)
+        return time.perf_counter() - started, code == 0, rss
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_one, range(requests)))
+    wall = time.perf_counter() - started
+    latencies = [t for t, ok, _ in results if ok]
+    rss = max(r for _, _, r in results)
+    return summarize(latencies, len(results) - len(latencies), wall, rss)
+
+
+def bench_batch(servers: dict, requests: int, concurrency: int, workdir: Path) -> dict:
+    """A single `cli.py --batch` run; latency is each line's generation time."""
+    env = _env(servers)
+    prompts = workdir / "prompts.jsonl"
+    prompts.write_text(
+        "\n".join(json.dumps(f"Batch benchmark article {i}") for i in range(requests)) + "\n",
+        encoding="utf-8",
+    )
+    manifest = workdir / "batch" / "manifest.jsonl"
+    cmd = [
+        sys.executable,
+        str(ROOT / "cli.py"),
+        "--batch",
+        str(prompts),
+        "--workers",
+        str(concurrency),
+        "--fetch-links",
+        "--parallel-sections",
+        "--cache-dir",
+        str(workdir / "cache-batch"),
+        "--output-dir",
+        str(workdir / "batch"),
+        "--manifest",
+        str(manifest),
+    ]
+    started = time.perf_counter()
+    _, rss = _run_measured(cmd, env)
+    wall = time.perf_counter() - started
+    records = []
+    if manifest.exists():
+        records = [json.loads(line) for line in manifest.read_text(encoding="utf-8").splitlines()]
+    latencies = [r["seconds"] for r in records if r["status"] == "ok"]
+    errors = requests - len(latencies)
+    return summarize(latencies, errors, wall, rss)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_web(servers: dict, requests: int, concurrency: int, workdir: Path) -> dict:
+    """uvicorn app:app under `concurrency` parallel POST /generate clients."""
+    env = _env(servers)
+    # Unique prompts keep every request cold anyway
+    env["LLM_CACHE"] = "0"
+    # The app keeps its cache, job queue and prompt index under ./.cache and serves
+    # ./templates and ./static: run it from the workdir so the checkout stays clean
+    cwd = workdir / "web"
+    cwd.mkdir(parents=True, exist_ok=True)
+    for name in ("templates", "static"):
+        (cwd / name).symlink_to(ROOT / name, target_is_directory=True)
+    port = _free_port()
+    cmd = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app:app",
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+    ]
+    server = subprocess.Popen(cmd, env=env, cwd=cwd)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.1)
+
+        def _one(i: int) -> tuple[float, bool]:
+            started = time.perf_counter()
+            try:
+                r = httpx.post(
+                    f"{base}/generate",
+                    data={"prompt": f"Web benchmark article {i} {time.time_ns()}"},
+                    timeout=120,
+                )
+                ok = r.status_code == 200 and "alert" not in r.text
+            except httpx.HTTPError:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(_one, range(requests)))
+        wall = time.perf_counter() - started
+        rss = _proc_peak_rss_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    latencies = [t for t, ok in results if ok]
+    return summarize(latencies, len(results) - len(latencies), wall, rss)
+
+
+RUNNERS = {"cli": bench_cli, "batch": bench_batch, "web": bench_web}
+
+
+def comparable(current: dict, base: dict) -> bool:
+    """Whether base was recorded with the same load and fake-server profile as current."""
+    return base.get("params") == current.get("params")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Regressions beyond tolerance: slower p95, lower throughput or higher peak RSS.
+
+    Scenarios whose baseline was recorded with other run parameters are skipped.
+    """
+    problems = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not comparable(cur, base):
+            continue
+        if base["p95"] and cur["p95"] > base["p95"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {cur['p95']}s vs baseline {base['p95']}s")
+        if base["throughput_rps"] and cur["throughput_rps"] < base["throughput_rps"] * (
+            1 - tolerance
+        ):
+            problems.append(
+                f"{name}: throughput {cur['throughput_rps']}/s "
+                f"vs baseline {base['throughput_rps']}/s"
+            )
+        if base.get("peak_rss_mb") and cur.get("peak_rss_mb"):
+            if cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+                problems.append(
+                    f"{name}: peak RSS {cur['peak_rss_mb']}MB vs baseline {base['peak_rss_mb']}MB"
+                )
+        if cur["errors"] > base.get("errors", 0):
+            problems.append(f"{name}: {cur['errors']} errors vs baseline {base.get('errors', 0)}")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Draftsmith end-to-end benchmarks")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--requests", type=int, default=12, help="Articles per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Median fake latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", dest="json_out", help="Also write results to this file")
+    args = parser.parse_args(argv)
+
+    profile = Profile(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    # Stored with every result: numbers are only comparable under the same parameters
+    params = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "seed": args.seed,
+    }
+    names = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = {}
+    with (
+        FakeServer(OpenRouterHandler, profile) as openrouter,
+        FakeServer(SerpAPIHandler, profile) as serpapi,
+        FakeServer(WordPressHandler, profile) as wordpress,
+    ):
+        servers = {"openrouter": openrouter, "serpapi": serpapi, "wordpress": wordpress}
+        for name in names:
+            with tempfile.TemporaryDirectory(prefix=f"draftsmith-bench-{name}-") as tmp:
+                results[name] = RUNNERS[name](servers, args.requests, args.concurrency, Path(tmp))
+            results[name]["params"] = params
+            print(f"{name:6} {json.dumps(results[name])}")
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        stored.update(results)
+        baseline_path.write_text(json.dumps(stored, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print("No baseline; run with --update-baseline to record one")
+        return 0
+    baseline = json.loads(baseline_path.read_text())
+    for name, cur in results.items():
+        if name in baseline and not comparable(cur, baseline[name]):
+            print(
+                f"SKIPPED {name}: baseline recorded with {baseline[name].get('params')}; "
+                "rerun with those arguments or --update-baseline"
+            )
+    problems = compare(results, baseline, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,542 @@
+import atexit
+import gzip
 import hashlib
 import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 
+from config import CACHE_MAX_BYTES, CACHE_TTLS, LLM_MEMORY_CACHE_BYTES
+from metrics import CACHE_REQUESTS
 
-def _key(parts: list[str]) -> str:
-    h = hashlib.sha256()
-    for p in parts:
-        h.update(p.encode("utf-8"))
-        h.update(b"\0")
-    return h.hexdigest()
+try:  # optional: better ratio and much faster than gzip when installed
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without the extra installed
+    zstandard = None
 
+# Bump when the meaning of cached values or key parts changes; old entries then miss
+KEY_VERSION = 2
+# Bump when the table layout changes; older databases are dropped and rebuilt
+SCHEMA_VERSION = 2
+DB_NAME = "cache.sqlite3"
+# Refresh LRU timestamps at most this often per entry to keep reads mostly write-free
+_TOUCH_INTERVAL = 60.0
+# Hit/miss counters are buffered in memory and flushed every this many reads (and at exit)
+_STATS_FLUSH_EVERY = 100
 
-def cache_read(cache_dir: str, namespace: str, parts: list[str]) -> str | None:
-    base = Path(cache_dir) / namespace
-    base.mkdir(parents=True, exist_ok=True)
-    fname = base / f"{_key(parts)}.json"
-    if not fname.exists():
-        return None
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    raw_size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_blob ON entries (blob);
+CREATE TABLE IF NOT EXISTS stats (
+    namespace TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('bytes', 0);
+CREATE TRIGGER IF NOT EXISTS blobs_insert AFTER INSERT ON blobs BEGIN
+    UPDATE meta SET value = value + NEW.stored_size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS blobs_delete AFTER DELETE ON blobs BEGIN
+    UPDATE meta SET value = value - OLD.stored_size WHERE name = 'bytes';
+END;
+"""
+
+# One connection per thread and database; sqlite3 connections are not shared across threads
+_local = threading.local()
+_stats_lock = threading.Lock()
+# {db path: {namespace: [hits, misses]}} not yet flushed to the stats table
+_pending_stats: dict[Path, dict[str, list[int]]] = {}
+_pending_reads = 0
+
+
+def _key(parts: list) -> str:
+    # Canonical JSON encoding so equal parts always hash equally, prefixed by the key version
+    canonical = json.dumps(parts, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(f"v{KEY_VERSION}\0{canonical}".encode("utf-8")).hexdigest()
+
+
+def _compress(raw: bytes) -> tuple[str, bytes]:
+    if zstandard is not None:
+        codec, data = "zstd", zstandard.ZstdCompressor(level=6).compress(raw)
+    else:
+        codec, data = "gzip", gzip.compress(raw, compresslevel=6, mtime=0)
+    if len(data) >= len(raw):
+        # Short values do not shrink; store them as-is
+        return "raw", raw
+    return codec, data
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "raw":
+        return data
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unsupported cache codec: {codec}")
+
+
+def _open(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    try:
+        # WAL lets readers in other processes proceed while one process writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Cache contents are disposable; rebuild instead of migrating older layouts
+            conn.execute("BEGIN IMMEDIATE")
+            # Re-check under the write lock in case another process just rebuilt it
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                for kind, name in conn.execute(
+                    "SELECT type, name FROM sqlite_master "
+                    "WHERE type IN ('table', 'trigger') AND name NOT LIKE 'sqlite_%'"
+                ).fetchall():
+                    conn.execute(f'DROP {kind} IF EXISTS "{name}"')
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        conn.executescript(_SCHEMA)
+    except sqlite3.DatabaseError:
+        conn.close()
+        raise
+    return conn
+
+
+def _db_path(cache_dir: str) -> Path:
+    return Path(cache_dir).resolve() / DB_NAME
+
+
+def _connect(cache_dir: str) -> sqlite3.Connection:
+    conns = _local.__dict__.setdefault("conns", {})
+    path = _db_path(cache_dir)
+    conn = conns.get(path)
+    if conn is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            conn = _open(path)
+        except sqlite3.DatabaseError as exc:
+            # Corrupt cache file; discard it and start over rather than failing the run
+            logging.warning(f"Resetting corrupt cache database {path}: {exc}")
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{path}{suffix}").unlink(missing_ok=True)
+            conn = _open(path)
+        conns[path] = conn
+    return conn
+
+
+def _delete_entry(conn: sqlite3.Connection, namespace: str, key: str, blob: str) -> int:
+    """Delete one entry, and its blob once nothing else points at it. Returns bytes freed."""
+    conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+    if conn.execute("SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (blob,)).fetchone():
+        return 0
+    row = conn.execute("SELECT stored_size FROM blobs WHERE hash = ?", (blob,)).fetchone()
+    conn.execute("DELETE FROM blobs WHERE hash = ?", (blob,))
+    return row[0] if row else 0
+
+
+def _evict(conn: sqlite3.Connection, max_bytes: int) -> int:
+    """Drop least recently used entries until stored bytes fit; returns entries dropped."""
+    total = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+    excess = total - max_bytes
+    evicted = 0
+    while excess > 0:
+        victims = conn.execute(
+            "SELECT namespace, key, blob FROM entries ORDER BY accessed_at LIMIT 64"
+        ).fetchall()
+        if not victims:
+            break
+        for namespace, key, blob in victims:
+            excess -= _delete_entry(conn, namespace, key, blob)
+            evicted += 1
+            if excess <= 0:
+                break
+    return evicted
+
+
+def _count(cache_dir: str, namespace: str, hit: bool) -> None:
+    global _pending_reads
+    with _stats_lock:
+        counts = _pending_stats.setdefault(_db_path(cache_dir), {}).setdefault(namespace, [0, 0])
+        counts[0 if hit else 1] += 1
+        _pending_reads += 1
+        flush = _pending_reads >= _STATS_FLUSH_EVERY
+    if flush:
+        flush_stats()
+
+
+def flush_stats() -> None:
+    """Persist buffered hit/miss counters so other processes (e.g. `cache stats`) see them."""
+    global _pending_reads
+    with _stats_lock:
+        pending = {path: dict(ns) for path, ns in _pending_stats.items()}
+        _pending_stats.clear()
+        _pending_reads = 0
+    for path, namespaces in pending.items():
+        if not path.exists():
+            # Cache directory was removed since the reads; nothing to attach counters to
+            continue
+        try:
+            conn = _connect(str(path.parent))
+            conn.executemany(
+                "INSERT INTO stats (namespace, hits, misses) VALUES (?, ?, ?) "
+                "ON CONFLICT (namespace) DO UPDATE SET hits = hits + excluded.hits, "
+                "misses = misses + excluded.misses",
+                [(ns, hits, misses) for ns, (hits, misses) in namespaces.items()],
+            )
+        except sqlite3.Error as exc:
+            logging.warning(f"Cache stats flush failed: {exc}")
+
+
+atexit.register(flush_stats)
+
+
+def cache_read(cache_dir: str, namespace: str, parts: list) -> str | None:
+    return _read_entry(cache_dir, namespace, parts)[0]
+
+
+def _read_entry(cache_dir: str, namespace: str, parts: list) -> tuple[str | None, float]:
+    # (value, created_at); created_at lets the in-process layer apply the same TTL
+    key = _key(parts)
+    now = time.time()
+    value = None
+    created_at = now
     try:
-        data = json.loads(fname.read_text(encoding="utf-8"))
-        return data.get("value")
-    except json.JSONDecodeError:
-        # Corrupt cache entry; remove and return miss
+        conn = _connect(cache_dir)
+        row = conn.execute(
+            "SELECT e.created_at, e.accessed_at, e.blob, b.codec, b.data "
+            "FROM entries e JOIN blobs b ON b.hash = e.blob "
+            "WHERE e.namespace = ? AND e.key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is not None:
+            created_at, accessed_at, blob, codec, data = row
+            ttl = CACHE_TTLS.get(namespace)
+            if ttl and now - created_at > ttl:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    _delete_entry(conn, namespace, key, blob)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    # Never leave the thread's shared connection inside a transaction
+                    conn.execute("ROLLBACK")
+                    raise
+            else:
+                value = _decompress(codec, data).decode("utf-8")
+                if now - accessed_at > _TOUCH_INTERVAL:
+                    conn.execute(
+                        "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                        (now, namespace, key),
+                    )
+    except (sqlite3.Error, ValueError, OSError) as exc:
+        logging.warning(f"Cache read failed ({namespace}): {exc}")
+        value = None
+    _count(cache_dir, namespace, value is not None)
+    return value, created_at
+
+
+def cache_write(
+    cache_dir: str,
+    namespace: str,
+    parts: list,
+    value: str,
+    max_bytes: int | None = None,
+) -> int:
+    """Store value under (namespace, parts); returns how many entries were evicted for room."""
+    key = _key(parts)
+    now = time.time()
+    raw = value.encode("utf-8")
+    # Content-addressed: identical values share one compressed blob across keys/namespaces
+    digest = hashlib.sha256(raw).hexdigest()
+    try:
+        conn = _connect(cache_dir)
+        # IMMEDIATE takes the write lock up front so concurrent evictions cannot interleave
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            fname.unlink(missing_ok=True)
-        except Exception:  # noqa: BLE001
-            pass
-        return None
-
-
-def cache_write(cache_dir: str, namespace: str, parts: list[str], value: str) -> None:
-    base = Path(cache_dir) / namespace
-    base.mkdir(parents=True, exist_ok=True)
-    fname = base / f"{_key(parts)}.json"
-    payload = {"value": value}
-    tmp = fname.with_suffix(fname.suffix + ".tmp")
-    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-    tmp.replace(fname)
+            if not conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+                codec, data = _compress(raw)
+                conn.execute(
+                    "INSERT INTO blobs (hash, codec, data, raw_size, stored_size) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (digest, codec, data, len(raw), len(data)),
+                )
+            old = conn.execute(
+                "SELECT blob FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if old and old[0] != digest:
+                _delete_entry(conn, namespace, key, old[0])
+            conn.execute(
+                "INSERT INTO entries (namespace, key, blob, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET blob = excluded.blob, "
+                "size = excluded.size, created_at = excluded.created_at, "
+                "accessed_at = excluded.accessed_at",
+                (namespace, key, digest, len(raw), now, now),
+            )
+            evicted = _evict(conn, CACHE_MAX_BYTES if max_bytes is None else max_bytes)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as exc:
+        logging.warning(f"Cache write failed ({namespace}): {exc}")
+        return 0
+    return evicted
+
+
+def cache_clear(cache_dir: str, namespace: str | None = None) -> None:
+    """Remove every entry (or every entry in one namespace) and any blobs left unreferenced."""
+    try:
+        conn = _connect(cache_dir)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if namespace is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT blob FROM entries)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as exc:
+        logging.warning(f"Cache clear failed ({namespace or 'all'}): {exc}")
+
+
+def cache_stats(cache_dir: str) -> dict:
+    """
+    Summarise the cache: entry/blob counts, logical vs stored bytes and hit ratios.
+
+    logical_bytes is what the entries would take uncompressed and without sharing;
+    saved_bytes is what compression plus de-duplication avoid storing.
+    """
+    flush_stats()
+    conn = _connect(cache_dir)
+    entries, logical = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+    ).fetchone()
+    blobs, stored = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(stored_size), 0) FROM blobs"
+    ).fetchone()
+    namespaces = {}
+    for ns, count, size in conn.execute(
+        "SELECT namespace, COUNT(*), SUM(size) FROM entries GROUP BY namespace"
+    ):
+        namespaces[ns] = {"entries": count, "logical_bytes": size, "hits": 0, "misses": 0}
+    total_hits = total_misses = 0
+    for ns, hits, misses in conn.execute("SELECT namespace, hits, misses FROM stats"):
+        ns_stats = namespaces.setdefault(ns, {"entries": 0, "logical_bytes": 0})
+        ns_stats.update(hits=hits, misses=misses)
+        total_hits += hits
+        total_misses += misses
+    for ns_stats in namespaces.values():
+        lookups = ns_stats["hits"] + ns_stats["misses"]
+        ns_stats["hit_ratio"] = round(ns_stats["hits"] / lookups, 4) if lookups else None
+    lookups = total_hits + total_misses
+    return {
+        "path": str(_db_path(cache_dir)),
+        "codec": "zstd" if zstandard is not None else "gzip",
+        "entries": entries,
+        "blobs": blobs,
+        "logical_bytes": logical,
+        "stored_bytes": stored,
+        "saved_bytes": logical - stored,
+        "hits": total_hits,
+        "misses": total_misses,
+        "hit_ratio": round(total_hits / lookups, 4) if lookups else None,
+        "namespaces": namespaces,
+    }
+
+
+def acquire_lease(cache_dir: str, name: str, owner: str, ttl: float) -> bool:
+    """
+    Try to take a named, expiring lease shared by every process using cache_dir.
+
+    Returns True when owner now holds it (fresh, or re-taken after expiry).
+    """
+    now = time.time()
+    try:
+        conn = _connect(cache_dir)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND expires_at < ?", (name, now))
+            conn.execute(
+                "INSERT OR IGNORE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, owner, now + ttl),
+            )
+            row = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as exc:
+        # Without the shared store, behave as if uncontended
+        logging.warning(f"Lease acquire failed ({name}): {exc}")
+        return True
+    return bool(row) and row[0] == owner
+
+
+def lease_held(cache_dir: str, name: str) -> bool:
+    try:
+        row = (
+            _connect(cache_dir)
+            .execute("SELECT 1 FROM leases WHERE name = ? AND expires_at >= ?", (name, time.time()))
+            .fetchone()
+        )
+    except sqlite3.Error:
+        return False
+    return row is not None
+
+
+def release_lease(cache_dir: str, name: str, owner: str) -> None:
+    try:
+        _connect(cache_dir).execute(
+            "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)
+        )
+    except sqlite3.Error as exc:
+        logging.warning(f"Lease release failed ({name}): {exc}")
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU bounded by total value bytes rather than entry count."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # key -> (value, size, created_at)
+        self._data: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, ttl: float | None = None) -> str | None:
+        """Value for key; entries older than ttl seconds are dropped and count as misses."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and ttl and time.time() - item[2] > ttl:
+                del self._data[key]
+                self._bytes -= item[1]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: str, value: str, created_at: float | None = None) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size, time.time() if created_at is None else created_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+
+class TieredCache:
+    """
+    Byte-bounded in-process layer over the shared SQLite store.
+
+    Lookups try memory first, then disk (promoting disk hits into memory). Every CLI
+    run and web worker pointing at the same cache_dir shares the persistent layer.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        memory_bytes: int = LLM_MEMORY_CACHE_BYTES,
+        enabled: bool = True,
+    ):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.memory = MemoryCache(memory_bytes)
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+    def _memory_key(self, namespace: str, parts: list) -> str:
+        return f"{self.cache_dir}\0{namespace}\0{_key(parts)}"
+
+    def get(self, namespace: str, parts: list) -> str | None:
+        if not self.enabled:
+            return None
+        mkey = self._memory_key(namespace, parts)
+        # Same expiry as the store, so long-lived workers do not outlive CACHE_TTLS
+        value = self.memory.get(mkey, CACHE_TTLS.get(namespace))
+        if value is not None:
+            CACHE_REQUESTS.inc(namespace=namespace, result="memory_hit")
+            return value
+        value, created_at = _read_entry(self.cache_dir, namespace, parts)
+        CACHE_REQUESTS.inc(namespace=namespace, result="miss" if value is None else "disk_hit")
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+        if value is not None:
+            self.memory.set(mkey, value, created_at)
+        return value
+
+    def set(self, namespace: str, parts: list, value: str) -> None:
+        if not self.enabled:
+            return
+        self.memory.set(self._memory_key(namespace, parts), value)
+        evicted = cache_write(self.cache_dir, namespace, parts, value)
+        if evicted:
+            with self._lock:
+                self.disk_evictions += evicted
+
+    def clear(self, namespace: str | None = None) -> None:
+        self.memory.clear()
+        cache_clear(self.cache_dir, namespace)
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk_evictions,
+            "memory_bytes": self.memory.bytes,
+        }
@@ -1,35 +1,76 @@
 import argparse
+import importlib
+import json
 import logging
 import os
+import sys
 from pathlib import Path
 
-import markdown
-from dotenv import load_dotenv
-
-from cache_util import cache_read, cache_write
-from config import DEFAULT_CACHE_DIR
+# Only light modules are imported here. LLM, HTTP, WordPress and Markdown code is
+# imported by the code paths that use it, so --version, --check-wp and cached runs
+# start fast; tests/test_cli_startup.py holds the import budget.
+from config import (
+    BATCH_WORKERS,
+    DEFAULT_CACHE_DIR,
+    HYDRATE_MODEL,
+    PUBLISH_WORKERS,
+    SCAFFOLD_MODEL,
+    SECTION_WORKERS,
+    SOURCE_WORKERS,
+    WP_POOL_SIZE,
+    WP_RATE_BURST,
+    WP_RATE_LIMIT,
+)
 from config import MAX_LINKS as CFG_MAX_LINKS
-from hydrate import hydrate_article
-from linker import fetch_links
-from output import write_output
-from scaffold import scaffold_article
+from metrics import REGISTRY
 from version import __version__
-from wordpress import publish_to_wordpress
-
-load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 
 
 def clear_caches():
-    from hydrate import hydrate_article as _hy
+    from llm import client as llm_client
+
+    # Drops the in-process layer and the persisted LLM responses in the configured cache dir
+    if llm_client.cache is not None:
+        llm_client.cache.clear("llm")
+        llm_client.cache.clear("sections")
+    logging.info("Cleared LLM response caches")
+
+
+def _configure_cache(args) -> None:
+    from llm import client as llm_client
+
+    # LLM responses are cached at the client level; point it at this run's cache settings
+    if llm_client.cache is not None:
+        llm_client.cache.cache_dir = args.cache_dir
+        llm_client.cache.enabled = not args.no_cache
+    # Rendered HTML is reused from the same cache dir by later runs and publish-batch
+    from render import renderer
 
-    # scaffold.scaffold_article delegates caching to _scaffold_article_cached
-    from scaffold import _scaffold_article_cached as _sc
+    renderer.cache.cache_dir = args.cache_dir
+    # Near-duplicate prompt index: lives with the cache and is skipped with it
+    from scaffold import index
 
-    _sc.cache_clear()
-    _hy.cache_clear()
-    logging.info("Cleared LRU caches")
+    index.cache_dir = args.cache_dir
+    if args.no_cache:
+        index.mode = "off"
+    elif args.reuse_similar:
+        index.mode = "reuse"
+    if args.similarity_threshold is not None:
+        index.threshold = args.similarity_threshold
+
+
+def _with_cache_dir(module_name: str, attr: str, args):
+    """
+    Import module_name and point its module-level cache (or client) attr at args.cache_dir.
+
+    Search results, source pages and the WordPress category/tag index and media map
+    persist alongside the LLM responses, but their modules load only when needed.
+    """
+    module = importlib.import_module(module_name)
+    getattr(module, attr).cache_dir = args.cache_dir
+    return module
 
 
 def _ensure_dry_run(enabled: bool) -> None:
@@ -47,31 +88,306 @@ def _validate_featured_image(path_or_url: str | None) -> None:
         raise SystemExit(f"--featured-image path not found: {p}")
 
 
+def _resolve_links(args, prompt, links=None):
+    if links:
+        return links
+    if args.links:
+        return args.links
+    if not args.fetch_links:
+        return None
+    linker = _with_cache_dir("linker", "cache", args)
+    return linker.fetch_links(prompt, max_links=args.max_links)
+
+
+def _outline(args, prompt, links):
+    if args.outline:
+        # An edited outline: with --parallel-sections only its changed sections are rewritten
+        return Path(args.outline).read_text(encoding="utf-8")
+    from scaffold import scaffold_article
+
+    sources = None
+    if args.fetch_sources:
+        sources = _with_cache_dir("sources", "cache", args).fetch_sources(
+            links, max_workers=args.source_workers
+        )
+    outline = scaffold_article(
+        prompt, links, model=args.scaffold_model or SCAFFOLD_MODEL, sources=sources
+    )
+    if args.save_outline:
+        Path(args.save_outline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_outline).write_text(outline, encoding="utf-8")
+    return outline
+
+
+def _references(links):
+    refs = "\n".join(f"- {link}" for link in links)
+    return "\n## References\n" + refs
+
+
 def generate_article(args, prompt, links):
-    cache_key_parts = [prompt, str(links), str(args.scaffold_model)]
-    outline = None
-    if not args.no_cache:
-        outline = cache_read(args.cache_dir, "scaffold", cache_key_parts)
-    if not outline:
-        outline = scaffold_article(prompt, links, model=args.scaffold_model)
-        if not args.no_cache:
-            cache_write(args.cache_dir, "scaffold", cache_key_parts, outline)
-
-    article = None
-    hydrate_key = [outline, str(args.hydrate_model)]
-    if not args.no_cache:
-        article = cache_read(args.cache_dir, "hydrate", hydrate_key)
-    if not article:
-        article = hydrate_article(outline, model=args.hydrate_model)
-        if not args.no_cache:
-            cache_write(args.cache_dir, "hydrate", hydrate_key, article)
+    from hydrate import hydrate_article, hydrate_article_sections
+
+    outline = _outline(args, prompt, links)
+    model = args.hydrate_model or HYDRATE_MODEL
+    if args.parallel_sections:
+        # Keyed by prompt: re-running with an edited outline only rewrites changed sections
+        article = hydrate_article_sections(
+            outline, model=model, max_workers=args.section_workers, article=prompt
+        )
+    else:
+        article = hydrate_article(outline, model=model)
     if links:
-        refs = "\n".join(f"- {link}" for link in links)
-        article += "\n## References\n" + refs
+        article += _references(links)
     return article
 
 
+def generate_article_stream(args, prompt, links):
+    """Like generate_article, but yields the article in chunks as the model streams it."""
+    from hydrate import hydrate_article_stream
+
+    outline = _outline(args, prompt, links)
+    yield from hydrate_article_stream(outline, model=args.hydrate_model or HYDRATE_MODEL)
+    if links:
+        yield _references(links)
+
+
+def _collect(chunks, parts):
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+
+
+def cache_main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog="draftsmith cache", description="Inspect the file cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stats = sub.add_parser("stats", help="Show entry counts, bytes saved and hit ratio")
+    stats.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for simple file cache",
+    )
+    similar = sub.add_parser(
+        "similar", help="List earlier prompts whose outline could be reused for PROMPT"
+    )
+    similar.add_argument("prompt")
+    similar.add_argument("--model", default=SCAFFOLD_MODEL, help="Scaffold model")
+    similar.add_argument("--links", nargs="*", help="Reference links the outline was built with")
+    similar.add_argument("--threshold", type=float, help="Minimum similarity (0-1)")
+    similar.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+    if args.command == "similar":
+        from similar import PromptIndex
+
+        index = PromptIndex(args.cache_dir)
+        if args.threshold is not None:
+            index.threshold = args.threshold
+        matches = index.search(args.prompt, args.model, args.links)
+        print(json.dumps(matches, indent=2, ensure_ascii=False))
+        return
+    if args.command == "stats":
+        from cache_util import cache_stats
+
+        print(json.dumps(cache_stats(args.cache_dir), indent=2))
+
+
+def publish_batch_main(argv: list[str]) -> None:
+    from batch import JOURNAL_NAME, run_publish_batch
+    from ratelimit import AdaptiveLimiter
+    from render import renderer
+    from wordpress import WordPressClient, publish_to_wordpress
+
+    parser = argparse.ArgumentParser(
+        prog="draftsmith publish-batch",
+        description="Publish generated articles to WordPress with a shared rate limit",
+    )
+    parser.add_argument("source", help="Directory of .md/.html articles or a batch manifest.jsonl")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=PUBLISH_WORKERS,
+        help="Concurrent publishes",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=WP_RATE_LIMIT,
+        help="Max WordPress requests per second across all workers",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=WP_RATE_BURST,
+        help="Requests allowed back-to-back before --rate applies",
+    )
+    parser.add_argument(
+        "--journal",
+        help=f"Resume journal (default: {JOURNAL_NAME} next to the source)",
+    )
+    parser.add_argument("--status", choices=["draft", "publish"], default="draft")
+    parser.add_argument("--categories", nargs="*", type=int, help="WordPress category IDs")
+    parser.add_argument("--category-names", nargs="*", help="WordPress category names")
+    parser.add_argument("--tags", nargs="*", type=int, help="WordPress tag IDs")
+    parser.add_argument("--tag-names", nargs="*", help="WordPress tag names")
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for the category/tag index and rendered HTML",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Run without calling WordPress",
+    )
+    args = parser.parse_args(argv)
+    _ensure_dry_run(args.dry_run)
+    # Markdown articles generated with this cache dir are not rendered again
+    renderer.cache.cache_dir = args.cache_dir
+
+    # One client for all workers: a shared keep-alive pool, request rate and adaptive
+    # concurrency limit that backs off when the site answers 429
+    pool_size = max(WP_POOL_SIZE, args.workers * 3)
+    wp = WordPressClient(
+        # Each publish resolves terms and uploads media concurrently
+        pool_size=pool_size,
+        cache_dir=args.cache_dir,
+        limiter=AdaptiveLimiter(
+            initial=args.workers * 3,
+            max_limit=pool_size,
+            rate=args.rate,
+            burst=args.burst,
+            provider="wordpress",
+            key="publish-batch",
+        ),
+    )
+    try:
+        summary = run_publish_batch(
+            args.source,
+            lambda title, html: publish_to_wordpress(
+                title=title,
+                content_html=html,
+                status=args.status,
+                categories=args.categories,
+                category_names=args.category_names,
+                tags=args.tags,
+                tag_names=args.tag_names,
+                wp_client=wp,
+            ),
+            workers=args.workers,
+            journal=args.journal,
+        )
+    finally:
+        wp.close()
+    print(json.dumps(summary, indent=2))
+    if summary["failed"]:
+        raise SystemExit(1)
+
+
+# Subcommands dispatched on the first argument; everything else is article generation
+SUBCOMMANDS = {"cache": cache_main, "publish-batch": publish_batch_main}
+
+
+def _write_metrics(path: str) -> None:
+    snapshot = json.dumps(REGISTRY.snapshot(), indent=2)
+    if path == "-":
+        print(snapshot)
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(snapshot + "\n", encoding="utf-8")
+
+
+def _run(args, parser) -> None:
+    # Fast path: connectivity check for WordPress
+    if args.check_wp:
+        from wordpress import check_wordpress_connection
+
+        result = check_wordpress_connection()
+        print(json.dumps(result, indent=2))
+        if result.get("ok"):
+            return
+        raise SystemExit(1)
+
+    if args.batch:
+        if args.publish:
+            parser.error("--publish cannot be combined with --batch")
+        if args.outline or args.save_outline:
+            parser.error("--outline/--save-outline cannot be combined with --batch")
+        _configure_cache(args)
+        if args.clear_cache:
+            clear_caches()
+        _ensure_dry_run(args.dry_run)
+        from batch import run_batch
+
+        summary = run_batch(
+            args.batch,
+            lambda prompt, links: generate_article(
+                args, prompt, _resolve_links(args, prompt, links)
+            ),
+            output_dir=args.output_dir,
+            fmt=args.format,
+            workers=args.workers,
+            manifest=args.manifest,
+        )
+        print(f"Batch manifest: {summary['manifest']}")
+        if summary["failed"]:
+            raise SystemExit(1)
+        return
+
+    if not args.prompt or not str(args.prompt).strip():
+        parser.error("--prompt is required unless --check-wp or --batch is provided")
+    if args.stream and args.parallel_sections:
+        parser.error("--stream cannot be combined with --parallel-sections")
+
+    _configure_cache(args)
+    if args.clear_cache:
+        clear_caches()
+
+    _ensure_dry_run(args.dry_run)
+    from output import write_output
+
+    prompt = args.prompt
+    links = _resolve_links(args, prompt)
+
+    if args.stream:
+        parts: list[str] = []
+        write_output(
+            _collect(generate_article_stream(args, prompt, links), parts),
+            args.output,
+            args.format,
+        )
+        article = "".join(parts)
+    else:
+        article = generate_article(args, prompt, links)
+
+    if args.publish:
+        _validate_featured_image(args.featured_image)
+        from render import render_html
+
+        wordpress = _with_cache_dir("wordpress", "client", args)
+        # article is Markdown in both formats; write_output below reuses this rendering
+        post = wordpress.publish_to_wordpress(
+            title=prompt,
+            content_html=render_html(article),
+            status=args.status,
+            categories=args.categories,
+            category_names=args.category_names,
+            tags=args.tags,
+            tag_names=args.tag_names,
+            featured_image=args.featured_image,
+        )
+        pid = post.get("id")
+        link = post.get("link") or post.get("preview_link")
+        preview = post.get("preview_link")
+        print(f"Published to WordPress: id={pid} link={link} preview={preview}")
+
+    if not args.stream:
+        write_output(article, args.output, args.format)
+
+
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Article Generator CLI")
     parser.add_argument(
         "--prompt",
@@ -94,6 +410,17 @@ def main() -> None:
         default=CFG_MAX_LINKS,
         help="Max number of links to fetch (with --fetch-links)",
     )
+    parser.add_argument(
+        "--fetch-sources",
+        action="store_true",
+        help="Download the reference pages and give their summaries to the scaffold model",
+    )
+    parser.add_argument(
+        "--source-workers",
+        type=int,
+        default=SOURCE_WORKERS,
+        help="Concurrent page downloads with --fetch-sources",
+    )
     parser.add_argument(
         "--output",
         default="article.md",
@@ -105,12 +432,39 @@ def main() -> None:
         default="md",
         help="Output format",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Append article text to the output file as the model streams it (md format)",
+    )
+    parser.add_argument(
+        "--parallel-sections",
+        action="store_true",
+        help="Hydrate outline sections concurrently and stitch them in order",
+    )
+    parser.add_argument(
+        "--outline",
+        metavar="PATH",
+        help="Hydrate this (edited) outline instead of scaffolding one; with "
+        "--parallel-sections only sections changed since the last run are rewritten",
+    )
+    parser.add_argument(
+        "--save-outline",
+        metavar="PATH",
+        help="Write the scaffolded outline to PATH for editing and --outline",
+    )
+    parser.add_argument(
+        "--section-workers",
+        type=int,
+        default=SECTION_WORKERS,
+        help="Concurrent section requests with --parallel-sections",
+    )
     parser.add_argument("--scaffold-model", help="Override scaffold model")
     parser.add_argument("--hydrate-model", help="Override hydrate model")
     parser.add_argument(
         "--clear-cache",
         action="store_true",
-        help="Clear outline/hydration caches",
+        help="Clear cached LLM responses (outlines/hydrations) in --cache-dir",
     )
     parser.add_argument(
         "--publish",
@@ -162,12 +516,47 @@ def main() -> None:
     parser.add_argument(
         "--cache-dir",
         default=DEFAULT_CACHE_DIR,
-        help="Directory for simple file cache",
+        help="Directory for the LLM response cache",
     )
     parser.add_argument(
         "--no-cache",
         action="store_true",
-        help="Disable file cache for scaffold/hydrate",
+        help="Disable the LLM response cache for scaffold/hydrate",
+    )
+    parser.add_argument(
+        "--reuse-similar",
+        action="store_true",
+        help="Reuse the outline of a near-duplicate earlier prompt instead of scaffolding",
+    )
+    parser.add_argument(
+        "--similarity-threshold",
+        type=float,
+        help="Minimum prompt similarity (0-1) for --reuse-similar (default SIMILARITY_THRESHOLD)",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="PROMPTS_JSONL",
+        help="Generate one article per line of a JSONL prompts file",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BATCH_WORKERS,
+        help="Concurrent generations in --batch mode",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="articles",
+        help="Directory for --batch outputs",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Results manifest path for --batch (default: <output-dir>/manifest.jsonl)",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="Write stage latencies and cache/error/retry counters as JSON ('-' for stdout)",
     )
     parser.add_argument(
         "--version",
@@ -177,52 +566,11 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    # Fast path: connectivity check for WordPress
-    if args.check_wp:
-        import json
-
-        from wordpress import check_wordpress_connection
-
-        result = check_wordpress_connection()
-        print(json.dumps(result, indent=2))
-        if result.get("ok"):
-            return
-        raise SystemExit(1)
-
-    if not args.prompt or not str(args.prompt).strip():
-        parser.error("--prompt is required unless --check-wp is provided")
-
-    if args.clear_cache:
-        clear_caches()
-
-    _ensure_dry_run(args.dry_run)
-
-    prompt = args.prompt
-    links = args.links or (
-        fetch_links(prompt, max_links=args.max_links) if args.fetch_links else None
-    )
-
-    article = generate_article(args, prompt, links)
-
-    if args.publish:
-        _validate_featured_image(args.featured_image)
-        html = article if args.format == "html" else markdown.markdown(article)
-        post = publish_to_wordpress(
-            title=prompt,
-            content_html=html,
-            status=args.status,
-            categories=args.categories,
-            category_names=args.category_names,
-            tags=args.tags,
-            tag_names=args.tag_names,
-            featured_image=args.featured_image,
-        )
-        pid = post.get("id")
-        link = post.get("link") or post.get("preview_link")
-        preview = post.get("preview_link")
-        print(f"Published to WordPress: id={pid} link={link} preview={preview}")
-
-    write_output(article, args.output, args.format)
+    try:
+        _run(args, parser)
+    finally:
+        if args.metrics_json:
+            _write_metrics(args.metrics_json)
 
 
 if __name__ == "__main__":
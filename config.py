@@ -6,13 +6,122 @@ from dotenv import load_dotenv
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 SCAFFOLD_MODEL = "x-ai/grok-4-fast:free"
 HYDRATE_MODEL = "openai/gpt-5"
 MAX_LINKS = 5
 REQUEST_TIMEOUT = 10
+# Seconds a cached SerpAPI result is served before it is refreshed
+LINKS_CACHE_TTL = float(os.getenv("LINKS_CACHE_TTL", str(24 * 60 * 60)))
+# SerpAPI 429/503 replies are retried after Retry-After or this backoff, doubling per attempt
+SERPAPI_RETRIES = int(os.getenv("SERPAPI_RETRIES", "2"))
+SERPAPI_RETRY_BACKOFF = float(os.getenv("SERPAPI_RETRY_BACKOFF", "1.0"))
+# --fetch-sources: concurrent page downloads, bytes read per page, summary length fed to scaffold
+SOURCE_WORKERS = int(os.getenv("SOURCE_WORKERS", "8"))
+SOURCE_MAX_BYTES = int(os.getenv("SOURCE_MAX_BYTES", str(2 * 1024 * 1024)))
+SOURCE_SUMMARY_CHARS = int(os.getenv("SOURCE_SUMMARY_CHARS", "600"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
 USER_AGENT = os.getenv("USER_AGENT", "draftsmith")
 MAX_MEDIA_BYTES = int(os.getenv("MAX_MEDIA_BYTES", str(10 * 1024 * 1024)))  # 10MB default
 WP_URL = os.getenv("WP_URL")
 WP_USER = os.getenv("WP_USER")
 WP_APP_PASS = os.getenv("WP_APP_PASS")
+# Keep-alive connections and retry policy of the shared WordPress session
+WP_POOL_SIZE = int(os.getenv("WP_POOL_SIZE", "10"))
+WP_RETRIES = int(os.getenv("WP_RETRIES", "3"))
+WP_RETRY_BACKOFF = float(os.getenv("WP_RETRY_BACKOFF", "0.5"))
+# Age after which the local category/tag index fetches terms created since its last sweep
+WP_TERMS_TTL = float(os.getenv("WP_TERMS_TTL", "3600"))
+# Age after which it is rebuilt from a full sweep, dropping deleted and renamed terms
+WP_TERMS_FULL_TTL = float(os.getenv("WP_TERMS_FULL_TTL", "86400"))
 DEFAULT_CACHE_DIR = ".cache"
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1GB default
+# In-process layer in front of the SQLite store for LLM responses
+LLM_MEMORY_CACHE_BYTES = int(os.getenv("LLM_MEMORY_CACHE_BYTES", str(64 * 1024 * 1024)))
+LLM_CACHE = os.getenv("LLM_CACHE", "1") != "0"
+# Markdown to HTML renderer ("markdown" or "markdown-it") and the in-process layer of its
+# HTML cache (rendered HTML is also kept in the cache store)
+MARKDOWN_BACKEND = os.getenv("MARKDOWN_BACKEND", "markdown")
+HTML_CACHE_BYTES = int(os.getenv("HTML_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+
+def _parse_ttls(raw: str) -> dict[str, float]:
+    # "scaffold=604800,hydrate=2592000" -> {"scaffold": 604800.0, "hydrate": 2592000.0}
+    ttls: dict[str, float] = {}
+    for item in raw.split(","):
+        name, _, seconds = item.partition("=")
+        if name.strip() and seconds.strip():
+            ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def _parse_model_map(raw: str) -> dict[str, str]:
+    # "openai/gpt-5=0.05,*=0.1" -> {"openai/gpt-5": "0.05", "*": "0.1"}; a bare value sets "*"
+    mapping: dict[str, str] = {}
+    for item in raw.split(","):
+        name, sep, value = item.rpartition("=") if "=" in item else ("*", "=", item)
+        if name.strip() and value.strip():
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+
+# Per-namespace cache TTLs in seconds; namespaces not listed never expire
+CACHE_TTLS = _parse_ttls(os.getenv("CACHE_TTLS", ""))
+SECTION_WORKERS = int(os.getenv("SECTION_WORKERS", "6"))
+SECTION_RETRIES = int(os.getenv("SECTION_RETRIES", "2"))
+# Max time one worker holds the shared "generating this prompt" lease before others proceed
+COALESCE_LEASE_SECONDS = float(os.getenv("COALESCE_LEASE_SECONDS", "600"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+# publish-batch: concurrent publishes and the shared WordPress request rate (req/s, burst)
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "4"))
+WP_RATE_LIMIT = float(os.getenv("WP_RATE_LIMIT", "5"))
+WP_RATE_BURST = int(os.getenv("WP_RATE_BURST", "10"))
+# Web app background jobs: concurrent generations, store location, and crash recovery
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite3"))
+# A running job whose worker stops renewing this lease is retried by another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Hedged LLM requests: a request still unanswered after LLM_HEDGE_PERCENTILE of the model's
+# recent latencies is sent again (to LLM_HEDGE_FALLBACKS[model] if set); the first reply wins
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Extra requests allowed per request sent, per model ("*" for the rest): 0.1 = at most +10%
+LLM_HEDGE_BUDGET = {
+    k: float(v) for k, v in _parse_model_map(os.getenv("LLM_HEDGE_BUDGET", "0.1")).items()
+}
+LLM_HEDGE_FALLBACKS = _parse_model_map(os.getenv("LLM_HEDGE_FALLBACKS", ""))
+# Adaptive outbound limits: concurrency starts at "initial", grows ~1 per "initial" successful
+# requests up to "max" and halves when a provider answers 429/503; "rate" (req/s, 0 = none)
+# and "burst" add pacing. OpenRouter limits are per model, source pages per host.
+PROVIDER_LIMITS = {
+    "openrouter": {
+        "initial": int(os.getenv("OPENROUTER_CONCURRENCY", "8")),
+        "max": int(os.getenv("OPENROUTER_MAX_CONCURRENCY", str(LLM_MAX_CONNECTIONS))),
+        "rate": float(os.getenv("OPENROUTER_RATE_LIMIT", "0")),
+        "burst": int(os.getenv("OPENROUTER_RATE_BURST", "1")),
+    },
+    "serpapi": {
+        "initial": int(os.getenv("SERPAPI_CONCURRENCY", "4")),
+        "max": int(os.getenv("SERPAPI_MAX_CONCURRENCY", "16")),
+        "rate": float(os.getenv("SERPAPI_RATE_LIMIT", "0")),
+        "burst": int(os.getenv("SERPAPI_RATE_BURST", "1")),
+    },
+    "wordpress": {
+        "initial": int(os.getenv("WP_CONCURRENCY", "4")),
+        "max": int(os.getenv("WP_MAX_CONCURRENCY", str(WP_POOL_SIZE))),
+        "rate": WP_RATE_LIMIT,
+        "burst": WP_RATE_BURST,
+    },
+    "sources": {"initial": SOURCE_WORKERS, "max": SOURCE_WORKERS},
+}
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "1.0"))
+# Near-duplicate prompts: "suggest" logs when a similar prompt was already scaffolded,
+# "reuse" returns its outline instead of calling the model, "off" disables the index.
+# Similarity is the Jaccard index of normalized 3-character shingles.
+SIMILAR_PROMPTS = os.getenv("SIMILAR_PROMPTS", "suggest")
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
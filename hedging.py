@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+
+from config import (
+    LLM_HEDGE_BUDGET,
+    LLM_HEDGE_FALLBACKS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_PERCENTILE,
+)
+
+# Recent latencies kept per model for the hedge delay
+WINDOW = 200
+# Unused hedge allowance a model can bank for a burst of slow responses
+MAX_BANKED_HEDGES = 5.0
+
+
+class Hedger:
+    """
+    Decides when an LLM request should be duplicated, and to which model.
+
+    A request gets a hedge once it has been waiting longer than the given percentile
+    of the model's recent latencies. Hedges are paid from a per-model budget: every
+    request adds `budget` (e.g. 0.1) to the model's allowance and every hedge spends
+    1, so hedging adds at most that fraction of extra requests over time.
+    """
+
+    def __init__(
+        self,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        budgets: dict[str, float] | None = None,
+        fallbacks: dict[str, str] | None = None,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        window: int = WINDOW,
+    ):
+        self.percentile = percentile
+        self.budgets = dict(LLM_HEDGE_BUDGET if budgets is None else budgets)
+        self.fallbacks = dict(LLM_HEDGE_FALLBACKS if fallbacks is None else fallbacks)
+        self.min_samples = max(1, min_samples)
+        self.window = window
+        self._latencies: dict[str, deque[float]] = {}
+        self._allowance: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _budget(self, model: str) -> float:
+        return self.budgets.get(model, self.budgets.get("*", 0.0))
+
+    def record(self, model: str, seconds: float) -> None:
+        """Record the latency of a successful request."""
+        with self._lock:
+            samples = self._latencies.get(model)
+            if samples is None:
+                samples = self._latencies[model] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay(self, model: str) -> float | None:
+        """
+        Seconds to wait before hedging a new request to model; None means never.
+
+        Called once per request sent, which also earns the model its hedge allowance.
+        """
+        budget = self._budget(model)
+        with self._lock:
+            if budget > 0:
+                allowance = self._allowance.get(model, 0.0) + budget
+                self._allowance[model] = min(allowance, MAX_BANKED_HEDGES)
+            samples = sorted(self._latencies.get(model, ()))
+        if budget <= 0 or len(samples) < self.min_samples:
+            return None
+        # Nearest-rank percentile
+        rank = math.ceil(self.percentile / 100 * len(samples))
+        return samples[min(len(samples), max(1, rank)) - 1]
+
+    def try_hedge(self, model: str) -> bool:
+        """Spend one hedge from model's allowance; False when the budget is used up."""
+        with self._lock:
+            if self._allowance.get(model, 0.0) < 1.0:
+                return False
+            self._allowance[model] -= 1.0
+            return True
+
+    def fallback(self, model: str) -> str:
+        """Model the hedge is sent to: its fallback, else the "*" one, else the same model."""
+        return self.fallbacks.get(model, self.fallbacks.get("*", model))
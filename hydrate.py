@@ -1,19 +1,184 @@
-from functools import lru_cache
+import logging
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator
 
-from config import HYDRATE_MODEL
+from config import HYDRATE_MODEL, SECTION_RETRIES, SECTION_WORKERS
 from llm import client
+from metrics import HTTP_RETRIES, HYDRATED_SECTIONS, atimed_iter, timed, timed_iter
 
+_HEADING = re.compile(r"^(#{1,6})\s+\S")
+_FENCE = re.compile(r"^\s*(```|~~~)")
 
-@lru_cache(maxsize=32)
-def hydrate_article(outline: str, model: str = HYDRATE_MODEL) -> str:
+
+def _messages(outline: str) -> list[dict]:
     if not outline or not str(outline).strip():
         raise ValueError("Outline must not be empty")
     system_prompt = (
         "You are a writing assistant. Transform the outline into a full article with "
         "context, examples, transitions."
     )
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": outline},
     ]
-    return client.chat(model=model, messages=messages)
+
+
+def hydrate_article(outline: str, model: str = HYDRATE_MODEL) -> str:
+    messages = _messages(outline)
+    with timed("hydrate_article", model):
+        return client.chat(model=model, messages=messages)
+
+
+async def ahydrate_article(outline: str, model: str = HYDRATE_MODEL) -> str:
+    messages = _messages(outline)
+    with timed("hydrate_article", model):
+        return await client.achat(model=model, messages=messages)
+
+
+def hydrate_article_stream(outline: str, model: str = HYDRATE_MODEL) -> Iterator[str]:
+    """Like hydrate_article, but yields article text chunks as they are generated."""
+    messages = _messages(outline)
+    return timed_iter("hydrate_article", model, client.chat_stream(model=model, messages=messages))
+
+
+def ahydrate_article_stream(outline: str, model: str = HYDRATE_MODEL) -> AsyncIterator[str]:
+    messages = _messages(outline)
+    return atimed_iter(
+        "hydrate_article", model, client.achat_stream(model=model, messages=messages)
+    )
+
+
+def split_sections(outline: str) -> tuple[str, list[str]]:
+    """
+    Split a Markdown outline into (preamble, sections).
+
+    Sections start at the shallowest heading level that occurs at least twice, so a
+    single '# Title' stays in the preamble while its '##' children become sections.
+    Headings inside fenced code blocks are ignored. Returns no sections when the
+    outline has no repeated heading level.
+    """
+    lines = outline.splitlines()
+    headings: list[int | None] = []
+    in_fence = False
+    for line in lines:
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        m = None if in_fence else _HEADING.match(line)
+        headings.append(len(m.group(1)) if m else None)
+
+    counts = Counter(level for level in headings if level)
+    split_level = next((lvl for lvl in sorted(counts) if counts[lvl] >= 2), None)
+    if split_level is None:
+        return outline.strip(), []
+
+    preamble: list[str] = []
+    sections: list[list[str]] = []
+    for line, level in zip(lines, headings):
+        if level == split_level:
+            sections.append([line])
+        elif sections:
+            sections[-1].append(line)
+        else:
+            preamble.append(line)
+    return "\n".join(preamble).strip(), ["\n".join(sec).strip() for sec in sections]
+
+
+def _section_messages(preamble: str, section: str) -> list[dict]:
+    system_prompt = (
+        "You are a writing assistant. Write one section of a longer article from its "
+        "outline. Keep the section heading, write only this section with context, "
+        "examples and transitions, and do not add an article-wide introduction or "
+        "conclusion."
+    )
+    messages = [{"role": "system", "content": system_prompt}]
+    if preamble:
+        messages.append({"role": "user", "content": f"Article context:\n{preamble}"})
+    messages.append({"role": "user", "content": section})
+    return messages
+
+
+def _hydrate_section(preamble: str, section: str, model: str, retries: int) -> str:
+    messages = _section_messages(preamble, section)
+    attempt = 0
+    while True:
+        try:
+            # Each section is its own LLM call, so it is also its own response-cache entry
+            with timed("hydrate_section", model):
+                return client.chat(model=model, messages=messages)
+        except RuntimeError as exc:
+            if attempt >= retries:
+                raise
+            attempt += 1
+            HTTP_RETRIES.inc(target="llm_section")
+            delay = 2 ** (attempt - 1)
+            logging.warning(f"Section hydrate failed ({exc}); retry {attempt}/{retries}")
+            time.sleep(delay)
+
+
+def _section_key(section: str, model: str, article: str) -> list:
+    # Whitespace-only edits keep a section's key. article scopes reuse to revisions of
+    # one article, so a generic "## Conclusion" is never shared between articles
+    lines = [line.rstrip() for line in section.strip().splitlines()]
+    return [model, article, "\n".join(line for line in lines if line)]
+
+
+def _is_headings_only(text: str) -> bool:
+    return all(_HEADING.match(line) for line in text.splitlines() if line.strip())
+
+
+def hydrate_article_sections(
+    outline: str,
+    model: str = HYDRATE_MODEL,
+    max_workers: int = SECTION_WORKERS,
+    retries: int = SECTION_RETRIES,
+    article: str | None = None,
+) -> str:
+    """
+    Hydrate each outline section concurrently and stitch the results back in order.
+
+    Every section request carries the outline preamble (title and intro notes) as
+    shared context. Failed sections are retried on their own, and each section is a
+    separate response-cache entry, so a timeout only costs that section.
+
+    Written sections are also stored under their own outline text and the article
+    they belong to (article, e.g. the prompt, defaulting to the outline preamble), so
+    re-running an edited outline reuses every unchanged section and only hydrates
+    added or modified ones. Outlines without repeated headings fall back to a single
+    hydrate_article call.
+    """
+    _messages(outline)  # validates non-empty outline
+    preamble, sections = split_sections(outline)
+    if len(sections) < 2:
+        return hydrate_article(outline, model=model)
+
+    # A title-only preamble is kept verbatim; intro notes are written like a section
+    parts = list(sections)
+    keep_preamble = bool(preamble) and _is_headings_only(preamble)
+    if preamble and not keep_preamble:
+        parts.insert(0, preamble)
+
+    store = client.cache
+    scope = preamble if article is None else article
+    keys = [_section_key(part, model, scope) for part in parts]
+    written = [store.get("sections", key) if store is not None else None for key in keys]
+    stale = [i for i, text in enumerate(written) if text is None]
+    if len(stale) < len(parts):
+        logging.info(f"Reusing {len(parts) - len(stale)} of {len(parts)} hydrated sections")
+    HYDRATED_SECTIONS.inc(len(parts) - len(stale), result="reused")
+    HYDRATED_SECTIONS.inc(len(stale), result="hydrated")
+
+    with (
+        timed("hydrate_article", model),
+        ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool,
+    ):
+        fresh = pool.map(lambda i: _hydrate_section(preamble, parts[i], model, retries), stale)
+        for i, text in zip(stale, fresh):
+            written[i] = text
+            if store is not None and text:
+                store.set("sections", keys[i], text)
+    if keep_preamble:
+        written.insert(0, preamble)
+    return "\n\n".join(w.strip() for w in written)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_WORKERS, JOBS_DB
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, created_at);
+"""
+
+# Identifies this process as the owner of the jobs it claims
+_OWNER_PREFIX = f"{os.getpid()}:{uuid.uuid4().hex}"
+# Cap on a worker's pause after repeated store errors
+MAX_ERROR_BACKOFF = 30.0
+
+
+class JobStore:
+    """
+    Durable job table in its own SQLite file (not the disposable response cache).
+
+    Workers claim jobs with a lease they keep renewing while running. A job whose
+    lease ran out, because its process died or restarted, is claimed again by the
+    next free worker, up to JOB_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self, path: str = JOBS_DB, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use so importing the app creates no files
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def submit(self, params: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO jobs (id, status, params, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(params, ensure_ascii=False), time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _to_dict(row) if row else None
+
+    def claim(self, owner: str, lease: float) -> dict | None:
+        """Take the oldest runnable job for owner, or None when there is nothing to do."""
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases beyond the attempt limit will not be retried
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ?, owner = NULL "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, "worker lost", now, RUNNING, now, self.max_attempts),
+                )
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, "
+                    "attempts = attempts + 1, started_at = ? WHERE id = ?",
+                    (RUNNING, owner, now + lease, now, row["id"]),
+                )
+                claimed = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return _to_dict(claimed)
+
+    def renew(self, job_id: str, owner: str, lease: float) -> None:
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + lease, job_id, owner, RUNNING),
+            )
+
+    def finish(
+        self, job_id: str, owner: str, result: dict | None = None, error: str | None = None
+    ) -> None:
+        status = FAILED if error is not None else DONE
+        payload = json.dumps(result, ensure_ascii=False) if result is not None else None
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                (status, payload, error, time.time(), job_id, owner),
+            )
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+            return {status: n for status, n in rows.fetchall()}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _to_dict(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    """
+    Bounded pool of asyncio workers running persisted jobs through runner(**params).
+
+    Jobs submitted in this process wake an idle worker at once; jobs left behind by
+    an earlier run (or another process sharing the store) are picked up by polling.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[..., Awaitable[dict]],
+        workers: int = JOB_WORKERS,
+        lease: float = JOB_LEASE_SECONDS,
+        poll_interval: float = 1.0,
+    ):
+        self.store = store
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+
+    async def submit(self, **params) -> str:
+        job_id = await asyncio.to_thread(self.store.submit, params)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> dict | None:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{_OWNER_PREFIX}:{i}")) for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        # Running jobs keep their lease until it expires and are retried on the next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def _worker(self, owner: str) -> None:
+        errors = 0
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim, owner, self.lease)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job, owner)
+                errors = 0
+            except Exception as exc:  # noqa: BLE001
+                # e.g. "database is locked" with several processes on one JOBS_DB: the
+                # worker must survive it, or the pool shrinks while jobs stay queued.
+                # A job claimed before the error is retried once its lease expires
+                errors += 1
+                delay = min(self.poll_interval * 2 ** (errors - 1), MAX_ERROR_BACKOFF)
+                logging.warning(f"Job worker {owner} error ({exc}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _heartbeat(self, job_id: str, owner: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await asyncio.to_thread(self.store.renew, job_id, owner, self.lease)
+
+    async def _run(self, job: dict, owner: str) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"], owner))
+        try:
+            result = await self.runner(**job["params"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logging.warning(f"Job {job['id']} failed: {exc}")
+            await asyncio.to_thread(self.store.finish, job["id"], owner, error=str(exc))
+        else:
+            await asyncio.to_thread(self.store.finish, job["id"], owner, result=result)
+        finally:
+            heartbeat.cancel()
@@ -1,44 +1,207 @@
+import asyncio
+import json
 import logging
 import os
+import re
+import threading
+import time
 
 import requests
 
-from config import MAX_LINKS, REQUEST_TIMEOUT, SERPAPI_KEY, USER_AGENT
+from cache_util import TieredCache
+from config import (
+    DEFAULT_CACHE_DIR,
+    LINKS_CACHE_TTL,
+    MAX_LINKS,
+    REQUEST_TIMEOUT,
+    SERPAPI_KEY,
+    SERPAPI_RETRIES,
+    SERPAPI_RETRY_BACKOFF,
+    SERPAPI_URL,
+    USER_AGENT,
+)
+from metrics import timed
+from ratelimit import limiter_for, retry_throttled
 
+# Search results keyed on (normalized query, max_links); entries older than
+# LINKS_CACHE_TTL are refreshed, but still served if SerpAPI fails
+cache = TieredCache(DEFAULT_CACHE_DIR, memory_bytes=4 * 1024 * 1024)
 
-def fetch_links(query: str, max_links: int = MAX_LINKS) -> list[str]:
-    if not query or not str(query).strip():
-        return []
-    # clamp max_links
+# Pooled keep-alive session for the sync path
+_session = None
+_session_lock = threading.Lock()
+
+# Pooled async client, re-created if used from a different event loop
+_aclient = None
+_aclient_loop = None
+
+
+def _clamp(max_links) -> int:
     try:
-        max_links = max(1, min(int(max_links), MAX_LINKS))
+        return max(1, min(int(max_links), MAX_LINKS))
     except Exception:  # noqa: BLE001
-        max_links = MAX_LINKS
+        return MAX_LINKS
+
+
+def _use_stub() -> bool:
     if os.getenv("DRY_RUN") == "1" or not SERPAPI_KEY:
         logging.info("DRY_RUN or missing SERPAPI_KEY; returning stub links")
-        return [
-            "https://example.com/article-1",
-            "https://example.com/article-2",
-            "https://example.com/article-3",
-        ][:max_links]
-
-    params = {"q": query, "api_key": SERPAPI_KEY, "num": max_links}
-    headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+        return True
+    return False
+
+
+def _stub_links(max_links: int) -> list[str]:
+    return [
+        "https://example.com/article-1",
+        "https://example.com/article-2",
+        "https://example.com/article-3",
+    ][:max_links]
+
+
+def _params(query: str, max_links: int) -> dict:
+    return {"q": query, "api_key": SERPAPI_KEY, "num": max_links}
+
+
+def _headers() -> dict:
+    return {"User-Agent": USER_AGENT, "Accept": "application/json"}
+
+
+def normalize_query(query: str) -> str:
+    # "Python  Tips!" and "python tips" are the same search
+    return " ".join(re.sub(r"[^\w\s]", " ", query).casefold().split())
+
+
+def _cached(query: str, max_links: int) -> tuple[list[str] | None, bool]:
+    """Return (links, fresh) for a cached search, or (None, False) when there is none."""
+    raw = cache.get("links", [normalize_query(query), max_links])
+    if not raw:
+        return None, False
     try:
-        resp = requests.get(
-            "https://serpapi.com/search",
-            params=params,
-            headers=headers,
-            timeout=REQUEST_TIMEOUT,
-        )
-        resp.raise_for_status()
-        payload = resp.json()
-    except requests.RequestException as exc:
-        logging.warning(f"SerpAPI request failed: {exc}")
-        return []
+        data = json.loads(raw)
+        links = [str(u) for u in data["links"]]
+        age = time.time() - float(data["fetched_at"])
+    except (ValueError, KeyError, TypeError):
+        return None, False
+    return links, age <= LINKS_CACHE_TTL
 
+
+def _store(query: str, max_links: int, links: list[str]) -> None:
+    # Empty results are not cached: they are more often a hiccup than the real answer
+    if links:
+        data = {"fetched_at": time.time(), "links": links}
+        cache.set("links", [normalize_query(query), max_links], json.dumps(data))
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(_headers())
+        return _session
+
+
+def _extract_links(query: str, payload, max_links: int) -> list[str]:
     results = payload.get("organic_results", []) if isinstance(payload, dict) else []
     links = [r.get("link") for r in results if r.get("link")]
     if not links:
         logging.warning(f"No links found for '{query}'")
     return links[:max_links]
+
+
+def _throttled(resp, attempt: int, slot) -> bool:
+    return retry_throttled(
+        slot, resp, attempt, SERPAPI_RETRIES, SERPAPI_RETRY_BACKOFF, target="serpapi"
+    )
+
+
+def fetch_links(query: str, max_links: int = MAX_LINKS) -> list[str]:
+    with timed("fetch_links"):
+        return _fetch_links(query, max_links)
+
+
+def _fetch_links(query: str, max_links: int) -> list[str]:
+    if not query or not str(query).strip():
+        return []
+    max_links = _clamp(max_links)
+    if _use_stub():
+        return _stub_links(max_links)
+    cached, fresh = _cached(query, max_links)
+    if fresh:
+        return cached
+
+    limiter = limiter_for("serpapi")
+    try:
+        for attempt in range(SERPAPI_RETRIES + 1):
+            with limiter.slot() as slot:
+                resp = _get_session().get(
+                    SERPAPI_URL,
+                    params=_params(query, max_links),
+                    timeout=REQUEST_TIMEOUT,
+                )
+                if _throttled(resp, attempt, slot):
+                    continue
+            break
+        resp.raise_for_status()
+        payload = resp.json()
+    except requests.RequestException as exc:
+        logging.warning(f"SerpAPI request failed: {exc}")
+        return cached or []
+    links = _extract_links(query, payload, max_links)
+    _store(query, max_links, links)
+    return links
+
+
+def _async_client():
+    global _aclient, _aclient_loop
+    import httpx  # lazy import
+
+    loop = asyncio.get_running_loop()
+    if _aclient is None or _aclient_loop is not loop:
+        _aclient = httpx.AsyncClient(headers=_headers(), timeout=REQUEST_TIMEOUT)
+        _aclient_loop = loop
+    return _aclient
+
+
+async def afetch_links(query: str, max_links: int = MAX_LINKS) -> list[str]:
+    with timed("fetch_links"):
+        return await _afetch_links(query, max_links)
+
+
+async def _afetch_links(query: str, max_links: int) -> list[str]:
+    if not query or not str(query).strip():
+        return []
+    max_links = _clamp(max_links)
+    if _use_stub():
+        return _stub_links(max_links)
+    # The persistent cache layer is SQLite; keep its I/O off the event loop
+    cached, fresh = await asyncio.to_thread(_cached, query, max_links)
+    if fresh:
+        return cached
+
+    import httpx  # lazy import
+
+    limiter = limiter_for("serpapi")
+    try:
+        for attempt in range(SERPAPI_RETRIES + 1):
+            async with limiter.aslot() as slot:
+                resp = await _async_client().get(SERPAPI_URL, params=_params(query, max_links))
+                if _throttled(resp, attempt, slot):
+                    continue
+            break
+        resp.raise_for_status()
+        payload = resp.json()
+    except (httpx.HTTPError, ValueError) as exc:
+        logging.warning(f"SerpAPI request failed: {exc}")
+        return cached or []
+    links = _extract_links(query, payload, max_links)
+    await asyncio.to_thread(_store, query, max_links, links)
+    return links
+
+
+async def aclose() -> None:
+    global _aclient, _aclient_loop
+    if _aclient is not None:
+        await _aclient.aclose()
+        _aclient = None
+        _aclient_loop = None
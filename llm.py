@@ -1,47 +1,430 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-from typing import Any
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures import wait
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator
 
-from config import OPENROUTER_API_KEY
+from cache_util import TieredCache
+from config import (
+    DEFAULT_CACHE_DIR,
+    LLM_CACHE,
+    LLM_HEDGE,
+    LLM_MAX_CONNECTIONS,
+    LLM_RETRIES,
+    LLM_RETRY_BACKOFF,
+    LLM_TIMEOUT,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    USER_AGENT,
+)
+from hedging import Hedger
+from metrics import LLM_ERRORS, LLM_HEDGES
+from ratelimit import limiter_for, retry_throttled
 
 
 class LLMClient:
-    def __init__(self, api_key: str | None):
+    def __init__(
+        self,
+        api_key: str | None,
+        base_url: str = OPENROUTER_BASE_URL,
+        timeout: float = LLM_TIMEOUT,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        cache: TieredCache | None = None,
+        hedger: Hedger | None = None,
+        retries: int = LLM_RETRIES,
+        retry_backoff: float = LLM_RETRY_BACKOFF,
+    ):
         self.api_key = api_key
+        # Responses are cached per (model, messages); None disables caching
+        self.cache = cache
+        # Duplicates slow chat/achat requests when set; streams are never hedged
+        self.hedger = hedger
+        # 429/503 replies are retried after Retry-After (or exponential backoff); every
+        # request goes through the adaptive per-model limiter in ratelimit.py
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
         self._client = None
+        # AsyncClient connections are bound to the loop that opened them
+        self._aclient = None
+        self._aclient_loop = None
+
+    def _headers(self) -> dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "User-Agent": USER_AGENT,
+            "X-Title": "draftsmith",
+        }
+
+    def _limits(self):
+        import httpx  # lazy import
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+
+    def _require_key(self) -> None:
+        if not self.api_key:
+            raise RuntimeError(
+                "OPENROUTER_API_KEY not set; cannot call LLM (unset DRY_RUN to require)"
+            )
 
     def _ensure(self):
         if os.getenv("DRY_RUN") == "1":
             return None
         if self._client is None:
-            if not self.api_key:
-                raise RuntimeError(
-                    "OPENROUTER_API_KEY not set; cannot call LLM (unset DRY_RUN to require)"
-                )
-            from openrouter import OpenRouterClient  # lazy import
+            self._require_key()
+            import httpx  # lazy import
 
-            self._client = OpenRouterClient(api_key=self.api_key)
+            self._client = httpx.Client(
+                base_url=self.base_url,
+                headers=self._headers(),
+                timeout=self.timeout,
+                limits=self._limits(),
+            )
         return self._client
 
-    def chat(self, model: str, messages: list[dict[str, Any]]) -> str:
+    def _aensure(self):
         if os.getenv("DRY_RUN") == "1":
-            # Simple deterministic stub for tests/demos
-            last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
-            return f"[DRY_RUN:{model}] {last_user}"
+            return None
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._require_key()
+            import httpx  # lazy import
+
+            self._aclient = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers(),
+                timeout=self.timeout,
+                limits=self._limits(),
+            )
+            self._aclient_loop = loop
+        return self._aclient
+
+    @staticmethod
+    def _dry_run_reply(model: str, messages: list[dict[str, Any]]) -> str:
+        # Simple deterministic stub for tests/demos
+        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        return f"[DRY_RUN:{model}] {last_user}"
+
+    @staticmethod
+    def _validate(model: str, messages: list[dict[str, Any]]) -> None:
         if not model or not isinstance(messages, list) or not messages:
             raise ValueError("Invalid LLM request: model and messages are required")
-        client = self._ensure()
+
+    @staticmethod
+    def _content(model: str, resp) -> str:
         try:
-            resp = client.chat.completions.create(model=model, messages=messages)
+            resp.raise_for_status()
+            payload = resp.json()
         except Exception as exc:  # noqa: BLE001
+            LLM_ERRORS.inc(model=model)
             raise RuntimeError(f"LLM request failed for model '{model}': {exc}") from exc
         # Safely unwrap content
         try:
-            return resp.choices[0].message.content  # type: ignore[attr-defined]
+            return payload["choices"][0]["message"]["content"]
         except Exception as exc:  # noqa: BLE001
+            LLM_ERRORS.inc(model=model)
             msg = "Unexpected LLM response shape: " "missing choices/message.content"
             raise RuntimeError(msg) from exc
 
+    @staticmethod
+    def _delta(model: str, line: str) -> str | None:
+        """Decode one server-sent event line of a streamed completion into its text delta."""
+        if not line.startswith("data:"):
+            # Blank separators and ': keep-alive' comments carry no content
+            return None
+        data = line[len("data:") :].strip()
+        if not data or data == "[DONE]":
+            return None
+        try:
+            payload = json.loads(data)
+        except json.JSONDecodeError as exc:
+            raise RuntimeError(f"Malformed LLM stream event for model '{model}'") from exc
+        if payload.get("error"):
+            raise RuntimeError(f"LLM stream failed for model '{model}': {payload['error']}")
+        try:
+            return payload["choices"][0]["delta"].get("content") or None
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return None
+
+    def _deltas(self, model: str, lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            text = self._delta(model, line)
+            if text:
+                yield text
+
+    def _throttled(self, resp, attempt: int, slot) -> bool:
+        return retry_throttled(
+            slot, resp, attempt, self.retries, self.retry_backoff, target="openrouter"
+        )
+
+    def _post(
+        self,
+        model: str,
+        messages: list[dict[str, Any]],
+        on_send: Callable[[], None] | None = None,
+    ) -> str:
+        limiter = limiter_for("openrouter", model)
+        started = None
+        for attempt in range(self.retries + 1):
+            with limiter.slot() as slot:
+                # Latency counts from the first send, once the slot is held, like the hedge timer
+                if started is None:
+                    started = time.perf_counter()
+                    if on_send is not None:
+                        on_send()
+                try:
+                    resp = self._ensure().post(
+                        "/chat/completions", json={"model": model, "messages": messages}
+                    )
+                except Exception as exc:  # noqa: BLE001
+                    LLM_ERRORS.inc(model=model)
+                    raise RuntimeError(f"LLM request failed for model '{model}': {exc}") from exc
+                if self._throttled(resp, attempt, slot):
+                    continue
+            text = self._content(model, resp)
+            if self.hedger is not None:
+                self.hedger.record(model, time.perf_counter() - started)
+            return text
+
+    async def _apost(
+        self,
+        model: str,
+        messages: list[dict[str, Any]],
+        on_send: Callable[[], None] | None = None,
+    ) -> str:
+        limiter = limiter_for("openrouter", model)
+        started = None
+        for attempt in range(self.retries + 1):
+            async with limiter.aslot() as slot:
+                # Latency counts from the first send, once the slot is held, like the hedge timer
+                if started is None:
+                    started = time.perf_counter()
+                    if on_send is not None:
+                        on_send()
+                try:
+                    resp = await self._aensure().post(
+                        "/chat/completions", json={"model": model, "messages": messages}
+                    )
+                except Exception as exc:  # noqa: BLE001
+                    LLM_ERRORS.inc(model=model)
+                    raise RuntimeError(f"LLM request failed for model '{model}': {exc}") from exc
+                if self._throttled(resp, attempt, slot):
+                    continue
+            text = self._content(model, resp)
+            if self.hedger is not None:
+                self.hedger.record(model, time.perf_counter() - started)
+            return text
+
+    @staticmethod
+    def _spawn(fn, *args) -> Future:
+        # Daemon thread, so an abandoned losing request never holds up interpreter exit
+        future: Future = Future()
+
+        def _run():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as exc:  # noqa: BLE001
+                future.set_exception(exc)
+
+        threading.Thread(target=_run, name="llm-hedge", daemon=True).start()
+        return future
+
+    def _hedged(self, model: str, messages: list[dict[str, Any]]) -> tuple[str, str]:
+        """
+        Send the request, and a hedge if it is slow; return (answering model, text).
+
+        A sync request that already started cannot be interrupted, so a losing request
+        runs to completion in the background and its reply is dropped.
+        """
+        delay = self.hedger.delay(model) if self.hedger is not None else None
+        if delay is None:
+            return model, self._post(model, messages)
+        # The hedge timer starts once the primary holds its limiter slot, not while it queues
+        sent = threading.Event()
+        primary = self._spawn(self._post, model, messages, sent.set)
+        primary.add_done_callback(lambda _: sent.set())
+        sent.wait()
+        try:
+            return model, primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        if not self.hedger.try_hedge(model):
+            LLM_HEDGES.inc(model=model, result="no_budget")
+            return model, primary.result()
+        alt = self.hedger.fallback(model)
+        LLM_HEDGES.inc(model=model, result="sent")
+        attempts = {primary: model, self._spawn(self._post, alt, messages): alt}
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is not primary:
+                        LLM_HEDGES.inc(model=model, result="won")
+                    return attempts[fut], fut.result()
+        # Both failed; report the original request's error
+        raise primary.exception()
+
+    async def _ahedged(self, model: str, messages: list[dict[str, Any]]) -> tuple[str, str]:
+        """Async _hedged: the losing request is cancelled and its connection closed."""
+        delay = self.hedger.delay(model) if self.hedger is not None else None
+        if delay is None:
+            return model, await self._apost(model, messages)
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._apost(model, messages, sent.set))
+        primary.add_done_callback(lambda _: sent.set())
+        attempts = {primary: model}
+        try:
+            await sent.wait()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return model, primary.result()
+            if not self.hedger.try_hedge(model):
+                LLM_HEDGES.inc(model=model, result="no_budget")
+                return model, await primary
+            alt = self.hedger.fallback(model)
+            LLM_HEDGES.inc(model=model, result="sent")
+            attempts[asyncio.ensure_future(self._apost(alt, messages))] = alt
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            LLM_HEDGES.inc(model=model, result="won")
+                        return attempts[task], task.result()
+            raise primary.exception()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    def chat(self, model: str, messages: list[dict[str, Any]]) -> str:
+        if os.getenv("DRY_RUN") == "1":
+            return self._dry_run_reply(model, messages)
+        self._validate(model, messages)
+        parts = [model, messages]
+        if self.cache is not None:
+            cached = self.cache.get("llm", parts)
+            if cached is not None:
+                return cached
+        winner, text = self._hedged(model, messages)
+        # A fallback model's reply is cached as that model's answer, not the requested one's
+        if self.cache is not None and text:
+            self.cache.set("llm", [winner, messages], text)
+        return text
+
+    async def achat(self, model: str, messages: list[dict[str, Any]]) -> str:
+        if os.getenv("DRY_RUN") == "1":
+            return self._dry_run_reply(model, messages)
+        self._validate(model, messages)
+        parts = [model, messages]
+        if self.cache is not None:
+            # The persistent layer is SQLite; keep its I/O off the event loop
+            cached = await asyncio.to_thread(self.cache.get, "llm", parts)
+            if cached is not None:
+                return cached
+        winner, text = await self._ahedged(model, messages)
+        if self.cache is not None and text:
+            await asyncio.to_thread(self.cache.set, "llm", [winner, messages], text)
+        return text
+
+    def chat_stream(self, model: str, messages: list[dict[str, Any]]) -> Iterator[str]:
+        """Yield completion text chunks as the model produces them."""
+        if os.getenv("DRY_RUN") == "1":
+            yield from re.findall(r"\S+\s*", self._dry_run_reply(model, messages))
+            return
+        self._validate(model, messages)
+        parts = [model, messages]
+        if self.cache is not None:
+            cached = self.cache.get("llm", parts)
+            if cached is not None:
+                yield cached
+                return
+        client = self._ensure()
+        body = {"model": model, "messages": messages, "stream": True}
+        pieces: list[str] = []
+        limiter = limiter_for("openrouter", model)
+        try:
+            for attempt in range(self.retries + 1):
+                # The slot is held for the whole stream
+                with limiter.slot() as slot:
+                    with client.stream("POST", "/chat/completions", json=body) as resp:
+                        if self._throttled(resp, attempt, slot):
+                            continue
+                        resp.raise_for_status()
+                        for text in self._deltas(model, resp.iter_lines()):
+                            pieces.append(text)
+                            yield text
+                break
+        except RuntimeError:
+            LLM_ERRORS.inc(model=model)
+            raise
+        except Exception as exc:  # noqa: BLE001
+            LLM_ERRORS.inc(model=model)
+            raise RuntimeError(f"LLM request failed for model '{model}': {exc}") from exc
+        if self.cache is not None and pieces:
+            self.cache.set("llm", parts, "".join(pieces))
+
+    async def achat_stream(self, model: str, messages: list[dict[str, Any]]) -> AsyncIterator[str]:
+        if os.getenv("DRY_RUN") == "1":
+            for piece in re.findall(r"\S+\s*", self._dry_run_reply(model, messages)):
+                yield piece
+            return
+        self._validate(model, messages)
+        parts = [model, messages]
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, "llm", parts)
+            if cached is not None:
+                yield cached
+                return
+        client = self._aensure()
+        body = {"model": model, "messages": messages, "stream": True}
+        pieces: list[str] = []
+        limiter = limiter_for("openrouter", model)
+        try:
+            for attempt in range(self.retries + 1):
+                async with limiter.aslot() as slot:
+                    async with client.stream("POST", "/chat/completions", json=body) as resp:
+                        if self._throttled(resp, attempt, slot):
+                            continue
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            text = self._delta(model, line)
+                            if text:
+                                pieces.append(text)
+                                yield text
+                break
+        except RuntimeError:
+            LLM_ERRORS.inc(model=model)
+            raise
+        except Exception as exc:  # noqa: BLE001
+            LLM_ERRORS.inc(model=model)
+            raise RuntimeError(f"LLM request failed for model '{model}': {exc}") from exc
+        if self.cache is not None and pieces:
+            await asyncio.to_thread(self.cache.set, "llm", parts, "".join(pieces))
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+            self._aclient_loop = None
+
 
-client = LLMClient(OPENROUTER_API_KEY)
+client = LLMClient(
+    OPENROUTER_API_KEY,
+    cache=TieredCache(DEFAULT_CACHE_DIR, enabled=LLM_CACHE),
+    hedger=Hedger() if LLM_HEDGE else None,
+)
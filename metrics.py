@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator
+
+# Seconds; wide enough for SerpAPI lookups at the low end and long hydrations at the top
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"labels": dict(zip(self.labelnames, key)), "value": value}
+                for key, value in sorted(self._values.items())
+            ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    """A value that goes up and down, set directly."""
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum, max
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0.0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] = max(series[2], value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, _) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+    def snapshot(self) -> list[dict]:
+        out = []
+        with self._lock:
+            for key, (counts, total, peak) in sorted(self._series.items()):
+                count = sum(counts)
+                out.append(
+                    {
+                        "labels": dict(zip(self.labelnames, key)),
+                        "count": count,
+                        "sum": round(total, 6),
+                        "mean": round(total / count, 6) if count else 0.0,
+                        "max": round(peak, 6),
+                        "buckets": {
+                            f"{bound:g}": sum(counts[: i + 1])
+                            for i, bound in enumerate(self.buckets)
+                        },
+                    }
+                )
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    """In-process metrics registry rendered in the Prometheus text format or as JSON."""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._metrics.setdefault(name, Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, labelnames))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "draftsmith_stage_seconds",
+    "Wall time of pipeline stages (links, scaffold, hydrate, render, publish)",
+    ("stage", "model"),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "draftsmith_cache_requests_total",
+    "Cache lookups by namespace and result (memory_hit, disk_hit, miss)",
+    ("namespace", "result"),
+)
+LLM_ERRORS = REGISTRY.counter("draftsmith_llm_errors_total", "Failed LLM requests", ("model",))
+LLM_HEDGES = REGISTRY.counter(
+    "draftsmith_llm_hedges_total",
+    "Hedged LLM requests by primary model and result (sent, won, no_budget)",
+    ("model", "result"),
+)
+SIMILAR_PROMPT_HITS = REGISTRY.counter(
+    "draftsmith_similar_prompt_reuse_total",
+    "Outlines reused from a near-duplicate earlier prompt",
+    ("model",),
+)
+HYDRATED_SECTIONS = REGISTRY.counter(
+    "draftsmith_hydrate_sections_total",
+    "Outline sections hydrated or reused unchanged from an earlier run",
+    ("result",),
+)
+HTTP_RETRIES = REGISTRY.counter(
+    "draftsmith_http_retries_total", "Retried outbound requests", ("target",)
+)
+
+LIMITER_LIMIT = REGISTRY.gauge(
+    "draftsmith_limiter_concurrency_limit",
+    "Current adaptive concurrency limit per provider (and model for the LLM)",
+    ("provider", "key"),
+)
+LIMITER_INFLIGHT = REGISTRY.gauge(
+    "draftsmith_limiter_inflight", "Requests currently holding a limiter slot", ("provider", "key")
+)
+LIMITER_THROTTLED = REGISTRY.counter(
+    "draftsmith_limiter_throttled_total",
+    "Responses that made a limiter back off (429/503)",
+    ("provider", "key"),
+)
+
+
+def timed(stage: str, model: str = ""):
+    """Context manager observing the block's duration under (stage, model)."""
+    return STAGE_SECONDS.time(stage=stage, model=model)
+
+
+def timed_iter(stage: str, model: str, chunks: Iterator[str]) -> Iterator[str]:
+    # Streams are timed from the first request to the last chunk
+    with timed(stage, model):
+        yield from chunks
+
+
+async def atimed_iter(stage: str, model: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    with timed(stage, model):
+        async for chunk in chunks:
+            yield chunk
@@ -1,16 +1,32 @@
 from pathlib import Path
+from typing import Iterable
 
-import markdown
 
+def write_output(content: str | Iterable[str], filepath: str, fmt: str = "md") -> None:
+    """
+    Write the article to filepath.
 
-def write_output(content: str, filepath: str, fmt: str = "md") -> None:
+    content may be a string or an iterable of text chunks. Chunks are appended and
+    flushed as they arrive for Markdown; HTML needs the full document, so it is
+    rendered once all chunks are in.
+    """
     # Ensure parent directory exists
     Path(filepath).parent.mkdir(parents=True, exist_ok=True)
     if fmt == "html":
-        html_body = markdown.markdown(content)
+        # Imported here: Markdown output, the common case, never needs it
+        from render import render_html
+
+        if not isinstance(content, str):
+            content = "".join(content)
+        html_body = render_html(content)
         html = f"<!DOCTYPE html><html><body>{html_body}</body></html>"
         with open(filepath, "w", encoding="utf-8") as f:
             f.write(html)
-    else:
+    elif isinstance(content, str):
         with open(filepath, "w", encoding="utf-8") as f:
             f.write(content)
+    else:
+        with open(filepath, "w", encoding="utf-8") as f:
+            for chunk in content:
+                f.write(chunk)
+                f.flush()
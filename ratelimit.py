@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+from config import PROVIDER_LIMITS
+from metrics import HTTP_RETRIES, LIMITER_INFLIGHT, LIMITER_LIMIT, LIMITER_THROTTLED
+
+# Responses that mean "slow down" rather than "broken"
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value: str | None, default: float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return default
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, when.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker talking to one server.
+
+    acquire() blocks until a token is available. pause() makes every caller wait
+    until a point in time, e.g. when the server answered 429 with Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take one token if available (returns 0.0), else return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Take one token, sleeping as needed; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def release(self, throttled: bool = False, succeeded: bool = True) -> None:
+        # Rate-only limiter: nothing is held between acquire() and the response
+        return None
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all callers for seconds; the bucket restarts empty afterwards."""
+        with self._lock:
+            until = time.monotonic() + max(0.0, seconds)
+            if until > self._paused_until:
+                self._paused_until = until
+                self._tokens = 0.0
+                self._updated = until
+
+
+def retry_throttled(slot, resp, attempt: int, retries: int, backoff: float, target: str) -> bool:
+    """
+    Report a 429/503 response on the limiter slot; True when the caller should retry it.
+
+    The wait (Retry-After, else backoff * 2**attempt) is applied by the limiter to every
+    caller once the slot is released. Works with requests and httpx responses.
+    """
+    if resp.status_code not in THROTTLE_STATUSES:
+        if resp.status_code >= 500:
+            # Server errors are not throttling, but not a reason to grow the limit either
+            slot.failed()
+        return False
+    delay = parse_retry_after(resp.headers.get("Retry-After"), default=backoff * (2**attempt))
+    slot.throttled(delay)
+    if attempt >= retries:
+        return False
+    logging.warning(f"{target} throttled ({resp.status_code}); retrying in {delay:.1f}s")
+    HTTP_RETRIES.inc(target=target)
+    return True
+
+
+class _Slot:
+    def __init__(self):
+        self.is_throttled = False
+        self.succeeded = True
+        self.retry_after: float | None = None
+
+    def failed(self) -> None:
+        """Mark the response as an error: the slot is returned without growing the limit."""
+        self.succeeded = False
+
+    def throttled(self, retry_after: float | None = None) -> None:
+        """Mark the response as a 429/503; retry_after also pauses every caller."""
+        self.is_throttled = True
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit plus an optional TokenBucket, shared by all calls to a provider.
+
+    Each successful response raises the limit by 1/limit (about +1 per limit's worth of
+    requests); a throttled one halves it, at most once per `cooldown` so one burst of
+    429s counts as a single signal. Errors, exceptions and cancellations leave it as is.
+    Concurrency then settles just under the level at which the provider starts refusing
+    work. Use `with limiter.slot() as slot:` (or
+    `async with limiter.aslot()`), calling `slot.throttled(retry_after)` on a 429.
+    """
+
+    def __init__(
+        self,
+        initial: float = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        rate: float | None = None,
+        burst: int = 1,
+        provider: str = "",
+        key: str = "",
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.labels = {"provider": provider, "key": key}
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._inflight = 0
+        self._paused_until = 0.0
+        self._last_cut = float("-inf")
+        self._cond = threading.Condition()
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _publish(self) -> None:
+        LIMITER_LIMIT.set(self.limit, **self.labels)
+        LIMITER_INFLIGHT.set(self._inflight, **self.labels)
+
+    def _try_enter(self) -> float | None:
+        # Caller holds _cond. 0.0 = slot taken; seconds to wait while paused; None = full
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._inflight >= self.limit:
+            return None
+        self._inflight += 1
+        self._publish()
+        return 0.0
+
+    def acquire(self) -> float:
+        """Block for a concurrency slot (and rate token); returns the seconds waited."""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                delay = self._try_enter()
+                if delay == 0.0:
+                    break
+                self._cond.wait(delay)
+        if self.bucket is not None:
+            try:
+                self.bucket.acquire()
+            except BaseException:
+                self.release(succeeded=False)
+                raise
+        return time.monotonic() - started
+
+    async def aacquire(self, poll_interval: float = 0.02) -> float:
+        # Threads are woken by the condition; coroutines poll so they never block the loop
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                delay = self._try_enter()
+            if delay == 0.0:
+                break
+            await asyncio.sleep(poll_interval if delay is None else delay)
+        try:
+            while self.bucket is not None:
+                delay = self.bucket.try_acquire()
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+        except BaseException:
+            # Cancelled (e.g. a losing hedge) while waiting for a rate token: hand the
+            # slot back, or the limit would shrink for good
+            self.release(succeeded=False)
+            raise
+        return time.monotonic() - started
+
+    def release(self, throttled: bool = False, succeeded: bool = True) -> None:
+        with self._cond:
+            self._inflight = max(0, self._inflight - 1)
+            now = time.monotonic()
+            if throttled:
+                LIMITER_THROTTLED.inc(**self.labels)
+                if now - self._last_cut >= self.cooldown:
+                    self._limit = max(float(self.min_limit), self._limit * self.decrease)
+                    self._last_cut = now
+            elif succeeded:
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+            self._publish()
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for seconds, e.g. for a Retry-After header."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, seconds))
+        if self.bucket is not None:
+            self.bucket.pause(seconds)
+
+    def _finish(self, slot: _Slot) -> None:
+        self.release(slot.is_throttled, slot.succeeded)
+        if slot.retry_after is not None:
+            self.pause(slot.retry_after)
+
+    @contextmanager
+    def slot(self) -> Iterator[_Slot]:
+        self.acquire()
+        slot = _Slot()
+        try:
+            yield slot
+        except BaseException:
+            slot.failed()
+            raise
+        finally:
+            self._finish(slot)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[_Slot]:
+        await self.aacquire()
+        slot = _Slot()
+        try:
+            yield slot
+        except BaseException:
+            slot.failed()
+            raise
+        finally:
+            self._finish(slot)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                **self.labels,
+                "limit": self.limit,
+                "inflight": self._inflight,
+                "rate": self.bucket.rate if self.bucket else None,
+            }
+
+
+_limiters: dict[tuple[str, str], AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(provider: str, key: str = "") -> AdaptiveLimiter:
+    """
+    The process-wide limiter for provider (and key, e.g. the LLM model or a site's host).
+
+    Settings come from config.PROVIDER_LIMITS; every key of a provider gets its own
+    limit with the provider's settings.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get((provider, key))
+        if limiter is None:
+            settings = PROVIDER_LIMITS.get(provider, {})
+            limiter = _limiters[(provider, key)] = AdaptiveLimiter(
+                initial=settings.get("initial", 4),
+                max_limit=settings.get("max", 64),
+                rate=settings.get("rate") or None,
+                burst=settings.get("burst", 1),
+                provider=provider,
+                key=key,
+            )
+        return limiter
+
+
+def limiters() -> list[dict]:
+    """Current limits of every limiter created in this process."""
+    with _limiters_lock:
+        current = list(_limiters.values())
+    return [limiter.snapshot() for limiter in current]
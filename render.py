@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable
+
+from cache_util import TieredCache
+from config import DEFAULT_CACHE_DIR, HTML_CACHE_BYTES, MARKDOWN_BACKEND
+from metrics import timed
+
+# name -> factory returning a render(markdown_text) -> html callable; factories run once
+BACKENDS: dict[str, Callable[[], Callable[[str], str]]] = {}
+
+
+def register_backend(name: str, factory: Callable[[], Callable[[str], str]]) -> None:
+    BACKENDS[name] = factory
+
+
+def _python_markdown() -> Callable[[str], str]:
+    import markdown
+
+    # A Markdown instance is reusable after reset() but not thread-safe: one per thread
+    local = threading.local()
+
+    def render(text: str) -> str:
+        parser = getattr(local, "parser", None)
+        if parser is None:
+            parser = local.parser = markdown.Markdown()
+        return parser.reset().convert(text)
+
+    return render
+
+
+def _markdown_it() -> Callable[[str], str]:
+    from markdown_it import MarkdownIt
+
+    # Parser state lives per call, so one configured instance is shared by all threads
+    return MarkdownIt("commonmark", {"html": True}).enable("table").render
+
+
+register_backend("markdown", _python_markdown)
+register_backend("markdown-it", _markdown_it)
+
+
+class Renderer:
+    """
+    Markdown to HTML with a configured backend and a content-keyed HTML cache.
+
+    Rendered HTML is kept in the shared cache store (namespace "html") behind an
+    in-process layer: an article rendered for publishing is not rendered again to
+    write the HTML file or to display it, and publish-batch or a later run over the
+    same articles reads the HTML instead of re-rendering it.
+    """
+
+    def __init__(
+        self,
+        backend: str = MARKDOWN_BACKEND,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        cache_bytes: int = HTML_CACHE_BYTES,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown Markdown backend: {backend}")
+        self.backend = backend
+        self.cache = TieredCache(cache_dir, memory_bytes=cache_bytes)
+        self._render: Callable[[str], str] | None = None
+        self._lock = threading.Lock()
+
+    def _renderer(self) -> Callable[[str], str]:
+        with self._lock:
+            if self._render is None:
+                try:
+                    self._render = BACKENDS[self.backend]()
+                except ImportError as exc:
+                    # Optional backends fall back to the default Python-Markdown one
+                    logging.warning(f"Markdown backend '{self.backend}' unavailable ({exc})")
+                    self.backend = "markdown"
+                    self._render = BACKENDS["markdown"]()
+            return self._render
+
+    def html(self, text: str) -> str:
+        render = self._renderer()
+        # Keyed by backend too: switching backends must not serve the other's markup
+        parts = [self.backend, text]
+        cached = self.cache.get("html", parts)
+        if cached is not None:
+            return cached
+        with timed("render_markdown"):
+            html = render(text)
+        self.cache.set("html", parts, html)
+        return html
+
+
+renderer = Renderer()
+
+
+def render_html(text: str) -> str:
+    return renderer.html(text)
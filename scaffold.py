@@ -1,11 +1,26 @@
-from functools import lru_cache
+import asyncio
+import os
 
 from config import SCAFFOLD_MODEL
 from llm import client
+from metrics import SIMILAR_PROMPT_HITS, timed
+from similar import PromptIndex
 
+# Earlier prompts and their outlines, for reusing the outline of a near-duplicate prompt
+index = PromptIndex()
 
-@lru_cache(maxsize=32)
-def _scaffold_article_cached(prompt: str, links_key: tuple[str, ...], model: str) -> str:
+
+def _sources_block(sources: list[dict]) -> str:
+    lines = ["Source summaries:"]
+    for src in sources:
+        label = f"{src['title']} ({src['url']})" if src.get("title") else src["url"]
+        lines.append(f"- {label}: {src['summary']}")
+    return "\n".join(lines)
+
+
+def _messages(
+    prompt: str, links_key: tuple[str, ...], sources: list[dict] | None = None
+) -> list[dict]:
     system_prompt = (
         "You are an article scaffold generator. Output a detailed outline with headings "
         "and bullets."
@@ -16,13 +31,59 @@ def _scaffold_article_cached(prompt: str, links_key: tuple[str, ...], model: str
     ]
     if links_key:
         messages.append({"role": "user", "content": f"Links: {list(links_key)}"})
-    return client.chat(model=model, messages=messages)
+    if sources:
+        messages.append({"role": "user", "content": _sources_block(sources)})
+    return messages
 
 
-def scaffold_article(
-    prompt: str, links: list[str] | None = None, model: str = SCAFFOLD_MODEL
-) -> str:
+def _links_key(prompt: str, links: list[str] | None) -> tuple[str, ...]:
     if not prompt or not str(prompt).strip():
         raise ValueError("Prompt must not be empty")
-    links_key: tuple[str, ...] = tuple(links) if links else ()
-    return _scaffold_article_cached(prompt, links_key, model)
+    return tuple(links) if links else ()
+
+
+def _use_index(sources: list[dict] | None) -> bool:
+    # Outlines built from fetched source summaries are specific to those pages; dry-run
+    # stubs are never indexed
+    return index.enabled and not sources and os.getenv("DRY_RUN") != "1"
+
+
+def scaffold_article(
+    prompt: str,
+    links: list[str] | None = None,
+    model: str = SCAFFOLD_MODEL,
+    sources: list[dict] | None = None,
+) -> str:
+    messages = _messages(prompt, _links_key(prompt, links), sources)
+    use_index = _use_index(sources)
+    if use_index:
+        reused = index.reusable(prompt, model, links)
+        if reused is not None:
+            SIMILAR_PROMPT_HITS.inc(model=model)
+            return reused
+    with timed("scaffold_article", model):
+        outline = client.chat(model=model, messages=messages)
+    if use_index:
+        index.add(prompt, model, links, outline)
+    return outline
+
+
+async def ascaffold_article(
+    prompt: str,
+    links: list[str] | None = None,
+    model: str = SCAFFOLD_MODEL,
+    sources: list[dict] | None = None,
+) -> str:
+    messages = _messages(prompt, _links_key(prompt, links), sources)
+    use_index = _use_index(sources)
+    if use_index:
+        # The index is SQLite; keep its I/O off the event loop
+        reused = await asyncio.to_thread(index.reusable, prompt, model, links)
+        if reused is not None:
+            SIMILAR_PROMPT_HITS.inc(model=model)
+            return reused
+    with timed("scaffold_article", model):
+        outline = await client.achat(model=model, messages=messages)
+    if use_index:
+        await asyncio.to_thread(index.add, prompt, model, links, outline)
+    return outline
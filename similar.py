@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from cache_util import cache_read, cache_write
+from config import CACHE_TTLS, DEFAULT_CACHE_DIR, SIMILAR_PROMPTS, SIMILARITY_THRESHOLD
+
+DB_NAME = "similar.sqlite3"
+# Outlines live in the cache store (budget, TTL and eviction included); the index only
+# keeps prompts and their LSH buckets and forgets prompts whose outline is gone
+NAMESPACE = "outlines"
+# Bump when the layout changes; the index is disposable and rebuilt from new scaffolds
+SCHEMA_VERSION = 2
+SHINGLE = 3
+# 16 bands x 4 rows: pairs above ~0.5 Jaccard almost always share a band; the candidates
+# are then checked against the exact shingle similarity
+BANDS, ROWS = 16, 4
+NUM_PERM = BANDS * ROWS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20261018)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (scope, normalized)
+);
+CREATE TABLE IF NOT EXISTS bands (
+    scope TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    prompt_id INTEGER NOT NULL,
+    PRIMARY KEY (scope, band, bucket, prompt_id)
+) WITHOUT ROWID;
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, punctuation to spaces, collapsed whitespace."""
+    return " ".join(re.sub(r"[^\w]+", " ", prompt.lower()).split())
+
+
+def shingles(normalized: str, k: int = SHINGLE) -> set[str]:
+    if len(normalized) <= k:
+        return {normalized}
+    return {normalized[i : i + k] for i in range(len(normalized) - k + 1)}
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def minhash(items: set[str]) -> list[int]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in items
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def _buckets(signature: list[int]) -> list[str]:
+    return [
+        hashlib.blake2b(
+            json.dumps(signature[band * ROWS : (band + 1) * ROWS]).encode(), digest_size=8
+        ).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+def _years(normalized: str) -> set[str]:
+    return set(re.findall(r"\b(?:19|20)\d\d\b", normalized))
+
+
+def _scope(model: str, links: list[str] | None) -> str:
+    # Outlines are only interchangeable for the same model and reference links
+    raw = json.dumps([model, list(links or [])], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PromptIndex:
+    """
+    MinHash/LSH index of scaffolded prompts, stored in the cache dir.
+
+    The outlines themselves are kept in the cache store (namespace "outlines"), so
+    CACHE_MAX_BYTES and CACHE_TTLS apply to them; a prompt whose outline has been
+    evicted or has expired drops out of the index.
+
+    mode "suggest" only logs a close match; "reuse" returns its outline instead of
+    calling the model; "off" neither looks up nor records prompts.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        threshold: float = SIMILARITY_THRESHOLD,
+        mode: str = SIMILAR_PROMPTS,
+    ):
+        self.cache_dir = cache_dir
+        self.threshold = threshold
+        self.mode = mode
+        self._conns: dict[Path, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("suggest", "reuse")
+
+    def _db(self) -> sqlite3.Connection:
+        # Caller holds _lock. Connections are kept per path since cache_dir can be changed
+        path = Path(self.cache_dir).resolve() / DB_NAME
+        conn = self._conns.get(path)
+        if conn is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(path), timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("BEGIN IMMEDIATE")
+                # Re-check under the write lock in case another process just rebuilt it
+                if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    conn.execute("DROP TABLE IF EXISTS prompts")
+                    conn.execute("DROP TABLE IF EXISTS bands")
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.execute("COMMIT")
+            conn.executescript(_SCHEMA)
+            self._conns[path] = conn
+        return conn
+
+    def search(
+        self, prompt: str, model: str, links: list[str] | None = None, limit: int = 5
+    ) -> list[dict]:
+        """Indexed prompts at or above the threshold, most similar first."""
+        normalized = normalize_prompt(prompt)
+        grams = shingles(normalized)
+        scope = _scope(model, links)
+        buckets = _buckets(minhash(grams))
+        try:
+            with self._lock:
+                conn = self._db()
+                placeholders = " OR ".join("(band = ? AND bucket = ?)" for _ in buckets)
+                params = [p for pair in enumerate(buckets) for p in pair]
+                rows = conn.execute(
+                    "SELECT DISTINCT p.id, p.normalized, p.prompt FROM bands b "
+                    "JOIN prompts p ON p.id = b.prompt_id "
+                    f"WHERE b.scope = ? AND ({placeholders})",
+                    [scope, *params],
+                ).fetchall()
+        except sqlite3.Error as exc:
+            logging.warning(f"Similar-prompt lookup failed: {exc}")
+            return []
+        candidates = []
+        years = _years(normalized)
+        for prompt_id, other, original in rows:
+            score = jaccard(grams, shingles(other))
+            # "best pumps 2025" and "best pumps 2026" look alike but are different articles
+            if score >= self.threshold and _years(other) == years:
+                candidates.append((score, prompt_id, other, original))
+        candidates.sort(reverse=True)
+        matches, gone = [], []
+        for score, prompt_id, other, original in candidates:
+            if len(matches) >= limit:
+                break
+            outline = cache_read(self.cache_dir, NAMESPACE, [scope, other])
+            if outline is None:
+                # Evicted or expired in the cache store
+                gone.append(prompt_id)
+                continue
+            matches.append({"prompt": original, "similarity": score, "outline": outline})
+        if gone:
+            self._forget(gone)
+        return matches
+
+    def _forget(self, prompt_ids: list[int]) -> None:
+        try:
+            with self._lock:
+                conn = self._db()
+                marks = ", ".join("?" for _ in prompt_ids)
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(f"DELETE FROM bands WHERE prompt_id IN ({marks})", prompt_ids)
+                    conn.execute(f"DELETE FROM prompts WHERE id IN ({marks})", prompt_ids)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as exc:
+            logging.warning(f"Similar-prompt index cleanup failed: {exc}")
+
+    def add(self, prompt: str, model: str, links: list[str] | None, outline: str) -> None:
+        if not outline:
+            return
+        normalized = normalize_prompt(prompt)
+        scope = _scope(model, links)
+        buckets = _buckets(minhash(shingles(normalized)))
+        cache_write(self.cache_dir, NAMESPACE, [scope, normalized], outline)
+        now = time.time()
+        ttl = CACHE_TTLS.get(NAMESPACE)
+        try:
+            with self._lock:
+                conn = self._db()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if ttl:
+                        # Their outlines have expired in the cache store
+                        conn.execute(
+                            "DELETE FROM bands WHERE prompt_id IN "
+                            "(SELECT id FROM prompts WHERE created_at < ?)",
+                            (now - ttl,),
+                        )
+                        conn.execute("DELETE FROM prompts WHERE created_at < ?", (now - ttl,))
+                    conn.execute(
+                        "INSERT INTO prompts (scope, normalized, prompt, created_at) "
+                        "VALUES (?, ?, ?, ?) ON CONFLICT (scope, normalized) DO UPDATE SET "
+                        "prompt = excluded.prompt, created_at = excluded.created_at",
+                        (scope, normalized, prompt, now),
+                    )
+                    prompt_id = conn.execute(
+                        "SELECT id FROM prompts WHERE scope = ? AND normalized = ?",
+                        (scope, normalized),
+                    ).fetchone()[0]
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO bands (scope, band, bucket, prompt_id) "
+                        "VALUES (?, ?, ?, ?)",
+                        [(scope, band, bucket, prompt_id) for band, bucket in enumerate(buckets)],
+                    )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as exc:
+            logging.warning(f"Similar-prompt index update failed: {exc}")
+
+    def reusable(self, prompt: str, model: str, links: list[str] | None = None) -> str | None:
+        """
+        Outline of the closest indexed prompt when mode is "reuse"; None otherwise.
+
+        In "suggest" mode a close match is only logged.
+        """
+        if not self.enabled:
+            return None
+        matches = self.search(prompt, model, links, limit=1)
+        if not matches:
+            return None
+        best = matches[0]
+        if normalize_prompt(best["prompt"]) == normalize_prompt(prompt) and self.mode != "reuse":
+            # Same prompt again: the LLM response cache already covers it
+            return None
+        if self.mode == "reuse":
+            logging.info(
+                f"Reusing outline of similar prompt '{best['prompt']}' "
+                f"(similarity {best['similarity']:.2f})"
+            )
+            return best["outline"]
+        logging.info(
+            f"Similar prompt already scaffolded: '{best['prompt']}' "
+            f"(similarity {best['similarity']:.2f}); set SIMILAR_PROMPTS=reuse "
+            "or pass --reuse-similar to reuse its outline"
+        )
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, TypeVar
+
+from cache_util import acquire_lease, lease_held, release_lease
+
+T = TypeVar("T")
+
+# Identifies this process as a lease owner in the shared store
+_OWNER_PREFIX = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight coroutine.
+
+    The first caller starts the work as a task; later callers with the same key await
+    that task instead of starting their own. The task is shielded, so a caller that
+    disconnects does not cancel the work the other waiters depend on.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+async def coalesce_across_processes(
+    cache_dir: str,
+    key: str,
+    fn: Callable[[], Awaitable[T]],
+    ttl: float,
+    poll_interval: float = 0.5,
+) -> T:
+    """
+    Run fn while holding a shared lease on key; if another process holds it, wait first.
+
+    Waiters run fn once the holder releases (or the lease expires). By then the holder's
+    LLM responses are in the shared response cache, so their fn calls are cache hits.
+    """
+    owner = f"{_OWNER_PREFIX}:{uuid.uuid4().hex}"
+    name = f"flight:{key}"
+    if not await asyncio.to_thread(acquire_lease, cache_dir, name, owner, ttl):
+        logging.info(f"Waiting for identical generation in another worker ({key[:12]})")
+        deadline = time.monotonic() + ttl
+        while time.monotonic() < deadline and await asyncio.to_thread(lease_held, cache_dir, name):
+            await asyncio.sleep(poll_interval)
+        return await fn()
+    try:
+        return await fn()
+    finally:
+        await asyncio.to_thread(release_lease, cache_dir, name, owner)
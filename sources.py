@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache_util import TieredCache
+from config import (
+    DEFAULT_CACHE_DIR,
+    REQUEST_TIMEOUT,
+    SOURCE_MAX_BYTES,
+    SOURCE_SUMMARY_CHARS,
+    SOURCE_WORKERS,
+    USER_AGENT,
+)
+from ratelimit import THROTTLE_STATUSES, limiter_for, parse_retry_after
+
+# Extracted page text with its validators; revalidated with If-None-Match/If-Modified-Since
+cache = TieredCache(DEFAULT_CACHE_DIR, memory_bytes=16 * 1024 * 1024)
+
+_session = None
+_session_lock = threading.Lock()
+
+# Content in these elements is never part of the article text
+_SKIP = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg"}
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the <title> and paragraph text of a page, ignoring page chrome."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.paragraphs: list[str] = []
+        self.other: list[str] = []
+        self._skip = 0
+        self._in_title = False
+        self._para: list[str] | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "p" and not self._skip:
+            self._para = []
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP and self._skip:
+            self._skip -= 1
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "p" and self._para is not None:
+            text = " ".join("".join(self._para).split())
+            if text:
+                self.paragraphs.append(text)
+            self._para = None
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif self._skip:
+            return
+        elif self._para is not None:
+            self._para.append(data)
+        elif data.strip():
+            self.other.append(data.strip())
+
+
+def extract_text(html: str) -> tuple[str, str]:
+    """Return (title, main text) of an HTML page."""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as exc:  # noqa: BLE001
+        logging.debug(f"HTML parse stopped early: {exc}")
+    # Pages without <p> markup fall back to all visible text
+    body = "\n".join(parser.paragraphs) or " ".join(parser.other)
+    return " ".join(parser.title.split()), body
+
+
+def summarize(text: str, max_chars: int = SOURCE_SUMMARY_CHARS) -> str:
+    """Leading sentences of text, up to max_chars."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    return cut[: end + 1] if end > max_chars // 3 else cut.rsplit(" ", 1)[0] + "…"
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=SOURCE_WORKERS, pool_maxsize=SOURCE_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers.update({"User-Agent": USER_AGENT, "Accept": "text/html,*/*;q=0.5"})
+        return _session
+
+
+def _cached(url: str) -> dict | None:
+    raw = cache.get("pages", [url])
+    if not raw:
+        return None
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _read_html(resp) -> str:
+    # Stop at SOURCE_MAX_BYTES; the start of a page holds what a summary needs
+    chunks: list[bytes] = []
+    total = 0
+    for chunk in resp.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        total += len(chunk)
+        if total >= SOURCE_MAX_BYTES:
+            break
+    raw = b"".join(chunks)[:SOURCE_MAX_BYTES]
+    try:
+        return raw.decode(resp.encoding or "utf-8", errors="replace")
+    except LookupError:
+        # Unknown charset in the Content-Type header
+        return raw.decode("utf-8", errors="replace")
+
+
+def fetch_page(url: str) -> dict | None:
+    """
+    Fetch one page and return {"url", "title", "text"}, or None for a dead link.
+
+    A cached copy is revalidated with its ETag/Last-Modified and reused on 304, or
+    when the site cannot be reached.
+    """
+    cached = _cached(url)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    # Sources are fetched once per run, so a throttled site is not retried, only paced
+    limiter = limiter_for("sources", urlsplit(url).netloc)
+    try:
+        with (
+            limiter.slot() as slot,
+            _get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as resp,
+        ):
+            throttled = resp.status_code in THROTTLE_STATUSES
+            if throttled:
+                slot.throttled(parse_retry_after(resp.headers.get("Retry-After")))
+            elif resp.status_code >= 500:
+                slot.failed()
+            if (resp.status_code == 304 or throttled) and cached:
+                return {"url": url, "title": cached["title"], "text": cached["text"]}
+            if resp.status_code >= 400:
+                logging.info(f"Dropping source {url}: HTTP {resp.status_code}")
+                return None
+            ctype = resp.headers.get("Content-Type", "")
+            if ctype and "html" not in ctype and not ctype.startswith("text/"):
+                logging.info(f"Dropping source {url}: {ctype}")
+                return None
+            title, text = extract_text(_read_html(resp))
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+    except requests.RequestException as exc:
+        if cached:
+            return {"url": url, "title": cached["title"], "text": cached["text"]}
+        logging.info(f"Dropping source {url}: {exc}")
+        return None
+    if not text:
+        return None
+    # Pages without validators are re-downloaded next time, but still back up failures
+    data = {
+        "title": title,
+        "text": text,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+    }
+    cache.set("pages", [url], json.dumps(data, ensure_ascii=False))
+    return {"url": url, "title": title, "text": text}
+
+
+def fetch_sources(links: list[str] | None, max_workers: int = SOURCE_WORKERS) -> list[dict]:
+    """
+    Fetch links concurrently and return {"url", "title", "summary"} per live page.
+
+    Order follows links; dead or non-HTML links are dropped. DRY_RUN fetches nothing.
+    """
+    if not links or os.getenv("DRY_RUN") == "1":
+        return []
+    urls = list(dict.fromkeys(u for u in links if re.match(r"https?://", u)))
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+        pages = list(pool.map(fetch_page, urls))
+    return [
+        {"url": p["url"], "title": p["title"], "summary": summarize(p["text"])}
+        for p in pages
+        if p is not None
+    ]
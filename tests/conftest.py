@@ -11,6 +11,8 @@ from __future__ import annotations
 import sys
 from pathlib import Path
 
+import pytest
+
 
 def _ensure_project_root_on_syspath() -> None:
     # tests/ -> repo root
@@ -21,3 +23,24 @@ def _ensure_project_root_on_syspath() -> None:
 
 
 _ensure_project_root_on_syspath()
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_dir(monkeypatch, tmp_path):
+    # The LLM response and rendered HTML caches would otherwise write .cache/ in the
+    # checkout; the CLI's --cache-dir default (read again when cli is reloaded) follows,
+    # and clients rebuilt by reloading llm start without a cache
+    import cli
+    import config
+    import llm
+    import render
+    import scaffold
+    from cache_util import TieredCache
+
+    cache_dir = str(tmp_path / ".cache")
+    monkeypatch.setenv("LLM_CACHE", "0")
+    monkeypatch.setattr(config, "DEFAULT_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(cli, "DEFAULT_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(llm.client, "cache", TieredCache(cache_dir))
+    monkeypatch.setattr(scaffold.index, "cache_dir", cache_dir)
+    monkeypatch.setattr(render.renderer, "cache", TieredCache(cache_dir))
@@ -0,0 +1,131 @@
+import json
+import sys
+
+import batch
+
+
+def _write_prompts(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_load_batch_accepts_json_and_plain_lines(tmp_path):
+    src = tmp_path / "prompts.jsonl"
+    _write_prompts(
+        src,
+        [
+            '{"prompt": "Alpha", "links": ["http://a"], "output": "alpha.md"}',
+            '"Beta"',
+            "# comment",
+            "",
+            "Gamma plain",
+        ],
+    )
+    items = batch.load_batch(str(src))
+    assert [i["prompt"] for i in items] == ["Alpha", "Beta", "Gamma plain"]
+    assert items[0]["links"] == ["http://a"] and items[0]["output"] == "alpha.md"
+    assert items[1]["links"] is None and items[2]["line"] == 5
+
+
+def test_run_batch_dedupes_and_writes_manifest(tmp_path):
+    src = tmp_path / "prompts.jsonl"
+    _write_prompts(src, ['"Same"', '"Other"', '"Same"', '{"prompt": ""}', '"Boom"'])
+    calls = []
+
+    def _generate(prompt, links):
+        calls.append(prompt)
+        if prompt == "Boom":
+            raise RuntimeError("model down")
+        return f"# {prompt}"
+
+    out_dir = tmp_path / "out"
+    summary = batch.run_batch(str(src), _generate, str(out_dir), workers=3)
+
+    assert sorted(calls) == ["Boom", "Other", "Same"]
+    assert summary == {
+        "total": 5,
+        "unique": 3,
+        "ok": 3,
+        "failed": 2,
+        "manifest": str(out_dir / "manifest.jsonl"),
+    }
+    records = [json.loads(line) for line in (out_dir / "manifest.jsonl").read_text().splitlines()]
+    by_line = {r["line"]: r for r in records}
+    assert by_line[3]["duplicate_of"] == 1 and by_line[3]["status"] == "ok"
+    assert by_line[4]["status"] == "error" and by_line[5]["error"] == "model down"
+    assert (out_dir / "00003-same.md").read_text(encoding="utf-8") == "# Same"
+
+
+def test_cli_batch_mode_dry_run(tmp_path, monkeypatch):
+    import cli
+
+    src = tmp_path / "prompts.jsonl"
+    _write_prompts(src, ['{"prompt": "First", "output": "first.md"}', '"Second"'])
+    out_dir = tmp_path / "articles"
+    argv = [
+        "cli.py",
+        "--batch",
+        str(src),
+        "--output-dir",
+        str(out_dir),
+        "--workers",
+        "2",
+        "--dry-run",
+        "--no-cache",
+    ]
+    # Registers DRY_RUN with monkeypatch so the value --dry-run sets is undone afterwards
+    monkeypatch.setenv("DRY_RUN", "0")
+    monkeypatch.setattr(sys, "argv", argv)
+    cli.main()
+
+    assert "[DRY_RUN:" in (out_dir / "first.md").read_text(encoding="utf-8")
+    assert len((out_dir / "manifest.jsonl").read_text().splitlines()) == 2
+
+
+def test_run_publish_batch_resumes_from_journal(tmp_path):
+    articles = tmp_path / "articles"
+    articles.mkdir()
+    (articles / "a.md").write_text("# Alpha\n\nBody", encoding="utf-8")
+    (articles / "b.html").write_text(
+        "<!DOCTYPE html><html><body><h1>Beta</h1><p>x</p></body></html>", encoding="utf-8"
+    )
+    (articles / "c.md").write_text("no heading", encoding="utf-8")
+    posted = []
+
+    def _publish(title, html):
+        posted.append((title, html))
+        if title == "c" and len(posted) < 4:
+            raise RuntimeError("HTTP 500")
+        return {"id": len(posted), "link": f"https://wp/?p={len(posted)}"}
+
+    first = batch.run_publish_batch(str(articles), _publish, workers=2)
+    assert first["ok"] == 2 and first["failed"] == 1 and first["skipped"] == 0
+    # The H1 that became the title is not repeated in the body
+    assert ("Alpha", "<p>Body</p>") in posted
+    assert ("Beta", "<p>x</p>") in posted
+
+    # Re-run: only the failed article is posted again
+    second = batch.run_publish_batch(str(articles), _publish, workers=2)
+    assert second == {
+        "total": 3,
+        "skipped": 2,
+        "ok": 1,
+        "failed": 0,
+        "journal": str(articles / batch.JOURNAL_NAME),
+    }
+    assert [t for t, _ in posted].count("Alpha") == 1
+    records = [json.loads(line) for line in open(second["journal"], encoding="utf-8")]
+    assert len(records) == 4 and records[-1]["status"] == "ok"
+
+
+def test_load_articles_from_manifest(tmp_path):
+    (tmp_path / "one.md").write_text("# One", encoding="utf-8")
+    manifest = tmp_path / "manifest.jsonl"
+    rows = [
+        {"prompt": "First", "output": str(tmp_path / "one.md"), "status": "ok"},
+        {"prompt": "Failed", "output": None, "status": "error"},
+        {"prompt": "First", "output": str(tmp_path / "one.md"), "status": "ok"},
+    ]
+    manifest.write_text("\n".join(json.dumps(r) for r in rows) + "\n{torn", encoding="utf-8")
+    assert batch.load_articles(str(manifest)) == [
+        {"path": str(tmp_path / "one.md"), "title": "First"}
+    ]
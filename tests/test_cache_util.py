@@ -1,3 +1,6 @@
+import random
+import sqlite3
+import string
 from pathlib import Path
 
 from cache_util import cache_read, cache_write
@@ -21,3 +24,148 @@ def test_cache_is_keyed_by_parts(tmp_path: Path):
     cache_write(cache_dir, "ns", ["y"], "VY")
     assert cache_read(cache_dir, "ns", ["x"]) == "VX"
     assert cache_read(cache_dir, "ns", ["y"]) == "VY"
+
+
+def test_cache_overwrite_replaces_value(tmp_path: Path):
+    cache_dir = str(tmp_path)
+    cache_write(cache_dir, "ns", ["k"], "old")
+    cache_write(cache_dir, "ns", ["k"], "new")
+    assert cache_read(cache_dir, "ns", ["k"]) == "new"
+    # Namespaces are separate key spaces
+    assert cache_read(cache_dir, "other", ["k"]) is None
+
+
+def _noise(seed: int, n: int = 400) -> str:
+    # Incompressible-ish text so stored sizes stay close to raw sizes
+    rnd = random.Random(seed)
+    return "".join(rnd.choice(string.ascii_letters + string.digits) for _ in range(n))
+
+
+def test_cache_evicts_least_recently_used_over_budget(tmp_path: Path, monkeypatch):
+    import cache_util
+
+    cache_dir = str(tmp_path)
+    clock = iter(range(1000, 2000, 100))
+    monkeypatch.setattr(cache_util.time, "time", lambda: float(next(clock)))
+    a, b, c = _noise(1), _noise(2), _noise(3)
+    cache_write(cache_dir, "ns", ["a"], a, max_bytes=800)
+    cache_write(cache_dir, "ns", ["b"], b, max_bytes=800)
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache_read(cache_dir, "ns", ["a"]) == a
+    cache_write(cache_dir, "ns", ["c"], c, max_bytes=800)
+    assert cache_read(cache_dir, "ns", ["b"]) is None
+    assert cache_read(cache_dir, "ns", ["a"]) == a
+    assert cache_read(cache_dir, "ns", ["c"]) == c
+
+
+def test_cache_namespace_ttl(tmp_path: Path, monkeypatch):
+    import cache_util
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_util.time, "time", lambda: now[0])
+    monkeypatch.setattr(cache_util, "CACHE_TTLS", {"short": 60})
+    cache_write(str(tmp_path), "short", ["k"], "v")
+    cache_write(str(tmp_path), "long", ["k"], "v")
+    now[0] += 61
+    assert cache_read(str(tmp_path), "short", ["k"]) is None
+    assert cache_read(str(tmp_path), "long", ["k"]) == "v"
+
+
+def test_failed_expiry_rolls_back(tmp_path: Path, monkeypatch):
+    import cache_util
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_util.time, "time", lambda: now[0])
+    monkeypatch.setattr(cache_util, "CACHE_TTLS", {"short": 60})
+    cache_write(str(tmp_path), "short", ["k"], "v")
+    now[0] += 61
+
+    def _fail(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache_util, "_delete_entry", _fail)
+    assert cache_read(str(tmp_path), "short", ["k"]) is None
+    assert not cache_util._connect(str(tmp_path)).in_transaction
+    # Later calls on this thread's connection still work
+    cache_write(str(tmp_path), "long", ["k"], "v")
+    assert cache_read(str(tmp_path), "long", ["k"]) == "v"
+
+
+def test_tiered_cache_memory_layer_honours_namespace_ttl(tmp_path: Path, monkeypatch):
+    import cache_util
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_util.time, "time", lambda: now[0])
+    monkeypatch.setattr(cache_util, "CACHE_TTLS", {"short": 60})
+    writer = cache_util.TieredCache(str(tmp_path))
+    writer.set("short", ["k"], "v")
+    now[0] += 30
+    # Promoted from disk with the entry's original creation time, not the read time
+    reader = cache_util.TieredCache(str(tmp_path))
+    assert reader.get("short", ["k"]) == "v"
+    now[0] += 31
+    assert writer.get("short", ["k"]) is None
+    assert reader.get("short", ["k"]) is None
+    assert reader.memory.bytes == 0
+
+
+def test_cache_keys_are_canonical_and_versioned(monkeypatch):
+    import cache_util
+
+    assert cache_util._key(["p", ["a", "b"], "m"]) == cache_util._key(["p", ["a", "b"], "m"])
+    assert cache_util._key(["ab", "c"]) != cache_util._key(["a", "bc"])
+    before = cache_util._key(["p"])
+    monkeypatch.setattr(cache_util, "KEY_VERSION", cache_util.KEY_VERSION + 1)
+    assert cache_util._key(["p"]) != before
+
+
+def test_cache_dedupes_compressed_blobs_and_reports_stats(tmp_path: Path):
+    from cache_util import cache_stats
+
+    cache_dir = str(tmp_path)
+    article = "Pool pumps move water through the filter. " * 200
+    cache_write(cache_dir, "hydrate", ["outline-1"], article)
+    cache_write(cache_dir, "hydrate", ["outline-2"], article)
+    assert cache_read(cache_dir, "hydrate", ["outline-2"]) == article
+    assert cache_read(cache_dir, "hydrate", ["missing"]) is None
+
+    stats = cache_stats(cache_dir)
+    assert stats["entries"] == 2 and stats["blobs"] == 1
+    assert stats["logical_bytes"] == 2 * len(article)
+    assert stats["stored_bytes"] < len(article) / 4
+    assert stats["saved_bytes"] == stats["logical_bytes"] - stats["stored_bytes"]
+    assert stats["namespaces"]["hydrate"]["hits"] == 1
+    assert stats["namespaces"]["hydrate"]["hit_ratio"] == 0.5
+
+
+def test_memory_cache_is_bounded_by_bytes():
+    from cache_util import MemoryCache
+
+    mem = MemoryCache(max_bytes=10)
+    mem.set("a", "aaaa")
+    mem.set("b", "bbbb")
+    assert mem.get("a") == "aaaa"  # "b" is now least recently used
+    mem.set("c", "cccc")
+    assert mem.get("b") is None and mem.get("c") == "cccc"
+    assert mem.evictions == 1 and mem.bytes == 8
+    mem.set("huge", "x" * 11)  # larger than the whole budget: never stored
+    assert mem.get("huge") is None
+
+
+def test_tiered_cache_shares_disk_layer_across_instances(tmp_path: Path):
+    from cache_util import TieredCache
+
+    first = TieredCache(str(tmp_path))
+    first.set("llm", ["m", "msgs"], "answer")
+    assert first.get("llm", ["m", "msgs"]) == "answer"
+
+    # A separate process/worker starts with an empty memory layer but the same store
+    second = TieredCache(str(tmp_path))
+    assert second.get("llm", ["m", "msgs"]) == "answer"
+    assert second.get("llm", ["m", "msgs"]) == "answer"
+    assert second.get("llm", ["m", "other"]) is None
+    stats = second.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+    second.clear("llm")
+    assert TieredCache(str(tmp_path)).get("llm", ["m", "msgs"]) is None
@@ -23,15 +23,17 @@ def test_cli_generates_markdown(tmp_path, monkeypatch):
     # Install fake openrouter before importing cli (cli imports hydrate/scaffold)
     _install_fake_openrouter()
     import cli
+    import hydrate
+    import scaffold
 
     # Stub model functions to avoid external calls
     monkeypatch.setattr(
-        cli,
+        scaffold,
         "scaffold_article",
-        lambda prompt, links=None, model=None: "# Outline\n\n- A\n- B",
+        lambda prompt, links=None, model=None, sources=None: "# Outline\n\n- A\n- B",
     )
     monkeypatch.setattr(
-        cli,
+        hydrate,
         "hydrate_article",
         lambda outline, model=None: "# Article\n\nHello world",
     )
@@ -59,6 +61,8 @@ def test_cli_no_cache(tmp_path, monkeypatch):
     import importlib
 
     import cli as _cli
+    import hydrate
+    import scaffold
 
     importlib.reload(_cli)
     calls = {"scaffold": 0, "hydrate": 0}
@@ -71,8 +75,8 @@ def test_cli_no_cache(tmp_path, monkeypatch):
         calls["hydrate"] += 1
         return "article"
 
-    monkeypatch.setattr(_cli, "scaffold_article", _scaffold)
-    monkeypatch.setattr(_cli, "hydrate_article", _hydrate)
+    monkeypatch.setattr(scaffold, "scaffold_article", _scaffold)
+    monkeypatch.setattr(hydrate, "hydrate_article", _hydrate)
 
     out_file = tmp_path / "a.md"
     argv = [
@@ -94,12 +98,14 @@ def test_cli_cache_dir(tmp_path, monkeypatch):
     import importlib
 
     import cli as _cli
+    import hydrate
+    import scaffold
 
     importlib.reload(_cli)
 
     # Force deterministic output for caching
-    monkeypatch.setattr(_cli, "scaffold_article", lambda *a, **k: "outline")
-    monkeypatch.setattr(_cli, "hydrate_article", lambda *a, **k: "article")
+    monkeypatch.setattr(scaffold, "scaffold_article", lambda *a, **k: "outline")
+    monkeypatch.setattr(hydrate, "hydrate_article", lambda *a, **k: "article")
 
     cache_dir = tmp_path / "cache"
     out_file1 = tmp_path / "first.md"
@@ -129,3 +135,92 @@ def test_cli_cache_dir(tmp_path, monkeypatch):
     monkeypatch.setattr(sys, "argv", argv2)
     _cli.main()
     assert out_file1.exists() and out_file2.exists()
+
+
+def test_cli_stream_writes_output(tmp_path, monkeypatch):
+    import cli
+
+    out_file = tmp_path / "streamed.md"
+    argv = [
+        "cli.py",
+        "--prompt",
+        "Streamed Title",
+        "--output",
+        str(out_file),
+        "--links",
+        "http://a",
+        "--stream",
+        "--dry-run",
+        "--no-cache",
+    ]
+    # Registers DRY_RUN with monkeypatch so the value --dry-run sets is undone afterwards
+    monkeypatch.setenv("DRY_RUN", "0")
+    monkeypatch.setattr(sys, "argv", argv)
+    cli.main()
+
+    text = out_file.read_text(encoding="utf-8")
+    assert text.startswith("[DRY_RUN:") and text.endswith("## References\n- http://a")
+
+
+def test_cli_cache_stats_subcommand(tmp_path, monkeypatch, capsys):
+    import json
+
+    import cli
+    from cache_util import cache_write
+
+    cache_write(str(tmp_path), "scaffold", ["p"], "outline " * 100)
+    monkeypatch.setattr(sys, "argv", ["cli.py", "cache", "stats", "--cache-dir", str(tmp_path)])
+    cli.main()
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["entries"] == 1 and stats["saved_bytes"] > 0
+
+
+def test_cli_publish_batch_subcommand(tmp_path, monkeypatch, capsys):
+    import json
+
+    import cli
+
+    articles = tmp_path / "articles"
+    articles.mkdir()
+    (articles / "one.md").write_text("# One\n\nBody", encoding="utf-8")
+    argv = ["cli.py", "publish-batch", str(articles), "--dry-run", "--workers", "2"]
+    monkeypatch.setenv("DRY_RUN", "0")
+    monkeypatch.setattr(sys, "argv", argv)
+    cli.main()
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["ok"] == 1 and summary["failed"] == 0
+    assert (articles / "publish-journal.jsonl").exists()
+
+
+def test_cli_rehydrates_only_edited_outline_sections(tmp_path, monkeypatch):
+    import cli
+    import hydrate
+    import scaffold
+
+    outline = "# Pumps\n\n## Types\n- single speed\n\n## Sizing\n- flow rate\n"
+    monkeypatch.setattr(scaffold, "scaffold_article", lambda *a, **kw: outline)
+    written = []
+
+    def _section(preamble, section, model, retries):
+        written.append(section.splitlines()[0])
+        return f"Text for {section}"
+
+    monkeypatch.setattr(hydrate, "_hydrate_section", _section)
+    saved = tmp_path / "outline.md"
+    out_file = tmp_path / "article.md"
+    base = ["cli.py", "--prompt", "Pumps", "--output", str(out_file), "--parallel-sections"]
+    base += ["--cache-dir", str(tmp_path / "cache")]
+
+    monkeypatch.setattr(sys, "argv", base + ["--save-outline", str(saved)])
+    cli.main()
+    assert sorted(written) == ["## Sizing", "## Types"]
+    assert saved.read_text(encoding="utf-8") == outline
+
+    # The editor changes one section; only that one is rewritten
+    saved.write_text(outline.replace("- flow rate", "- flow rate\n- head loss"), encoding="utf-8")
+    written.clear()
+    monkeypatch.setattr(sys, "argv", base + ["--outline", str(saved)])
+    cli.main()
+    assert written == ["## Sizing"]
+    article = out_file.read_text(encoding="utf-8")
+    assert "Text for ## Types\n- single speed" in article and "head loss" in article
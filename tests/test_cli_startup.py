@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Cumulative import time of `cli` in a fresh interpreter; ~30ms locally, headroom for CI
+IMPORT_BUDGET_SECONDS = float(os.getenv("CLI_IMPORT_BUDGET", "0.25"))
+
+# Loaded only by the code paths that need them
+DEFERRED = {
+    "batch",
+    "cache_util",
+    "httpx",
+    "hydrate",
+    "linker",
+    "llm",
+    "markdown",
+    "output",
+    "render",
+    "requests",
+    "scaffold",
+    "sources",
+    "wordpress",
+}
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+
+def test_cli_import_defers_heavy_modules():
+    code = "import sys, cli; print(' '.join(sorted(sys.modules)))"
+    loaded = set(_python("-c", code).stdout.split())
+    assert not DEFERRED & loaded
+
+
+def test_cli_import_within_budget():
+    stderr = _python("-X", "importtime", "-c", "import cli").stderr
+    # Lines look like "import time: self [us] | cumulative | name"
+    cumulative = next(
+        int(line.split("|")[1]) for line in stderr.splitlines() if line.endswith("| cli")
+    )
+    assert cumulative / 1e6 < IMPORT_BUDGET_SECONDS
+
+
+def test_version_runs_without_deferred_modules():
+    code = (
+        "import sys, cli\n"
+        "sys.argv = ['cli.py', '--version']\n"
+        "try:\n"
+        "    cli.main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(' '.join(sorted(sys.modules)))"
+    )
+    out = _python("-c", code).stdout
+    assert not DEFERRED & set(out.split())
@@ -0,0 +1,162 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from cache_util import TieredCache
+from config import _parse_model_map
+from hedging import Hedger
+from llm import LLMClient
+from metrics import LLM_HEDGES
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class _Response:
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.text}}]}
+
+
+def _warm(hedger, model, seconds=0.01, n=20):
+    for _ in range(n):
+        hedger.record(model, seconds)
+
+
+def test_hedger_delay_needs_samples_and_budget():
+    hedger = Hedger(percentile=90, budgets={"*": 0.5}, fallbacks={"a": "b"}, min_samples=10)
+    assert hedger.delay("a") is None
+    for ms in range(1, 11):
+        hedger.record("a", ms / 1000)
+    assert hedger.delay("a") == pytest.approx(0.009)
+    # Two requests sent at 0.5 allowance each earn one hedge
+    assert hedger.try_hedge("a")
+    assert not hedger.try_hedge("a")
+    assert hedger.fallback("a") == "b" and hedger.fallback("x") == "x"
+
+    # A bare LLM_HEDGE_FALLBACKS value is the fallback for every model
+    shared = Hedger(fallbacks=_parse_model_map("fast,a=b"))
+    assert shared.fallback("slow") == "fast" and shared.fallback("a") == "b"
+
+    unbudgeted = Hedger(budgets={"*": 0.0, "a": 1.0}, min_samples=1)
+    unbudgeted.record("x", 0.1)
+    assert unbudgeted.delay("x") is None
+
+
+def test_sync_chat_hedges_to_fallback_model(tmp_path):
+    hedger = Hedger(percentile=50, budgets={"*": 1.0}, fallbacks={"slow": "fast"})
+    _warm(hedger, "slow")
+
+    def _post(path, json=None):  # noqa: A002
+        if json["model"] == "slow":
+            time.sleep(0.5)
+        return _Response(f"from {json['model']}")
+
+    client = LLMClient("key", cache=TieredCache(str(tmp_path)), hedger=hedger)
+    client._ensure = lambda: types.SimpleNamespace(post=_post)
+    before = LLM_HEDGES.value(model="slow", result="won")
+
+    started = time.perf_counter()
+    assert client.chat("slow", MESSAGES) == "from fast"
+    assert time.perf_counter() - started < 0.4
+    assert LLM_HEDGES.value(model="slow", result="won") == before + 1
+    # Cached as the fallback model's answer only
+    assert client.cache.get("llm", ["fast", MESSAGES]) == "from fast"
+    assert client.cache.get("llm", ["slow", MESSAGES]) is None
+
+
+def test_sync_chat_waits_for_primary_without_budget():
+    hedger = Hedger(percentile=50, budgets={"*": 0.5})
+    _warm(hedger, "m")
+    calls = []
+
+    def _post(path, json=None):  # noqa: A002
+        calls.append(json["model"])
+        time.sleep(0.05)
+        return _Response("primary")
+
+    client = LLMClient("key", hedger=hedger)
+    client._ensure = lambda: types.SimpleNamespace(post=_post)
+    before = LLM_HEDGES.value(model="m", result="no_budget")
+    # 0.5 allowance after the first request: not enough for a hedge yet
+    assert client.chat("m", MESSAGES) == "primary"
+    assert calls == ["m"]
+    assert LLM_HEDGES.value(model="m", result="no_budget") == before + 1
+
+
+def test_async_chat_cancels_losing_request():
+    hedger = Hedger(percentile=50, budgets={"*": 1.0})
+    _warm(hedger, "m")
+    cancelled = []
+    attempts = []
+
+    async def _post(path, json=None):  # noqa: A002
+        attempts.append(json["model"])
+        if len(attempts) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return _Response("hedge")
+
+    client = LLMClient("key", hedger=hedger)
+    client._aensure = lambda: types.SimpleNamespace(post=_post)
+
+    async def _run():
+        text = await client.achat("m", MESSAGES)
+        await asyncio.sleep(0)
+        return text
+
+    assert asyncio.run(_run()) == "hedge"
+    assert attempts == ["m", "m"]
+    assert cancelled == [True]
+
+
+def test_async_chat_reports_primary_error_when_both_fail():
+    hedger = Hedger(percentile=50, budgets={"*": 1.0}, fallbacks={"m": "alt"})
+    _warm(hedger, "m")
+
+    async def _post(path, json=None):  # noqa: A002
+        await asyncio.sleep(0.05)
+        raise OSError(f"down: {json['model']}")
+
+    client = LLMClient("key", hedger=hedger)
+    client._aensure = lambda: types.SimpleNamespace(post=_post)
+    with pytest.raises(RuntimeError, match="model 'm'"):
+        asyncio.run(client.achat("m", MESSAGES))
+
+
+def test_queued_request_is_not_hedged_before_it_is_sent(monkeypatch):
+    import llm
+    from ratelimit import AdaptiveLimiter
+
+    limiter = AdaptiveLimiter(initial=1, max_limit=1)
+    monkeypatch.setattr(llm, "limiter_for", lambda provider, key="": limiter)
+    hedger = Hedger(percentile=50, budgets={"*": 1.0})
+    _warm(hedger, "m", seconds=0.05)
+    calls = []
+
+    def _post(path, json=None):  # noqa: A002
+        calls.append(json["model"])
+        return _Response("primary")
+
+    client = LLMClient("key", hedger=hedger)
+    client._ensure = lambda: types.SimpleNamespace(post=_post)
+    before = LLM_HEDGES.value(model="m", result="sent")
+    # Another request holds the only slot for longer than the hedge delay
+    with limiter.slot():
+        primary = client._spawn(client.chat, "m", MESSAGES)
+        time.sleep(0.2)
+    assert primary.result(timeout=5) == "primary"
+    assert calls == ["m"]
+    assert LLM_HEDGES.value(model="m", result="sent") == before
@@ -0,0 +1,140 @@
+import asyncio
+import sqlite3
+import time
+
+from fastapi.testclient import TestClient
+
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, JobStore
+
+
+def test_store_claims_oldest_and_records_results(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    first = store.submit({"prompt": "a"})
+    second = store.submit({"prompt": "b"})
+
+    job = store.claim("w1", lease=60)
+    assert job["id"] == first and job["status"] == RUNNING and job["attempts"] == 1
+    assert store.claim("w2", lease=60)["id"] == second
+    assert store.claim("w3", lease=60) is None
+
+    store.finish(first, "w1", result={"outline": "# A"})
+    store.finish(second, "w2", error="boom")
+    assert store.get(first)["status"] == DONE
+    assert store.get(first)["result"] == {"outline": "# A"}
+    assert store.get(second)["status"] == FAILED
+    assert store.get(second)["error"] == "boom"
+    assert store.get("missing") is None
+    assert store.counts() == {DONE: 1, FAILED: 1}
+
+
+def test_expired_lease_is_retried_then_failed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path, max_attempts=2)
+    job_id = store.submit({"prompt": "a"})
+    assert store.claim("dead-worker", lease=-1)["id"] == job_id
+    store.close()
+
+    # A restarted process sees the abandoned job and takes it over
+    store = JobStore(path, max_attempts=2)
+    job = store.claim("new-worker", lease=-1)
+    assert job["id"] == job_id and job["attempts"] == 2
+    # The stale owner can no longer report on it
+    store.finish(job_id, "dead-worker", result={"late": True})
+    assert store.get(job_id)["status"] == RUNNING
+
+    assert store.claim("another", lease=60) is None
+    assert store.get(job_id)["status"] == FAILED
+    assert store.get(job_id)["error"] == "worker lost"
+
+
+def test_queue_runs_jobs_with_bounded_concurrency(tmp_path):
+    active = []
+    peak = []
+
+    async def _runner(prompt):
+        active.append(prompt)
+        peak.append(len(active))
+        await asyncio.sleep(0.02)
+        active.remove(prompt)
+        if prompt == "bad":
+            raise RuntimeError("no model")
+        return {"outline": prompt.upper()}
+
+    async def _run():
+        queue = JobQueue(JobStore(str(tmp_path / "j.sqlite3")), _runner, workers=2)
+        queue.start()
+        ids = [await queue.submit(prompt=p) for p in ("a", "b", "c", "bad")]
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            jobs = [await queue.get(i) for i in ids]
+            if all(j["status"] in (DONE, FAILED) for j in jobs):
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return jobs
+
+    jobs = asyncio.run(_run())
+    assert [j["status"] for j in jobs] == [DONE, DONE, DONE, FAILED]
+    assert jobs[0]["result"] == {"outline": "A"}
+    assert jobs[3]["error"] == "no model"
+    assert max(peak) == 2
+
+
+def test_jobs_endpoints(monkeypatch, tmp_path):
+    monkeypatch.setenv("DRY_RUN", "1")
+    import app as webapp
+
+    queue = JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), webapp.build_article)
+    queue.poll_interval = 0.05
+    monkeypatch.setattr(webapp, "jobs", queue)
+
+    with TestClient(webapp.app) as client:
+        r = client.post("/jobs", data={"prompt": "Queued Article", "fetch_links_flag": "on"})
+        assert r.status_code == 202
+        job_id = r.json()["id"]
+        assert r.headers["location"].endswith(f"/jobs/{job_id}")
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] not in (QUEUED, RUNNING):
+                break
+            time.sleep(0.02)
+        assert job["status"] == DONE
+        assert "References" in job["result"]["article_html"]
+        assert job["result"]["outline"]
+
+        assert client.post("/jobs", data={"prompt": "  "}).status_code == 400
+        assert client.get("/jobs/nope").status_code == 404
+
+
+def test_worker_survives_store_errors(tmp_path):
+    store = JobStore(str(tmp_path / "j.sqlite3"))
+    claim = store.claim
+    failures = []
+
+    def _flaky_claim(owner, lease):
+        if not failures:
+            failures.append(owner)
+            raise sqlite3.OperationalError("database is locked")
+        return claim(owner, lease)
+
+    async def _runner(prompt):
+        return {"outline": prompt}
+
+    async def _run():
+        queue = JobQueue(store, _runner, workers=1, poll_interval=0.01)
+        store.claim = _flaky_claim
+        queue.start()
+        job_id = await queue.submit(prompt="a")
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = await queue.get(job_id)
+            if job["status"] == DONE:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job
+
+    assert asyncio.run(_run())["result"] == {"outline": "a"}
+    assert len(failures) == 1
@@ -1,6 +1,32 @@
+import asyncio
 from unittest import mock
 
+import pytest
+import requests
+
 import linker
+from cache_util import TieredCache
+
+
+@pytest.fixture(autouse=True)
+def _links_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(linker, "cache", TieredCache(str(tmp_path)))
+
+
+class _Session:
+    def __init__(self, payload=None, error=None):
+        self.payload = payload
+        self.error = error
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(params)
+        if self.error:
+            raise self.error
+        resp = mock.MagicMock(status_code=200)
+        resp.json.return_value = self.payload
+        resp.raise_for_status.return_value = None
+        return resp
 
 
 def test_fetch_links_stub_when_dry_run(monkeypatch):
@@ -16,12 +42,58 @@ def test_fetch_links_stub_when_dry_run(monkeypatch):
 
 def test_fetch_links_handles_no_results(monkeypatch):
     monkeypatch.delenv("DRY_RUN", raising=False)
+    session = _Session({"organic_results": []})
+    monkeypatch.setattr(linker, "_get_session", lambda: session)
+    with mock.patch("linker.SERPAPI_KEY", "fake-key"):
+        out = linker.fetch_links("python", max_links=3)
+        assert out == []
+        assert len(session.calls) == 1
+
+
+def test_afetch_links_parses_results(monkeypatch):
+    monkeypatch.delenv("DRY_RUN", raising=False)
+
+    class _Resp:
+        status_code = 200
+
+        def raise_for_status(self):
+            return None
+
+        def json(self):
+            return {"organic_results": [{"link": "https://a"}, {"title": "no link"}]}
+
+    class _Client:
+        async def get(self, url, params=None):
+            assert params["q"] == "python"
+            return _Resp()
+
+    with mock.patch("linker.SERPAPI_KEY", "fake-key"):
+        monkeypatch.setattr(linker, "_async_client", lambda: _Client())
+        out = asyncio.run(linker.afetch_links("python", max_links=3))
+    assert out == ["https://a"]
+
+
+def test_fetch_links_caches_normalized_queries(monkeypatch):
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    session = _Session({"organic_results": [{"link": "https://a"}, {"link": "https://b"}]})
+    monkeypatch.setattr(linker, "_get_session", lambda: session)
+    with mock.patch("linker.SERPAPI_KEY", "fake-key"):
+        assert linker.fetch_links("Python  Tips!", max_links=2) == ["https://a", "https://b"]
+        assert linker.fetch_links("python tips", max_links=2) == ["https://a", "https://b"]
+        assert len(session.calls) == 1
+        # max_links is part of the key
+        linker.fetch_links("python tips", max_links=1)
+        assert len(session.calls) == 2
+
+
+def test_fetch_links_serves_stale_on_error(monkeypatch):
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    monkeypatch.setattr(linker, "LINKS_CACHE_TTL", -1)
+    session = _Session({"organic_results": [{"link": "https://a"}]})
+    monkeypatch.setattr(linker, "_get_session", lambda: session)
     with mock.patch("linker.SERPAPI_KEY", "fake-key"):
-        with mock.patch("requests.get") as mget:
-            mresp = mock.MagicMock()
-            mresp.json.return_value = {"organic_results": []}
-            mresp.raise_for_status.return_value = None
-            mget.return_value = mresp
-            out = linker.fetch_links("python", max_links=3)
-            assert out == []
-            mget.assert_called_once()
+        assert linker.fetch_links("python", max_links=3) == ["https://a"]
+        session.error = requests.ConnectionError("down")
+        assert linker.fetch_links("python", max_links=3) == ["https://a"]
+        assert linker.fetch_links("rust", max_links=3) == []
+        assert len(session.calls) == 3
@@ -43,3 +43,87 @@ def test_llm_raises_when_no_key_and_not_dry_run():
             assert "OPENROUTER_API_KEY" in str(e)
         else:
             raise AssertionError("Expected RuntimeError when key is missing")
+
+
+def test_llm_chat_stream_decodes_sse_deltas(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "DUMMY")
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    import llm as _llm
+
+    lines = [
+        ": OPENROUTER PROCESSING",
+        'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+        "",
+        'data: {"choices": [{"delta": {"content": "Hel"}}]}',
+        'data: {"choices": [{"delta": {"content": "lo"}}]}',
+        "data: [DONE]",
+    ]
+
+    class _Resp:
+        status_code = 200
+        headers: dict = {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def raise_for_status(self):
+            return None
+
+        def iter_lines(self):
+            return iter(lines)
+
+    class _Client:
+        def stream(self, method, path, json=None):  # noqa: A002
+            assert json["stream"] is True
+            return _Resp()
+
+    client = _llm.LLMClient("DUMMY")
+    monkeypatch.setattr(client, "_ensure", lambda: _Client())
+    chunks = list(client.chat_stream("m", [{"role": "user", "content": "hi"}]))
+    assert chunks == ["Hel", "lo"]
+
+    lines.append('data: {"error": {"message": "overloaded"}}')
+    try:
+        list(client.chat_stream("m", [{"role": "user", "content": "hi"}]))
+    except RuntimeError as e:
+        assert "overloaded" in str(e)
+    else:
+        raise AssertionError("Expected RuntimeError for mid-stream error event")
+
+
+def test_llm_achat_stream_over_http(monkeypatch):
+    import asyncio
+
+    import httpx
+
+    import llm as _llm
+
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    body = (
+        'data: {"choices": [{"delta": {"content": "A"}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "B"}}]}\n\n'
+        "data: [DONE]\n\n"
+    )
+
+    def _handler(request):
+        assert request.url.path.endswith("/chat/completions")
+        assert request.headers["Authorization"] == "Bearer DUMMY"
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    client = _llm.LLMClient("DUMMY", base_url="https://llm.test/api/v1")
+
+    async def _run():
+        client._aclient = httpx.AsyncClient(
+            base_url=client.base_url,
+            headers=client._headers(),
+            transport=httpx.MockTransport(_handler),
+        )
+        client._aclient_loop = asyncio.get_running_loop()
+        chunks = [c async for c in client.achat_stream("m", [{"role": "user", "content": "x"}])]
+        await client.aclose()
+        return chunks
+
+    assert asyncio.run(_run()) == ["A", "B"]
@@ -0,0 +1,71 @@
+import json
+import sys
+
+from fastapi.testclient import TestClient
+
+import metrics
+from cache_util import TieredCache
+
+
+def test_histogram_renders_prometheus_buckets():
+    registry = metrics.Registry()
+    hist = registry.histogram("demo_seconds", "Demo", ("stage",))
+    hist.observe(0.07, stage="a")
+    hist.observe(3.0, stage="a")
+    registry.counter("demo_total", "Demo count", ("kind",)).inc(kind='x"y')
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{stage="a",le="0.05"} 0' in text
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{stage="a"} 2' in text
+    assert 'demo_total{kind="x\\"y"} 1' in text
+    snap = registry.snapshot()["demo_seconds"][0]
+    assert snap["count"] == 2 and snap["max"] == 3.0 and snap["buckets"]["5"] == 2
+
+
+def test_cache_lookups_are_counted(tmp_path):
+    cache = TieredCache(str(tmp_path))
+    before = metrics.CACHE_REQUESTS.value(namespace="mtest", result="miss")
+    assert cache.get("mtest", ["k"]) is None
+    cache.set("mtest", ["k"], "v")
+    assert cache.get("mtest", ["k"]) == "v"
+    assert metrics.CACHE_REQUESTS.value(namespace="mtest", result="miss") == before + 1
+    assert metrics.CACHE_REQUESTS.value(namespace="mtest", result="memory_hit") >= 1
+
+
+def test_metrics_endpoint_exports_stage_histograms(monkeypatch):
+    monkeypatch.setenv("DRY_RUN", "1")
+    from app import app
+
+    client = TestClient(app)
+    client.post("/generate", data={"prompt": "Metrics Title"})
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    assert 'draftsmith_stage_seconds_count{stage="scaffold_article",model="' in r.text
+    assert 'stage="render_markdown"' in r.text
+
+
+def test_cli_metrics_json(tmp_path, monkeypatch):
+    import cli
+
+    out = tmp_path / "metrics.json"
+    argv = [
+        "cli.py",
+        "--prompt",
+        "Metrics",
+        "--output",
+        str(tmp_path / "a.html"),
+        "--format",
+        "html",
+        "--dry-run",
+        "--no-cache",
+        "--metrics-json",
+        str(out),
+    ]
+    monkeypatch.setenv("DRY_RUN", "0")
+    monkeypatch.setattr(sys, "argv", argv)
+    cli.main()
+    data = json.loads(out.read_text(encoding="utf-8"))
+    stages = {s["labels"]["stage"] for s in data["draftsmith_stage_seconds"]}
+    assert {"scaffold_article", "hydrate_article", "render_markdown"} <= stages
@@ -1,3 +1,4 @@
+import asyncio
 import importlib
 import types
 
@@ -9,22 +10,16 @@ def test_wordpress_session_headers():
     assert "User-Agent" in s.headers and "Accept" in s.headers
 
 
-def test_cache_corrupt_entry_cleanup(tmp_path):
-    from cache_util import cache_read, cache_write
+def test_cache_corrupt_database_is_reset(tmp_path):
+    from cache_util import DB_NAME, cache_read, cache_write
 
     cache_dir = tmp_path / "cache"
-    ns = "ns"
-    parts = ["one"]
-    cache_write(str(cache_dir), ns, parts, "ok")
-    # Find the created file and corrupt it
-    files = list((cache_dir / ns).glob("*.json"))
-    assert files, "expected a cache file"
-    fname = files[0]
-    fname.write_text("{broken", encoding="utf-8")
-    # Read should return None and cleanup the corrupt file
-    out = cache_read(str(cache_dir), ns, parts)
-    assert out is None
-    assert not fname.exists()
+    cache_dir.mkdir()
+    (cache_dir / DB_NAME).write_bytes(b"definitely not sqlite" * 100)
+    # Read should treat the corrupt store as a miss and replace it with a fresh database
+    assert cache_read(str(cache_dir), "ns", ["one"]) is None
+    cache_write(str(cache_dir), "ns", ["one"], "ok")
+    assert cache_read(str(cache_dir), "ns", ["one"]) == "ok"
 
 
 def test_linker_quick_paths(monkeypatch):
@@ -46,17 +41,40 @@ def test_llm_normal_flow(monkeypatch):
 
     importlib.reload(_llm)
 
-    class _FakeCompletions:
-        def create(self, model, messages):  # noqa: ARG002
-            return types.SimpleNamespace(
-                choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="ok"))]
-            )
+    class _FakeResponse:
+        status_code = 200
+        headers: dict = {}
+
+        def raise_for_status(self):
+            return None
+
+        def json(self):
+            return {"choices": [{"message": {"content": "ok"}}]}
 
     class _FakeClient:
         def __init__(self):
-            self.chat = types.SimpleNamespace(completions=_FakeCompletions())
+            self.requests = []
+
+        def post(self, path, json=None):  # noqa: A002
+            self.requests.append((path, json))
+            return _FakeResponse()
 
+        async def apost(self, path, json=None):  # noqa: A002
+            return self.post(path, json=json)
+
+    fake = _FakeClient()
+    # Keep the shared on-disk response cache out of this test
+    monkeypatch.setattr(_llm.client, "cache", None)
     # Bypass actual client creation
-    monkeypatch.setattr(_llm.client, "_ensure", lambda: _FakeClient())
+    monkeypatch.setattr(_llm.client, "_ensure", lambda: fake)
     out = _llm.client.chat("m", messages=[{"role": "user", "content": "hi"}])
     assert out == "ok"
+    assert fake.requests[-1] == (
+        "/chat/completions",
+        {"model": "m", "messages": [{"role": "user", "content": "hi"}]},
+    )
+
+    # The async path shares request building and response parsing
+    monkeypatch.setattr(_llm.client, "_aensure", lambda: types.SimpleNamespace(post=fake.apost))
+    out = asyncio.run(_llm.client.achat("m", messages=[{"role": "user", "content": "hi"}]))
+    assert out == "ok"
@@ -14,3 +14,18 @@ def test_write_output_html(tmp_path):
     write_output(content, str(dest), "html")
     text = dest.read_text(encoding="utf-8")
     assert "<html>" in text and "</html>" in text
+
+
+def test_write_output_streams_chunks(tmp_path):
+    dest = tmp_path / "out.md"
+    seen = []
+
+    def _chunks():
+        for piece in ["# Title", "\n\n", "Hello"]:
+            yield piece
+            # Earlier chunks are already on disk before the next one is produced
+            seen.append(dest.read_text(encoding="utf-8"))
+
+    write_output(_chunks(), str(dest), "md")
+    assert seen[0] == "# Title"
+    assert dest.read_text(encoding="utf-8") == "# Title\n\nHello"
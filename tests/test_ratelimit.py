@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+from metrics import LIMITER_LIMIT
+from ratelimit import (
+    AdaptiveLimiter,
+    TokenBucket,
+    limiter_for,
+    limiters,
+    parse_retry_after,
+    retry_throttled,
+)
+
+
+def test_token_bucket_allows_burst_then_paces():
+    bucket = TokenBucket(rate=50, burst=3)
+    started = time.monotonic()
+    waits = [bucket.acquire() for _ in range(5)]
+    elapsed = time.monotonic() - started
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    # Two tokens beyond the burst at 50/s take ~40ms
+    assert 0.03 <= elapsed < 0.5
+
+
+def test_token_bucket_pause_holds_back_callers():
+    bucket = TokenBucket(rate=1000, burst=10)
+    bucket.pause(0.05)
+    assert bucket.acquire() >= 0.04
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_parse_retry_after_seconds_and_dates():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None, default=2.0) == 2.0
+    assert parse_retry_after("garbage", default=1.5) == 1.5
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    future = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+    assert 25 <= parse_retry_after(future) <= 31
+
+
+def test_adaptive_limiter_grows_on_success_and_halves_on_throttle():
+    limiter = AdaptiveLimiter(initial=4, max_limit=6, provider="test", key="aimd", cooldown=60)
+    for _ in range(12):
+        with limiter.slot():
+            pass
+    assert limiter.limit == 6
+    with limiter.slot() as slot:
+        slot.throttled()
+    assert limiter.limit == 3
+    # A burst of 429s inside the cooldown counts as one signal
+    with limiter.slot() as slot:
+        slot.throttled()
+    assert limiter.limit == 3
+    assert LIMITER_LIMIT.value(provider="test", key="aimd") == 3
+    assert limiter.snapshot()["inflight"] == 0
+
+
+def test_adaptive_limiter_grows_only_on_success():
+    limiter = AdaptiveLimiter(initial=4, max_limit=8)
+    with pytest.raises(OSError):
+        with limiter.slot():
+            raise OSError("connection reset")
+    with limiter.slot() as slot:
+        retry_throttled(slot, types.SimpleNamespace(status_code=500, headers={}), 0, 1, 0, "t")
+    assert limiter.limit == 4 and limiter.inflight == 0
+
+
+def test_adaptive_limiter_cancelled_while_rate_limited_returns_slot():
+    limiter = AdaptiveLimiter(initial=2, max_limit=2, rate=1, burst=1)
+
+    async def _run():
+        async with limiter.aslot():
+            pass
+        # The bucket is empty: this one waits ~1s for a token and is cancelled meanwhile
+        waiter = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0.05)
+        assert limiter.inflight == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(_run())
+    assert limiter.inflight == 0 and limiter.limit == 2
+
+
+def test_adaptive_limiter_bounds_concurrency():
+    limiter = AdaptiveLimiter(initial=2, max_limit=2)
+    active, peak = [], []
+    lock = threading.Lock()
+
+    def _work():
+        with limiter.slot():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=_work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 2
+
+
+def test_adaptive_limiter_async_slot_honours_retry_after():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1)
+
+    async def _run():
+        async with limiter.aslot() as slot:
+            slot.throttled(0.05)
+        started = time.monotonic()
+        async with limiter.aslot():
+            return time.monotonic() - started
+
+    assert asyncio.run(_run()) >= 0.04
+
+
+def test_retry_throttled_reports_and_decides():
+    limiter = AdaptiveLimiter(initial=4)
+    ok = types.SimpleNamespace(status_code=200, headers={})
+    busy = types.SimpleNamespace(status_code=429, headers={"Retry-After": "0"})
+    with limiter.slot() as slot:
+        assert not retry_throttled(slot, ok, 0, 2, 1.0, target="test")
+        assert not slot.is_throttled
+    with limiter.slot() as slot:
+        assert retry_throttled(slot, busy, 0, 2, 1.0, target="test")
+        assert slot.is_throttled and slot.retry_after == 0.0
+    with limiter.slot() as slot:
+        # Out of retries: the caller gets the 429
+        assert not retry_throttled(slot, busy, 2, 2, 1.0, target="test")
+
+
+def test_llm_retries_throttled_requests(monkeypatch):
+    from llm import LLMClient
+
+    replies = [
+        types.SimpleNamespace(status_code=429, headers={"Retry-After": "0"}),
+        types.SimpleNamespace(
+            status_code=200,
+            headers={},
+            raise_for_status=lambda: None,
+            json=lambda: {"choices": [{"message": {"content": "ok"}}]},
+        ),
+    ]
+    client = LLMClient("key")
+    client._ensure = lambda: types.SimpleNamespace(post=lambda path, json=None: replies.pop(0))
+    assert client.chat("throttled/model", [{"role": "user", "content": "hi"}]) == "ok"
+    assert limiter_for("openrouter", "throttled/model").snapshot()["inflight"] == 0
+    assert any(
+        entry["key"] == "throttled/model" and entry["provider"] == "openrouter"
+        for entry in limiters()
+    )
@@ -0,0 +1,77 @@
+import sys
+
+import pytest
+
+import render
+from render import Renderer, register_backend
+
+
+def _counting_backend(calls):
+    def factory():
+        calls.append("factory")
+
+        def _render(text):
+            calls.append(text)
+            return f"<p>{text}</p>"
+
+        return _render
+
+    return factory
+
+
+def test_renderer_builds_backend_once_and_caches_html(tmp_path):
+    calls = []
+    register_backend("counting", _counting_backend(calls))
+    renderer = Renderer("counting", cache_dir=str(tmp_path))
+    assert renderer.html("a") == "<p>a</p>"
+    assert renderer.html("a") == "<p>a</p>"
+    assert renderer.html("b") == "<p>b</p>"
+    assert calls == ["factory", "a", "b"]
+
+    # A later run over the same cache dir reads the stored HTML
+    later = Renderer("counting", cache_dir=str(tmp_path))
+    assert later.html("a") == "<p>a</p>"
+    assert later.cache.disk_hits == 1
+    assert calls == ["factory", "a", "b", "factory"]
+
+
+def test_default_backend_reuses_parser_between_articles(tmp_path):
+    renderer = Renderer("markdown", cache_dir=str(tmp_path))
+    assert renderer.html("# Title") == "<h1>Title</h1>"
+    # reset() clears per-document state such as the previous article's headings
+    assert renderer.html("*x*") == "<p><em>x</em></p>"
+
+
+def test_unknown_and_missing_backends(monkeypatch, tmp_path):
+    with pytest.raises(ValueError, match="Unknown Markdown backend"):
+        Renderer("nope")
+    monkeypatch.setitem(sys.modules, "markdown_it", None)
+    renderer = Renderer("markdown-it", cache_dir=str(tmp_path))
+    assert renderer.html("# T") == "<h1>T</h1>"
+    assert renderer.backend == "markdown"
+
+
+def test_cli_publish_html_renders_once(monkeypatch, tmp_path):
+    import cli
+    import hydrate
+    import scaffold
+    import wordpress
+
+    calls = []
+    register_backend("counting", _counting_backend(calls))
+    monkeypatch.setattr(render, "renderer", Renderer("counting", cache_dir=str(tmp_path)))
+    monkeypatch.setattr(scaffold, "scaffold_article", lambda *a, **kw: "outline")
+    monkeypatch.setattr(hydrate, "hydrate_article", lambda *a, **kw: "# Article")
+    published = {}
+    monkeypatch.setattr(
+        wordpress, "publish_to_wordpress", lambda **kw: published.update(kw) or {"id": 1}
+    )
+
+    out_file = tmp_path / "article.html"
+    argv = ["cli.py", "--prompt", "T", "--output", str(out_file), "--format", "html"]
+    monkeypatch.setattr(sys, "argv", argv + ["--publish", "--cache-dir", str(tmp_path)])
+    cli.main()
+    # Published as HTML, not raw Markdown, and the file reuses the same rendering
+    assert published["content_html"] == "<p># Article</p>"
+    assert "<p># Article</p>" in out_file.read_text(encoding="utf-8")
+    assert calls == ["factory", "# Article"]
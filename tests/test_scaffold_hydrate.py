@@ -1,14 +1,142 @@
+import asyncio
+
 import hydrate
 import scaffold
+from metrics import HYDRATED_SECTIONS
 
 
 def test_scaffold_and_hydrate_dry_run(monkeypatch):
     monkeypatch.setenv("DRY_RUN", "1")
-    # fresh cache for lru
-    scaffold._scaffold_article_cached.cache_clear()
-    hydrate.hydrate_article.cache_clear()
     out1 = scaffold.scaffold_article("topic", links=["http://a"])
     # DRY_RUN returns the last user message content; in scaffold that's the Links payload
     assert "http://a" in out1
     out2 = hydrate.hydrate_article("outline")
     assert "outline" in out2
+
+
+def test_async_scaffold_and_hydrate_dry_run(monkeypatch):
+    monkeypatch.setenv("DRY_RUN", "1")
+
+    async def _run():
+        outline = await scaffold.ascaffold_article("topic", links=["http://a"])
+        article = await hydrate.ahydrate_article("outline")
+        return outline, article
+
+    outline, article = asyncio.run(_run())
+    assert "http://a" in outline
+    assert article.startswith("[DRY_RUN:") and "outline" in article
+
+
+OUTLINE = """# Pool Pumps
+
+Intro: why pumps matter
+
+## Types
+- single speed
+- variable speed
+
+```
+## not a heading
+```
+
+## Sizing
+- flow rate
+"""
+
+
+def test_split_sections_on_repeated_heading_level():
+    preamble, sections = hydrate.split_sections(OUTLINE)
+    assert preamble == "# Pool Pumps\n\nIntro: why pumps matter"
+    assert [s.splitlines()[0] for s in sections] == ["## Types", "## Sizing"]
+    assert "## not a heading" in sections[0]
+    assert hydrate.split_sections("# Only\n- a") == ("# Only\n- a", [])
+
+
+def test_hydrate_article_sections_parallel_retry_and_cache(monkeypatch, tmp_path):
+    from cache_util import TieredCache
+
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    monkeypatch.setattr(hydrate.time, "sleep", lambda s: None)
+    monkeypatch.setattr(hydrate.client, "cache", TieredCache(str(tmp_path)))
+    calls = []
+    failed = set()
+
+    class _Resp:
+        status_code = 200
+        headers: dict = {}
+
+        def __init__(self, text):
+            self.text = text
+
+        def raise_for_status(self):
+            return None
+
+        def json(self):
+            return {"choices": [{"message": {"content": self.text}}]}
+
+    class _Transport:
+        def post(self, path, json=None):  # noqa: A002
+            messages = json["messages"]
+            section = messages[-1]["content"]
+            calls.append(section.splitlines()[0])
+            assert messages[1]["content"].startswith("Article context:\n# Pool Pumps")
+            if section.startswith("## Sizing") and "sizing" not in failed:
+                failed.add("sizing")
+                raise RuntimeError("timeout")
+            return _Resp(f"WRITTEN {section.splitlines()[0]}")
+
+    monkeypatch.setattr(hydrate.client, "_ensure", lambda: _Transport())
+    out = hydrate.hydrate_article_sections(OUTLINE, model="m", article="pumps")
+    assert out.split("\n\n") == [
+        "WRITTEN # Pool Pumps",
+        "WRITTEN ## Types",
+        "WRITTEN ## Sizing",
+    ]
+    assert calls.count("## Sizing") == 2
+
+    # Second run is served entirely from the per-section response cache
+    calls.clear()
+    assert hydrate.hydrate_article_sections(OUTLINE, model="m", article="pumps") == out
+    assert calls == []
+
+    # Only edited parts of the same article are re-hydrated, even after retitling
+    edited = OUTLINE.replace("# Pool Pumps", "# Pool Pumps Guide").replace(
+        "## Sizing\n- flow rate", "## Sizing and flow\n- flow rate  \n\n- head loss"
+    )
+    monkeypatch.setattr(hydrate.client, "_ensure", lambda: _Edited())
+
+    class _Edited(_Transport):
+        def post(self, path, json=None):  # noqa: A002
+            section = json["messages"][-1]["content"]
+            calls.append(section.splitlines()[0])
+            return _Resp(f"REWRITTEN {section.splitlines()[0]}")
+
+    before = HYDRATED_SECTIONS.value(result="reused")
+    assert hydrate.hydrate_article_sections(edited, model="m", article="pumps").split("\n\n") == [
+        "REWRITTEN # Pool Pumps Guide",
+        "WRITTEN ## Types",
+        "REWRITTEN ## Sizing and flow",
+    ]
+    assert sorted(calls) == ["# Pool Pumps Guide", "## Sizing and flow"]
+    assert HYDRATED_SECTIONS.value(result="reused") == before + 1
+
+
+def test_hydrate_article_sections_does_not_share_generic_sections(monkeypatch, tmp_path):
+    from cache_util import TieredCache
+
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    monkeypatch.setattr(hydrate.client, "cache", TieredCache(str(tmp_path)))
+    monkeypatch.setattr(hydrate, "_hydrate_section", lambda pre, sec, model, retries: pre)
+    generic = "## Intro\n- overview\n\n## Conclusion\n- wrap up"
+
+    pumps = hydrate.hydrate_article_sections(f"# Pool Pumps\n\n{generic}", model="m")
+    taxes = hydrate.hydrate_article_sections(f"# Tax Law 2026\n\n{generic}", model="m")
+    assert "Pool Pumps" not in taxes.split("\n\n", 1)[1]
+    assert taxes.count("# Tax Law 2026") == 3 and pumps.count("# Pool Pumps") == 3
+
+    # Without a preamble, the article (e.g. the prompt) keeps them apart
+    monkeypatch.setattr(hydrate, "_hydrate_section", lambda pre, sec, model, retries: "pumps")
+    first = hydrate.hydrate_article_sections(generic, model="m", article="pumps")
+    monkeypatch.setattr(hydrate, "_hydrate_section", lambda pre, sec, model, retries: "taxes")
+    second = hydrate.hydrate_article_sections(generic, model="m", article="taxes")
+    assert (first, second) == ("pumps\n\npumps", "taxes\n\ntaxes")
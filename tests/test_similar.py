@@ -0,0 +1,87 @@
+import asyncio
+import json
+import sys
+
+import scaffold
+from similar import PromptIndex, jaccard, normalize_prompt, shingles
+
+
+def test_normalize_and_similarity():
+    assert normalize_prompt("Best Pool-Pumps (2026)!") == "best pool pumps 2026"
+    a = shingles(normalize_prompt("10 Best Pool Pumps 2026"))
+    b = shingles(normalize_prompt("best pool pumps (2026)"))
+    assert jaccard(a, b) > 0.8
+    assert jaccard(a, shingles("pool pump buying guide")) < 0.3
+
+
+def test_index_matches_variants_only(tmp_path):
+    index = PromptIndex(str(tmp_path), threshold=0.8, mode="reuse")
+    index.add("10 Best Pool Pumps 2026", "m", None, "# Pumps outline")
+    index.add("Best pool heaters 2026", "m", None, "# Heaters outline")
+
+    matches = index.search("best pool pumps (2026)", "m")
+    assert [m["outline"] for m in matches] == ["# Pumps outline"]
+    assert matches[0]["prompt"] == "10 Best Pool Pumps 2026"
+    # Different year, model or links: not interchangeable
+    assert index.search("10 best pool pumps 2025", "m") == []
+    assert index.search("best pool pumps (2026)", "other-model") == []
+    assert index.search("best pool pumps (2026)", "m", ["https://a"]) == []
+
+    # Re-adding a prompt replaces its outline
+    index.add("10 best pool pumps 2026", "m", None, "# Newer outline")
+    assert index.reusable("Best Pool Pumps 2026", "m") == "# Newer outline"
+    index.close()
+
+
+def test_index_forgets_prompts_whose_outline_left_the_cache(tmp_path):
+    from cache_util import cache_clear
+
+    index = PromptIndex(str(tmp_path), mode="reuse")
+    index.add("10 Best Pool Pumps 2026", "m", None, "# Pumps outline")
+    # Outlines are stored in the cache store under its budget and TTLs, not in the index
+    cache_clear(str(tmp_path), "outlines")
+    assert index.search("best pool pumps (2026)", "m") == []
+    with index._lock:
+        assert index._db().execute("SELECT COUNT(*) FROM prompts").fetchone() == (0,)
+    index.close()
+
+
+def test_scaffold_reuses_similar_outline(monkeypatch, tmp_path):
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    calls = []
+
+    def _chat(model, messages):
+        calls.append(messages[1]["content"])
+        return f"# Outline for {messages[1]['content']}"
+
+    async def _achat(model, messages):
+        return _chat(model, messages)
+
+    monkeypatch.setattr(scaffold.client, "chat", _chat)
+    monkeypatch.setattr(scaffold.client, "achat", _achat)
+
+    monkeypatch.setattr(scaffold, "index", PromptIndex(str(tmp_path), mode="suggest"))
+    scaffold.scaffold_article("10 Best Pool Pumps 2026", model="m")
+    scaffold.scaffold_article("best pool pumps (2026)", model="m")
+    assert len(calls) == 2
+
+    scaffold.index.mode = "reuse"
+    out = asyncio.run(scaffold.ascaffold_article("Best pool pumps 2026!", model="m"))
+    assert out == "# Outline for best pool pumps (2026)"
+    assert len(calls) == 2
+
+    # Outlines built on source summaries are never reused or recorded
+    sources = [{"url": "https://a", "title": "", "summary": "s"}]
+    scaffold.scaffold_article("best pool pumps 2026", model="m", sources=sources)
+    assert len(calls) == 3
+
+
+def test_cli_cache_similar(monkeypatch, tmp_path, capsys):
+    import cli
+
+    PromptIndex(str(tmp_path)).add("10 Best Pool Pumps 2026", "m", None, "# Pumps")
+    argv = ["cli.py", "cache", "similar", "best pool pumps 2026", "--model", "m"]
+    monkeypatch.setattr(sys, "argv", argv + ["--cache-dir", str(tmp_path)])
+    cli.main()
+    matches = json.loads(capsys.readouterr().out)
+    assert matches[0]["prompt"] == "10 Best Pool Pumps 2026"
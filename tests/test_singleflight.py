@@ -0,0 +1,110 @@
+import asyncio
+
+from cache_util import acquire_lease, lease_held, release_lease
+from singleflight import AsyncSingleFlight, coalesce_across_processes
+
+
+def test_single_flight_coalesces_identical_keys():
+    calls = []
+
+    async def _work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"result-{key}"
+
+    async def _run():
+        flights = AsyncSingleFlight()
+        results = await asyncio.gather(
+            flights.do("a", lambda: _work("a")),
+            flights.do("a", lambda: _work("a")),
+            flights.do("b", lambda: _work("b")),
+        )
+        return results, len(flights)
+
+    results, inflight = asyncio.run(_run())
+    assert results == ["result-a", "result-a", "result-b"]
+    assert sorted(calls) == ["a", "b"]
+    assert inflight == 0
+
+
+def test_single_flight_survives_cancelled_caller():
+    async def _run():
+        flights = AsyncSingleFlight()
+
+        async def _work():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.ensure_future(flights.do("k", _work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flights.do("k", _work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(_run()) == "done"
+
+
+def test_leases_are_exclusive_until_released(tmp_path):
+    cache_dir = str(tmp_path)
+    assert acquire_lease(cache_dir, "flight:x", "worker-1", ttl=60)
+    assert not acquire_lease(cache_dir, "flight:x", "worker-2", ttl=60)
+    assert lease_held(cache_dir, "flight:x")
+    release_lease(cache_dir, "flight:x", "worker-2")  # not the owner: no effect
+    assert lease_held(cache_dir, "flight:x")
+    release_lease(cache_dir, "flight:x", "worker-1")
+    assert acquire_lease(cache_dir, "flight:x", "worker-2", ttl=60)
+    # Expired leases can be taken over
+    assert acquire_lease(cache_dir, "flight:y", "worker-1", ttl=-1)
+    assert acquire_lease(cache_dir, "flight:y", "worker-2", ttl=60)
+
+
+def test_coalesce_across_processes_waits_for_holder(tmp_path):
+    cache_dir = str(tmp_path)
+    order = []
+
+    async def _run():
+        # Another worker is generating the same prompt
+        acquire_lease(cache_dir, "flight:k", "other-worker", ttl=60)
+
+        async def _release_later():
+            await asyncio.sleep(0.05)
+            order.append("holder done")
+            release_lease(cache_dir, "flight:k", "other-worker")
+
+        async def _fn():
+            order.append("waiter runs")
+            return "cached result"
+
+        releaser = asyncio.ensure_future(_release_later())
+        result = await coalesce_across_processes(cache_dir, "k", _fn, ttl=5, poll_interval=0.01)
+        await releaser
+        return result
+
+    assert asyncio.run(_run()) == "cached result"
+    assert order == ["holder done", "waiter runs"]
+    assert not lease_held(cache_dir, "flight:k")
+
+
+def test_app_generate_coalesced_runs_once(monkeypatch, tmp_path):
+    import app as webapp
+    from cache_util import TieredCache
+
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    monkeypatch.setattr(webapp.llm_client, "cache", TieredCache(str(tmp_path)))
+    calls = []
+
+    async def _generate(prompt, links):
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        return "outline", "article"
+
+    monkeypatch.setattr(webapp, "_generate_article", _generate)
+
+    async def _run():
+        return await asyncio.gather(
+            *(webapp.generate_coalesced("Trending", ["http://a"]) for _ in range(3))
+        )
+
+    assert asyncio.run(_run()) == [("outline", "article")] * 3
+    assert calls == ["Trending"]
@@ -0,0 +1,128 @@
+from unittest import mock
+
+import pytest
+import requests
+
+import sources
+from cache_util import TieredCache
+
+PAGE = """<html><head><title> Widget  Guide </title><script>var x = 1;</script></head>
+<body><nav><p>Home | About</p></nav>
+<article><p>Widgets are small. They are useful.</p><p>Second &amp; last paragraph.</p></article>
+<footer><p>Copyright</p></footer></body></html>"""
+
+
+@pytest.fixture(autouse=True)
+def _pages_cache(monkeypatch, tmp_path):
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    monkeypatch.setattr(sources, "cache", TieredCache(str(tmp_path)))
+
+
+class _Resp:
+    def __init__(self, status=200, body=PAGE, headers=None):
+        self.status_code = status
+        self.body = body.encode("utf-8")
+        self.headers = {"Content-Type": "text/html; charset=utf-8", **(headers or {})}
+        self.encoding = "utf-8"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+    def iter_content(self, chunk_size=1):
+        yield self.body
+
+
+class _Session:
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None, stream=None):
+        self.requests.append((url, dict(headers or {})))
+        reply = self.routes[url]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply(headers or {}) if callable(reply) else reply
+
+
+def test_extract_text_skips_page_chrome():
+    title, text = sources.extract_text(PAGE)
+    assert title == "Widget Guide"
+    assert text == "Widgets are small. They are useful.\nSecond & last paragraph."
+    assert sources.summarize("One two. Three four five six.", max_chars=12) == "One two."
+
+
+def test_fetch_sources_drops_dead_links_and_keeps_order(monkeypatch):
+    session = _Session(
+        {
+            "https://a": _Resp(),
+            "https://dead": _Resp(status=404),
+            "https://pdf": _Resp(headers={"Content-Type": "application/pdf"}),
+            "https://down": requests.ConnectionError("refused"),
+        }
+    )
+    monkeypatch.setattr(sources, "_get_session", lambda: session)
+    out = sources.fetch_sources(
+        ["https://dead", "https://a", "https://pdf", "https://down", "https://a", "mailto:x"]
+    )
+    assert out == [
+        {
+            "url": "https://a",
+            "title": "Widget Guide",
+            "summary": "Widgets are small. They are useful. Second & last paragraph.",
+        }
+    ]
+    assert sorted(url for url, _ in session.requests) == [
+        "https://a",
+        "https://dead",
+        "https://down",
+        "https://pdf",
+    ]
+
+
+def test_fetch_page_with_unknown_charset_falls_back_to_utf8(monkeypatch):
+    resp = _Resp(headers={"Content-Type": "text/html; charset=x-bogus"})
+    resp.encoding = "x-bogus"
+    monkeypatch.setattr(sources, "_get_session", lambda: _Session({"https://a": resp}))
+    assert sources.fetch_page("https://a")["title"] == "Widget Guide"
+
+
+def test_fetch_page_revalidates_with_etag(monkeypatch):
+    def _page(headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return _Resp(status=304, body="")
+        return _Resp(headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+    session = _Session({"https://a": _page})
+    monkeypatch.setattr(sources, "_get_session", lambda: session)
+    first = sources.fetch_page("https://a")
+    second = sources.fetch_page("https://a")
+    assert first == second and first["title"] == "Widget Guide"
+    assert session.requests[1][1] == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+    # Unreachable later: the cached copy is still used
+    session.routes["https://a"] = requests.Timeout("slow")
+    assert sources.fetch_page("https://a") == first
+
+
+def test_scaffold_receives_source_summaries(monkeypatch):
+    import scaffold
+
+    seen = {}
+
+    def _chat(model, messages):
+        seen["messages"] = messages
+        return "outline"
+
+    monkeypatch.setattr(scaffold.client, "chat", _chat)
+    with mock.patch.object(
+        sources, "fetch_page", return_value={"url": "https://a", "title": "T", "text": "Body."}
+    ):
+        found = sources.fetch_sources(["https://a"])
+    scaffold.scaffold_article("Topic", ["https://a"], sources=found)
+    assert seen["messages"][-1]["content"] == "Source summaries:\n- T (https://a): Body."
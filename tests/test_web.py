@@ -34,6 +34,21 @@ def test_generate_with_links(monkeypatch):
     assert "References" in r.text
 
 
+def test_generate_stream_emits_events(monkeypatch):
+    monkeypatch.setenv("DRY_RUN", "1")
+    from app import app
+
+    client = TestClient(app)
+    r = client.post("/generate/stream", data={"prompt": "Stream Me", "fetch_links_flag": "on"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in r.text.split("\n\n") if block]
+    assert events[0].startswith("event: outline")
+    assert any(e.startswith("event: chunk") for e in events)
+    assert "References" in r.text
+    assert events[-1].startswith("event: done")
+
+
 def test_health_wp_success(monkeypatch):
     # Mock the WP connectivity check to avoid real network calls
     monkeypatch.setenv("DRY_RUN", "1")
@@ -1,3 +1,10 @@
+import types
+
+import pytest
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 32
+
+
 class DummyResp:
     def __init__(self, data, status_code=200, content=None):
         self._data = data
@@ -9,6 +16,13 @@ class DummyResp:
             self.content = data
         else:
             self.content = None
+        self.headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
 
     def iter_content(self, chunk_size=8192):  # noqa: D401
         if self.content is None:
@@ -27,6 +41,7 @@ class FakeSession:
     def __init__(self):
         self.posts = []
         self.gets = []
+        self.uploads = []
 
     def get(self, url, params=None, auth=None, timeout=None, **kwargs):  # noqa: D401, ANN003
         self.gets.append((url, params))
@@ -34,13 +49,13 @@ class FakeSession:
         if "/wp-json/" in url:
             # Terms search endpoints return empty by default (forces create)
             return DummyResp([])
-        # Otherwise treat as media download (return bytes in .content)
-        return DummyResp(b"img-bytes")
+        # Otherwise treat as media download (return JPEG bytes in .content)
+        return DummyResp(JPEG)
 
-    def post(self, url, json=None, files=None, auth=None, timeout=None):  # noqa: A002
-        # Media upload
+    def post(self, url, json=None, data=None, headers=None, auth=None, timeout=None):  # noqa: A002
+        # Media upload: raw streamed body described by headers
         if url.endswith("/wp-json/wp/v2/media"):
-            assert files and "file" in files
+            self.uploads.append((headers, data.read()))
             return DummyResp({"id": 77})
         # Term create (categories or tags)
         if url.endswith("/wp-json/wp/v2/categories"):
@@ -61,7 +76,7 @@ def _prep_env(monkeypatch):
     monkeypatch.setenv("WP_APP_PASS", "pass")
 
 
-def test_publish_with_ids(monkeypatch):
+def test_publish_with_ids(monkeypatch, tmp_path):
     _prep_env(monkeypatch)
     import wordpress  # noqa: WPS433
 
@@ -70,9 +85,8 @@ def test_publish_with_ids(monkeypatch):
     wordpress.WP_APP_PASS = "pass"
 
     fake = FakeSession()
-    monkeypatch.setattr(wordpress, "_session_with_retries", lambda: fake)
-
     out = wordpress.publish_to_wordpress(
+        wp_client=wordpress.WordPressClient(session=fake, cache_dir=str(tmp_path)),
         title="Title",
         content_html="<p>x</p>",
         status="draft",
@@ -85,7 +99,7 @@ def test_publish_with_ids(monkeypatch):
     assert "preview_link" in out and "?p=123" in out["preview_link"]
 
 
-def test_publish_with_names_creates_terms(monkeypatch):
+def test_publish_with_names_creates_terms(monkeypatch, tmp_path):
     _prep_env(monkeypatch)
     import wordpress  # noqa: WPS433
 
@@ -94,9 +108,8 @@ def test_publish_with_names_creates_terms(monkeypatch):
     wordpress.WP_APP_PASS = "pass"
 
     fake = FakeSession()
-    monkeypatch.setattr(wordpress, "_session_with_retries", lambda: fake)
-
     out = wordpress.publish_to_wordpress(
+        wp_client=wordpress.WordPressClient(session=fake, cache_dir=str(tmp_path)),
         title="Title",
         content_html="<p>x</p>",
         status="draft",
@@ -108,7 +121,7 @@ def test_publish_with_names_creates_terms(monkeypatch):
     assert fake.posts[-1]["tags"] == [44]
 
 
-def test_publish_with_featured_image_url(monkeypatch):
+def test_publish_with_featured_image_url(monkeypatch, tmp_path):
     _prep_env(monkeypatch)
     import wordpress  # noqa: WPS433
 
@@ -116,18 +129,88 @@ def test_publish_with_featured_image_url(monkeypatch):
     wordpress.WP_USER = "user"
     wordpress.WP_APP_PASS = "pass"
 
-    fake = FakeSession()
-    monkeypatch.setattr(wordpress, "_session_with_retries", lambda: fake)
-
+    fake, images = FakeSession(), FakeSession()
+    wp = wordpress.WordPressClient(session=fake, cache_dir=str(tmp_path), image_session=images)
     out = wordpress.publish_to_wordpress(
+        wp_client=wp,
         title="Title",
         content_html="<p>x</p>",
         status="publish",
         featured_image="https://cdn.example.com/img.jpg",
     )
     assert out["id"] == 123
+    # The image host is not fetched through the rate-limited WordPress session
+    assert images.gets == [("https://cdn.example.com/img.jpg", None)]
+    assert all("cdn.example.com" not in url for url, _ in fake.gets)
     # Ensure featured_media is included in the payload used for the post
     assert fake.posts[-1]["featured_media"] == 77
+    headers, body = fake.uploads[-1]
+    assert body == JPEG and headers["Content-Type"] == "image/jpeg"
+    assert 'filename="img.jpg"' in headers["Content-Disposition"]
+
+
+def test_identical_images_upload_once(monkeypatch, tmp_path):
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+    path = tmp_path / "hero.jpg"
+    path.write_bytes(JPEG)
+
+    class MediaSession(FakeSession):
+        def __init__(self):
+            super().__init__()
+            self.live = True
+
+        def get(self, url, params=None, auth=None, timeout=None, **kwargs):  # noqa: ANN003
+            if "/wp/v2/media/" in url:
+                self.gets.append((url, params))
+                return DummyResp({"id": 77}, status_code=200 if self.live else 404)
+            return super().get(url, params=params, auth=auth, timeout=timeout, **kwargs)
+
+    session = MediaSession()
+    wp = wordpress.WordPressClient(
+        session=session, cache_dir=str(tmp_path / "cache"), image_session=FakeSession()
+    )
+    assert wordpress._upload_featured_media(wp, str(path)) == 77
+    # Same bytes from a URL: verified with one GET, not uploaded again
+    assert wordpress._upload_featured_media(wp, "https://cdn.example.com/copy.jpg") == 77
+    assert len(session.uploads) == 1
+    assert session.gets[-1][0] == "https://example.com/wp-json/wp/v2/media/77"
+
+    # Deleted in WordPress: uploaded again
+    session.live = False
+    assert wordpress._upload_featured_media(wp, str(path)) == 77
+    assert len(session.uploads) == 2
+
+
+def test_upload_local_image_streams_file(monkeypatch, tmp_path):
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+    png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+    path = tmp_path / "photo.bin"
+    path.write_bytes(png)
+
+    class FileSession:
+        def post(self, url, data=None, headers=None, auth=None, timeout=None):
+            # A file object, not bytes, so requests streams it from disk
+            assert hasattr(data, "read") and data.tell() == 0
+            self.body, self.headers = data.read(), headers
+            return DummyResp({"id": 5})
+
+    session = FileSession()
+    wp = wordpress.WordPressClient(session=session, cache_dir=str(tmp_path))
+    assert wordpress._upload_featured_media(wp, str(path)) == 5
+    assert session.body == png and session.headers["Content-Type"] == "image/png"
+    assert 'filename="photo.png"' in session.headers["Content-Disposition"]
+
+    monkeypatch.setattr(wordpress, "MAX_MEDIA_BYTES", 50)
+    with pytest.raises(ValueError, match="size limit"):
+        wordpress._upload_featured_media(wp, str(path))
+    (tmp_path / "fake.jpg").write_bytes(b"<html>not an image</html>")
+    monkeypatch.setattr(wordpress, "MAX_MEDIA_BYTES", 1000)
+    with pytest.raises(ValueError, match="content-type"):
+        wordpress._upload_featured_media(wp, str(tmp_path / "fake.jpg"))
 
 
 def test_publish_dry_run(monkeypatch):
@@ -146,3 +229,210 @@ def test_publish_dry_run(monkeypatch):
     )
     assert out["id"] == 0
     assert "preview_link" in out
+
+
+def test_client_reuses_one_pooled_session(monkeypatch):
+    import wordpress  # noqa: WPS433
+
+    wp = wordpress.WordPressClient(pool_size=4, retries=1)
+    session = wp.session
+    assert wp.session is session
+    adapter = session.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == 4 and adapter.max_retries.total == 1
+    wp.close()
+    assert wp.session is not session
+
+
+def test_check_connection_uses_client_session(monkeypatch, tmp_path):
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+    monkeypatch.setattr(wordpress, "WP_USER", "user")
+    monkeypatch.setattr(wordpress, "WP_APP_PASS", "pass")
+
+    class MeSession:
+        def __init__(self):
+            self.urls = []
+
+        def get(self, url, auth=None, timeout=None):
+            self.urls.append(url)
+            resp = DummyResp({"id": 1, "name": "admin"})
+            resp.ok = True
+            return resp
+
+    session = MeSession()
+    out = wordpress.check_wordpress_connection(
+        wp_client=wordpress.WordPressClient(session=session, cache_dir=str(tmp_path))
+    )
+    assert out["ok"] and out["user"]["name"] == "admin"
+    assert session.urls == ["https://example.com/wp-json/wp/v2/users/me"]
+
+
+class TermsSession:
+    """Serves a paginated terms listing and records every request."""
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.gets = []
+        self.created = []
+
+    def get(self, url, params=None, auth=None, timeout=None):
+        self.gets.append(dict(params or {}))
+        ordered = sorted(self.terms, key=lambda t: t["id"], reverse=True)
+        start = (params["page"] - 1) * params["per_page"]
+        return DummyResp(ordered[start : start + params["per_page"]])
+
+    def post(self, url, json=None, auth=None, timeout=None):  # noqa: A002
+        self.created.append(json["name"])
+        term = {"id": 1000 + len(self.created), "name": json["name"]}
+        self.terms.append(term)
+        return DummyResp(term)
+
+
+def test_term_index_prefetches_once_and_creates_only_missing(monkeypatch, tmp_path):
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+    monkeypatch.setattr(wordpress.TermIndex, "PER_PAGE", 2)
+    session = TermsSession(
+        [
+            {"id": 1, "name": "News"},
+            {"id": 2, "name": "Tips &amp; Tricks"},
+            {"id": 3, "name": "Python"},
+        ]
+    )
+    index = wordpress.TermIndex(str(tmp_path), ttl=3600)
+    ids = index.resolve(session, "tags", ["news", " tips & tricks ", "PYTHON", "Rust"])
+    assert ids == [1, 2, 3, 1001]
+    assert session.created == ["Rust"]
+    # Two pages of a paginated sweep, fields trimmed to id/name
+    assert [g["page"] for g in session.gets] == [1, 2]
+    assert session.gets[0]["_fields"] == "id,name"
+
+    # Warm in memory: no network at all
+    assert index.resolve(session, "tags", ["Rust", "News"]) == [1001, 1]
+    assert len(session.gets) == 2 and session.created == ["Rust"]
+
+    # A fresh process loads the persisted index instead of sweeping
+    reloaded = wordpress.TermIndex(str(tmp_path), ttl=3600)
+    assert reloaded.resolve(session, "tags", ["rust"], create_missing=False) == [1001]
+    assert len(session.gets) == 2
+
+
+def test_term_index_refreshes_incrementally_when_stale(monkeypatch, tmp_path):
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+    monkeypatch.setattr(wordpress.TermIndex, "PER_PAGE", 2)
+    session = TermsSession([{"id": i, "name": f"T{i}"} for i in range(1, 6)])
+    index = wordpress.TermIndex(str(tmp_path), ttl=-1)
+    assert index.resolve(session, "categories", ["t1"]) == [1]
+    assert len(session.gets) == 3
+    # Created elsewhere since the sweep; the refresh reads only the newest page
+    session.terms.append({"id": 6, "name": "T6"})
+    session.gets.clear()
+    assert index.resolve(session, "categories", ["T6"], create_missing=False) == [6]
+    assert [g["page"] for g in session.gets] == [1]
+    assert session.created == []
+
+
+def test_term_index_full_resweep_drops_deleted_and_renamed_terms(monkeypatch, tmp_path):
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+    session = TermsSession([{"id": 1, "name": "News"}, {"id": 2, "name": "Tips"}])
+    index = wordpress.TermIndex(str(tmp_path), ttl=3600, full_ttl=3600)
+    assert index.resolve(session, "tags", ["news", "tips"]) == [1, 2]
+
+    # Deleted and renamed on the site, then the full sweep comes due
+    session.terms[:] = [{"id": 2, "name": "Tricks"}]
+    index.full_ttl = -1
+    assert index.resolve(session, "tags", ["news", "tricks", "tips"], create_missing=False) == [2]
+    # The stale persisted copy is replaced too
+    reloaded = wordpress.TermIndex(str(tmp_path), ttl=3600, full_ttl=3600)
+    assert reloaded.resolve(session, "tags", ["tips"], create_missing=False) == []
+
+
+def test_create_term_handles_term_exists(monkeypatch):
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+
+    class ExistsSession:
+        def post(self, url, json=None, auth=None, timeout=None):  # noqa: A002
+            return DummyResp(
+                {"code": "term_exists", "data": {"status": 400, "term_id": 42}}, status_code=400
+            )
+
+    assert wordpress._create_term(ExistsSession(), "tags", "Dup") == 42
+
+
+def test_prepublish_steps_run_concurrently(monkeypatch, tmp_path):
+    import threading
+    import time
+
+    import wordpress  # noqa: WPS433
+
+    monkeypatch.delenv("DRY_RUN", raising=False)
+    monkeypatch.setattr(wordpress, "WP_URL", "https://example.com")
+    monkeypatch.setattr(wordpress, "WP_USER", "user")
+    monkeypatch.setattr(wordpress, "WP_APP_PASS", "pass")
+    barrier = threading.Barrier(3, timeout=5)
+
+    def _step(result):
+        def _run(*args):
+            # Each step blocks until all three are in flight at once
+            barrier.wait()
+            time.sleep(0.05)
+            return result
+
+        return _run
+
+    monkeypatch.setattr(
+        wordpress,
+        "_merge_terms",
+        lambda wp, ids, names, taxonomy: _step([33] if taxonomy == "categories" else [44])(),
+    )
+    monkeypatch.setattr(wordpress, "_upload_featured_media", _step(77))
+    fake = FakeSession()
+    out = wordpress.publish_to_wordpress(
+        title="Title",
+        content_html="<p>x</p>",
+        category_names=["News"],
+        tag_names=["Tips"],
+        featured_image="https://cdn.example.com/img.jpg",
+        wp_client=wordpress.WordPressClient(session=fake, cache_dir=str(tmp_path)),
+    )
+    payload = fake.posts[-1]
+    assert payload["categories"] == [33] and payload["tags"] == [44]
+    assert payload["featured_media"] == 77
+    assert set(out["timings"]) == {"categories", "tags", "media", "post", "total"}
+    # Overlapping steps: total is close to one step, not the sum of three
+    assert out["timings"]["total"] < 0.15
+
+
+def test_rate_limited_adapter_honours_retry_after(monkeypatch):
+    from requests.adapters import HTTPAdapter
+
+    import wordpress  # noqa: WPS433
+    from ratelimit import TokenBucket
+
+    class _Resp:
+        def __init__(self, status, headers=None):
+            self.status_code = status
+            self.headers = headers or {}
+
+        def close(self):
+            return None
+
+    replies = [_Resp(429, {"Retry-After": "3"}), _Resp(201)]
+    monkeypatch.setattr(HTTPAdapter, "send", lambda self, request, **kw: replies.pop(0))
+    pauses = []
+    limiter = TokenBucket(rate=100, burst=5)
+    monkeypatch.setattr(limiter, "pause", pauses.append)
+
+    session = wordpress._session_with_retries(pool_size=2, retries=2, limiter=limiter)
+    adapter = session.get_adapter("https://example.com")
+    assert 429 not in adapter.max_retries.status_forcelist
+    assert adapter.send(types.SimpleNamespace(body=b"{}")).status_code == 201
+    assert pauses == [3.0]
@@ -1,40 +1,135 @@
 from __future__ import annotations
 
+import hashlib
+import html
+import json
+import logging
 import mimetypes
 import os
+import re
+import tempfile
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-from config import MAX_MEDIA_BYTES, USER_AGENT, WP_APP_PASS, WP_URL, WP_USER
+from cache_util import cache_read, cache_write
+from config import (
+    DEFAULT_CACHE_DIR,
+    MAX_MEDIA_BYTES,
+    USER_AGENT,
+    WP_APP_PASS,
+    WP_POOL_SIZE,
+    WP_RETRIES,
+    WP_RETRY_BACKOFF,
+    WP_TERMS_FULL_TTL,
+    WP_TERMS_TTL,
+    WP_URL,
+    WP_USER,
+)
+from metrics import HTTP_RETRIES, STAGE_SECONDS
+from ratelimit import AdaptiveLimiter, TokenBucket, limiter_for, parse_retry_after
+
+
+class _CountingRetry(Retry):
+    """urllib3 Retry that records each retry in the metrics registry."""
+
+    def increment(self, *args, **kwargs):
+        new = super().increment(*args, **kwargs)
+        HTTP_RETRIES.inc(target="wordpress")
+        return new
+
+
+def _rewind(body) -> bool:
+    if body is None or isinstance(body, (bytes, str)):
+        return True
+    if hasattr(body, "seek"):
+        body.seek(0)
+        return True
+    return False
+
+
+class _RateLimitedAdapter(HTTPAdapter):
+    """
+    Sends every request through a shared limiter; a 429 pauses it for every worker.
 
+    With an AdaptiveLimiter, 429s also shrink the concurrency limit and successes grow it.
+    """
 
-def _session_with_retries() -> requests.Session:
+    def __init__(
+        self, limiter: AdaptiveLimiter | TokenBucket, retries: int, backoff: float, **kwargs
+    ):
+        self.limiter = limiter
+        self.retries_429 = retries
+        self.backoff = backoff
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                resp = super().send(request, **kwargs)
+            except BaseException:
+                self.limiter.release(succeeded=False)
+                raise
+            self.limiter.release(
+                throttled=resp.status_code == 429, succeeded=resp.status_code < 500
+            )
+            if resp.status_code != 429 or attempt >= self.retries_429:
+                return resp
+            if not _rewind(request.body):
+                # A streamed upload body cannot be replayed
+                return resp
+            delay = parse_retry_after(
+                resp.headers.get("Retry-After"), default=self.backoff * (2**attempt)
+            )
+            logging.warning(f"WordPress rate limited (429); pausing requests for {delay:.1f}s")
+            HTTP_RETRIES.inc(target="wordpress")
+            resp.close()
+            self.limiter.pause(delay)
+            attempt += 1
+
+
+def _session_with_retries(
+    pool_size: int = WP_POOL_SIZE,
+    retries: int = WP_RETRIES,
+    backoff: float = WP_RETRY_BACKOFF,
+    limiter: AdaptiveLimiter | TokenBucket | None = None,
+) -> requests.Session:
     s = requests.Session()
+    # With a limiter, 429s are retried by the adapter so Retry-After holds back every worker
+    statuses = [500, 502, 503, 504] if limiter is not None else [429, 500, 502, 503, 504]
     try:
-        retries = Retry(
-            total=3,
-            connect=3,
-            read=3,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
+        retry = _CountingRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            backoff_factor=backoff,
+            status_forcelist=statuses,
             allowed_methods=["GET", "POST"],
             raise_on_status=False,
         )
     except TypeError:
         # Fallback for older urllib3 where 'allowed_methods' may be 'method_whitelist'
-        retries = Retry(
-            total=3,
-            connect=3,
-            read=3,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
+        retry = _CountingRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            backoff_factor=backoff,
+            status_forcelist=statuses,
             method_whitelist=["GET", "POST"],
             raise_on_status=False,
         )
-    adapter = HTTPAdapter(max_retries=retries)
+    pool = {"pool_connections": pool_size, "pool_maxsize": pool_size, "max_retries": retry}
+    if limiter is not None:
+        adapter = _RateLimitedAdapter(limiter, retries, backoff, **pool)
+    else:
+        adapter = HTTPAdapter(**pool)
     s.mount("http://", adapter)
     s.mount("https://", adapter)
     s.headers.update({"User-Agent": USER_AGENT, "Accept": "application/json"})
@@ -49,40 +144,238 @@ def _auth():
     return (WP_USER, WP_APP_PASS)
 
 
-def _find_or_create_terms(
-    taxonomy: str, names: list[str] | None, create_missing: bool = True
-) -> list[int]:
-    if not names:
-        return []
-    session = _session_with_retries()
-    auth = _auth()
-    ids: list[int] = []
-    for name in names:
-        name = name.strip()
-        if not name:
-            continue
-        # search existing
-        search_ep = _api_url(f"/wp-json/wp/v2/{taxonomy}")
-        r = session.get(
-            search_ep,
-            params={"search": name, "per_page": 100},
-            auth=auth,
-            timeout=10,
-        )
-        r.raise_for_status()
-        results = r.json()
-        match = next(
-            (t for t in results if t.get("name", "").strip().lower() == name.lower()),
-            None,
-        )
-        if match:
-            ids.append(int(match["id"]))
-            continue
-        if create_missing:
-            cr = session.post(search_ep, json={"name": name}, auth=auth, timeout=10)
-            cr.raise_for_status()
-            ids.append(int(cr.json()["id"]))
-    return ids
+def _normalize_term(name: str) -> str:
+    # WordPress returns names HTML-escaped ("Tips &amp; Tricks") and matches them case-insensitively
+    return " ".join(html.unescape(name).split()).casefold()
+
+
+def _create_term(session: requests.Session, taxonomy: str, name: str) -> int:
+    cr = session.post(
+        _api_url(f"/wp-json/wp/v2/{taxonomy}"), json={"name": name}, auth=_auth(), timeout=10
+    )
+    if cr.status_code == 400:
+        # Created concurrently elsewhere since the index was refreshed; WP reports its id
+        try:
+            err = cr.json()
+        except ValueError:
+            err = {}
+        if isinstance(err, dict) and err.get("code") == "term_exists":
+            return int(err["data"]["term_id"])
+    cr.raise_for_status()
+    return int(cr.json()["id"])
+
+
+class TermIndex:
+    """
+    Normalized name -> id index of a site's taxonomy terms.
+
+    Built from one paginated sweep of the terms endpoint and persisted in the cache store,
+    so publishes resolve names locally. Once older than ttl, only terms newer than the
+    known ones are fetched; only names missing from the index reach the network. Terms
+    deleted or renamed on the site are dropped by a full sweep once it is older than
+    full_ttl.
+    """
+
+    PER_PAGE = 100
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        ttl: float = WP_TERMS_TTL,
+        full_ttl: float = WP_TERMS_FULL_TTL,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.full_ttl = full_ttl
+        self._terms: dict[tuple, dict[str, int]] = {}
+        self._fetched_at: dict[tuple, float] = {}
+        self._swept_at: dict[tuple, float] = {}
+        self._locks: dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parts(taxonomy: str) -> list:
+        return [(WP_URL or "").rstrip("/"), taxonomy]
+
+    def _load(self, key: tuple) -> bool:
+        raw = cache_read(self.cache_dir, "wp_terms", list(key))
+        if not raw:
+            return False
+        try:
+            data = json.loads(raw)
+            terms = {str(name): int(tid) for name, tid in data["terms"].items()}
+            fetched_at = float(data["fetched_at"])
+            # Indexes saved before full sweeps were tracked get one on first use
+            swept_at = float(data.get("swept_at", 0.0))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        self._terms[key] = terms
+        self._fetched_at[key] = fetched_at
+        self._swept_at[key] = swept_at
+        return True
+
+    def _save(self, key: tuple) -> None:
+        data = {
+            "fetched_at": self._fetched_at[key],
+            "swept_at": self._swept_at[key],
+            "terms": self._terms[key],
+        }
+        cache_write(self.cache_dir, "wp_terms", list(key), json.dumps(data, sort_keys=True))
+
+    def _sweep(
+        self, session: requests.Session, taxonomy: str, known: set[int] | None = None
+    ) -> dict[str, int]:
+        # Newest first, so an incremental sweep can stop at the first page reaching known ids
+        terms: dict[str, int] = {}
+        page = 1
+        while True:
+            r = session.get(
+                _api_url(f"/wp-json/wp/v2/{taxonomy}"),
+                params={
+                    "per_page": self.PER_PAGE,
+                    "page": page,
+                    "orderby": "id",
+                    "order": "desc",
+                    "_fields": "id,name",
+                },
+                auth=_auth(),
+                timeout=10,
+            )
+            if r.status_code == 400 and page > 1:
+                # rest_post_invalid_page_number: ran past the last page
+                break
+            r.raise_for_status()
+            batch = r.json() or []
+            for term in batch:
+                name = _normalize_term(str(term.get("name", "")))
+                if name:
+                    # Later pages hold older terms; on duplicate names the oldest wins
+                    terms[name] = int(term["id"])
+            if known is not None and any(int(t["id"]) in known for t in batch):
+                break
+            if len(batch) < self.PER_PAGE:
+                break
+            page += 1
+        return terms
+
+    def _ensure(self, session: requests.Session, key: tuple) -> dict[str, int]:
+        terms = self._terms.get(key)
+        if terms is None and self._load(key):
+            terms = self._terms[key]
+        now = time.time()
+        if terms is None or now - self._swept_at[key] > self.full_ttl:
+            # Replaces the index: deleted terms disappear and renamed ones get their new name
+            terms = self._sweep(session, key[1])
+            self._swept_at[key] = now
+        elif now - self._fetched_at[key] > self.ttl:
+            for name, tid in self._sweep(session, key[1], known=set(terms.values())).items():
+                terms.setdefault(name, tid)
+        else:
+            return terms
+        self._terms[key] = terms
+        self._fetched_at[key] = now
+        self._save(key)
+        return terms
+
+    def resolve(
+        self,
+        session: requests.Session,
+        taxonomy: str,
+        names: list[str],
+        create_missing: bool = True,
+    ) -> list[int]:
+        key = tuple(self._parts(taxonomy))
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            terms = self._ensure(session, key)
+            ids: list[int] = []
+            created = False
+            for name in names:
+                name = name.strip()
+                norm = _normalize_term(name)
+                if not norm:
+                    continue
+                if norm not in terms:
+                    if not create_missing:
+                        continue
+                    terms[norm] = _create_term(session, taxonomy, name)
+                    created = True
+                ids.append(terms[norm])
+            if created:
+                self._save(key)
+        return ids
+
+
+class WordPressClient:
+    """Owns one pooled keep-alive session reused by every WordPress call in the process."""
+
+    def __init__(
+        self,
+        pool_size: int = WP_POOL_SIZE,
+        retries: int = WP_RETRIES,
+        backoff: float = WP_RETRY_BACKOFF,
+        session: requests.Session | None = None,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        limiter: AdaptiveLimiter | TokenBucket | None = None,
+        image_session: requests.Session | None = None,
+    ):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        # Shared by every thread using this client, e.g. publish-batch workers; defaults to
+        # the process-wide adaptive "wordpress" limiter
+        self.limiter = limiter if limiter is not None else limiter_for("wordpress")
+        self._session = session
+        self._image_session = image_session
+        self._lock = threading.Lock()
+        self._media_locks: dict[str, threading.Lock] = {}
+        self.terms = TermIndex(cache_dir)
+
+    @property
+    def cache_dir(self) -> str:
+        # Term index and media map persist in the same cache store
+        return self.terms.cache_dir
+
+    @cache_dir.setter
+    def cache_dir(self, value: str) -> None:
+        self.terms.cache_dir = value
+
+    def media_lock(self, digest: str) -> threading.Lock:
+        with self._lock:
+            return self._media_locks.setdefault(digest, threading.Lock())
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = _session_with_retries(
+                        self.pool_size, self.retries, self.backoff, self.limiter
+                    )
+        return self._session
+
+    @property
+    def image_session(self) -> requests.Session:
+        # Featured-image URLs live on other hosts: their 429s and slots are not WordPress's
+        if self._image_session is None:
+            with self._lock:
+                if self._image_session is None:
+                    s = _session_with_retries(self.pool_size, self.retries, self.backoff)
+                    s.headers["Accept"] = "image/*,*/*;q=0.5"
+                    self._image_session = s
+        return self._image_session
+
+    def close(self) -> None:
+        with self._lock:
+            for name in ("_session", "_image_session"):
+                s = getattr(self, name)
+                if s is not None:
+                    s.close()
+                    setattr(self, name, None)
+
+
+client = WordPressClient()
 
 
 ALLOWED_MEDIA_TYPES = {
@@ -93,50 +386,139 @@ ALLOWED_MEDIA_TYPES = {
 }
 
 
-def _upload_featured_media(image: str | None) -> int | None:
+# Leading bytes identifying each allowed type; WEBP is RIFF....WEBP
+_IMAGE_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+_SNIFF_BYTES = 12
+_CHUNK = 64 * 1024
+
+
+def _sniff_mime(head: bytes) -> str:
+    """Content type from the file's leading bytes; raises unless it is an allowed image."""
+    mime = next((m for magic, m in _IMAGE_MAGIC if head.startswith(magic)), None)
+    if mime is None and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        mime = "image/webp"
+    if mime not in ALLOWED_MEDIA_TYPES:
+        raise ValueError(f"Unsupported featured image content-type: {mime or 'unknown'}")
+    return mime
+
+
+def _media_filename(filename: str, mime: str) -> str:
+    # WordPress validates the upload by extension too; make it agree with the content
+    stem, ext = os.path.splitext(filename)
+    if mimetypes.guess_type(filename)[0] != mime:
+        ext = {"image/jpeg": ".jpg"}.get(mime) or mimetypes.guess_extension(mime) or ""
+    return f"{stem or 'image'}{ext}"
+
+
+def _content_disposition(filename: str) -> str:
+    fallback = re.sub(r'[^A-Za-z0-9._-]+', "_", filename) or "image"
+    quoted = urllib.parse.quote(filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quoted}"
+
+
+def _media_headers(filename: str, mime: str) -> dict:
+    return {
+        "Content-Type": mime,
+        "Content-Disposition": _content_disposition(_media_filename(filename, mime)),
+    }
+
+
+def _spool_url(session: requests.Session, url: str):
+    """Download url into an anonymous temp file, enforcing MAX_MEDIA_BYTES as it arrives."""
+    f = tempfile.TemporaryFile()
+    try:
+        with session.get(url, timeout=20, stream=True) as r:
+            r.raise_for_status()
+            if int(r.headers.get("Content-Length") or 0) > MAX_MEDIA_BYTES:
+                raise ValueError("Featured image exceeds size limit")
+            total = 0
+            for chunk in r.iter_content(chunk_size=_CHUNK):
+                total += len(chunk)
+                if total > MAX_MEDIA_BYTES:
+                    raise ValueError("Featured image exceeds size limit")
+                f.write(chunk)
+        f.seek(0)
+        return f
+    except BaseException:
+        f.close()
+        raise
+
+
+def _hash_file(f) -> str:
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(_CHUNK), b""):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def _media_exists(session: requests.Session, media_id: int) -> bool:
+    r = session.get(
+        _api_url(f"/wp-json/wp/v2/media/{media_id}"),
+        params={"_fields": "id"},
+        auth=_auth(),
+        timeout=10,
+    )
+    return r.status_code == 200
+
+
+def _upload_featured_media(wp: WordPressClient, image: str | None) -> int | None:
+    """
+    Upload a featured image as a raw request body and return its media id.
+
+    Images are streamed from disk (URLs are first spooled to a temp file), so at most
+    one chunk is in memory. Content already uploaded to this site, per a persisted
+    sha256 -> media id map, is reused as long as the media item still exists.
+    """
     if not image:
         return None
-    session = _session_with_retries()
-    auth = _auth()
-    filename = None
-    content: bytes | None = None
+    session = wp.session
     if image.startswith("http://") or image.startswith("https://"):
-        filename = urllib.parse.unquote(image.split("/")[-1]) or "image"
-        r = session.get(image, timeout=20, stream=True)
-        r.raise_for_status()
-        # Enforce max size
-        chunks = []
-        total = 0
-        for chunk in r.iter_content(chunk_size=8192):
-            if not chunk:
-                continue
-            total += len(chunk)
-            if total > MAX_MEDIA_BYTES:
-                raise ValueError("Featured image exceeds size limit")
-            chunks.append(chunk)
-        content = b"".join(chunks)
+        filename = urllib.parse.unquote(urllib.parse.urlsplit(image).path.split("/")[-1])
+        f = _spool_url(wp.image_session, image)
     else:
+        if os.path.getsize(image) > MAX_MEDIA_BYTES:
+            raise ValueError("Featured image exceeds size limit")
         filename = os.path.basename(image)
-        with open(image, "rb") as f:
-            content = f.read()
-    mime, _ = mimetypes.guess_type(filename)
-    if not mime:
-        mime = "application/octet-stream"
-    if mime not in ALLOWED_MEDIA_TYPES:
-        raise ValueError(f"Unsupported featured image content-type: {mime}")
-    files = {"file": (filename, content, mime)}
-    ep = _api_url("/wp-json/wp/v2/media")
-    resp = session.post(ep, files=files, auth=auth, timeout=30)
-    resp.raise_for_status()
-    return int(resp.json().get("id"))
+        f = open(image, "rb")
+    with f:
+        mime = _sniff_mime(f.read(_SNIFF_BYTES))
+        f.seek(0)
+        digest = _hash_file(f)
+        parts = [(WP_URL or "").rstrip("/"), digest]
+        # Concurrent publishes of one image wait for a single upload instead of racing
+        with wp.media_lock(digest):
+            known = cache_read(wp.cache_dir, "wp_media", parts)
+            if known and _media_exists(session, int(known)):
+                return int(known)
+            # requests streams file objects in blocks and sets Content-Length from the size
+            resp = session.post(
+                _api_url("/wp-json/wp/v2/media"),
+                data=f,
+                headers=_media_headers(filename, mime),
+                auth=_auth(),
+                timeout=30,
+            )
+            resp.raise_for_status()
+            media_id = int(resp.json().get("id"))
+            cache_write(wp.cache_dir, "wp_media", parts, str(media_id))
+    return media_id
 
 
 def _merge_terms(
-    existing: list[int] | None, names: list[str] | None, taxonomy: str
+    wp: WordPressClient,
+    existing: list[int] | None,
+    names: list[str] | None,
+    taxonomy: str,
 ) -> list[int] | None:
     if not names and not existing:
         return None
-    resolved = _find_or_create_terms(taxonomy, names) if names else []
+    resolved = wp.terms.resolve(wp.session, taxonomy, names) if names else []
     merged = list({int(x) for x in (existing or []) + resolved})
     return merged or None
 
@@ -149,10 +531,12 @@ def _compute_preview_link(status: str, post_id: int, link: str | None) -> str:
 
 def _dry_run_response(status: str) -> dict:
     fake_id = 0
+    # Dry runs must not require WordPress settings
+    base = (WP_URL or "").rstrip("/")
     if status != "publish":
-        preview = f"{WP_URL.rstrip('/')}/?p={fake_id}&preview=true"
+        preview = f"{base}/?p={fake_id}&preview=true"
     else:
-        preview = f"{WP_URL.rstrip('/')}/posts/{fake_id}"
+        preview = f"{base}/posts/{fake_id}"
     return {
         "id": fake_id,
         "status": status,
@@ -188,6 +572,7 @@ def publish_to_wordpress(
     tags: list[int] | None = None,
     tag_names: list[str] | None = None,
     featured_image: str | None = None,
+    wp_client: WordPressClient | None = None,
 ) -> dict:
     # DRY_RUN path returns deterministic stub
     if os.getenv("DRY_RUN") == "1":
@@ -196,30 +581,48 @@ def publish_to_wordpress(
     if not (WP_URL and WP_USER and WP_APP_PASS):
         raise RuntimeError("Missing WordPress credentials in config")
 
-    session = _session_with_retries()
+    wp = wp_client or client
+    session = wp.session
     auth = _auth()
+    started = time.perf_counter()
+    timings: dict[str, float] = {}
 
-    # Resolve categories/tags by name if provided
-    categories = _merge_terms(categories, category_names, "categories")
-    tags = _merge_terms(tags, tag_names, "tags")
-
-    # Upload featured image if provided
-    featured_media_id = _upload_featured_media(featured_image)
+    def _timed(step: str, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[step] = round(time.perf_counter() - t0, 3)
+
+    # Term resolution and the featured image upload are independent; the post waits on all three
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        cat_f = pool.submit(
+            _timed, "categories", _merge_terms, wp, categories, category_names, "categories"
+        )
+        tag_f = pool.submit(_timed, "tags", _merge_terms, wp, tags, tag_names, "tags")
+        media_f = pool.submit(_timed, "media", _upload_featured_media, wp, featured_image)
+        categories = cat_f.result()
+        tags = tag_f.result()
+        featured_media_id = media_f.result()
 
     payload = _build_payload(title, content_html, status, categories, tags, featured_media_id)
 
     endpoint = _api_url("/wp-json/wp/v2/posts")
-    resp = session.post(endpoint, json=payload, auth=auth, timeout=20)
+    resp = _timed("post", lambda: session.post(endpoint, json=payload, auth=auth, timeout=20))
     resp.raise_for_status()
     data = resp.json()
     post_id = int(data.get("id"))
     link = data.get("link")
     preview_link = _compute_preview_link(status, post_id, link)
     data["preview_link"] = preview_link
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.observe(elapsed, stage="publish_wordpress", model="")
+    timings["total"] = round(elapsed, 3)
+    data["timings"] = timings
     return data
 
 
-def check_wordpress_connection(timeout: int = 10) -> dict:
+def check_wordpress_connection(timeout: int = 10, wp_client: WordPressClient | None = None) -> dict:
     """
     Quick connectivity check against WordPress using basic auth and the users/me endpoint.
 
@@ -242,12 +645,7 @@ def check_wordpress_connection(timeout: int = 10) -> dict:
     endpoint = f"{WP_URL.rstrip('/')}/wp-json/wp/v2/users/me"
     auth = (WP_USER, WP_APP_PASS)
     try:
-        resp = requests.get(
-            endpoint,
-            auth=auth,
-            headers={"Accept": "application/json"},
-            timeout=timeout,
-        )
+        resp = (wp_client or client).session.get(endpoint, auth=auth, timeout=timeout)
         content = None
         try:
             content = resp.json()